@@ -16,9 +16,7 @@ def chat_handler(chat):
 
 def spam():
     while True:
-        protocol_client.send_packet(0x01,
-                                    String(str(time.time())),
-                                    compress=False)
+        protocol_client.send_packet(0x01, String(str(time.time())))
         time.sleep(0.01)
 
 
@@ -38,8 +36,6 @@ protocol_client.login_as("CoolSeymur1")
 while True:
     cmd_input = input().split()
     if cmd_input[0] == "chat":
-        protocol_client.send_packet(0x01,
-                                    String(" ".join(cmd_input[1:])),
-                                    compress=False)
+        protocol_client.send_packet(0x01, String(" ".join(cmd_input[1:])))
 
 protocol_client.join_threads()
@@ -0,0 +1,481 @@
+/*
+ * C versions of hot protocol_types functions. Build with
+ * python -m protocol.speedups build
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+#include <string.h>
+
+#if PY_VERSION_HEX < 0x030B0000
+#define PyFloat_Unpack4 _PyFloat_Unpack4
+#define PyFloat_Unpack8 _PyFloat_Unpack8
+#endif
+
+typedef struct {
+    const unsigned char *buf;
+    Py_ssize_t len;
+    Py_buffer view;
+    int has_view;
+} input_t;
+
+static int
+get_input(PyObject *obj, input_t *in)
+{
+    if (PyBytes_CheckExact(obj)) {
+        in->buf = (const unsigned char *)PyBytes_AS_STRING(obj);
+        in->len = PyBytes_GET_SIZE(obj);
+        in->has_view = 0;
+        return 0;
+    }
+    if (PyObject_GetBuffer(obj, &in->view, PyBUF_SIMPLE) < 0) {
+        return -1;
+    }
+    in->buf = (const unsigned char *)in->view.buf;
+    in->len = in->view.len;
+    in->has_view = 1;
+    return 0;
+}
+
+static void
+release_input(input_t *in)
+{
+    if (in->has_view) {
+        PyBuffer_Release(&in->view);
+    }
+}
+
+/* parses (value, pointer=0) arguments */
+static int
+parse_args(const char *name, PyObject *const *args, Py_ssize_t nargs,
+           input_t *in, Py_ssize_t *pointer)
+{
+    if (nargs < 1 || nargs > 2) {
+        PyErr_Format(PyExc_TypeError,
+                     "%s() takes 1 or 2 positional arguments", name);
+        return -1;
+    }
+    *pointer = 0;
+    if (nargs == 2) {
+        *pointer = PyLong_AsSsize_t(args[1]);
+        if (*pointer == -1 && PyErr_Occurred()) {
+            return -1;
+        }
+    }
+    return get_input(args[0], in);
+}
+
+/* makes sure that size bytes can be read at pointer */
+static int
+check_bounds(input_t *in, Py_ssize_t pointer, Py_ssize_t size)
+{
+    if (pointer < 0 || size < 0 || pointer > in->len - size) {
+        PyErr_SetString(PyExc_IndexError, "index out of range");
+        return -1;
+    }
+    return 0;
+}
+
+/* returns (value, pointer) tuple, steals reference to value */
+static PyObject *
+pair(PyObject *value, Py_ssize_t pointer)
+{
+    if (value == NULL) {
+        return NULL;
+    }
+    return Py_BuildValue("(Nn)", value, pointer);
+}
+
+static uint64_t
+read_be(const unsigned char *p, int size)
+{
+    uint64_t result = 0;
+    for (int i = 0; i < size; i++) {
+        result = (result << 8) | p[i];
+    }
+    return result;
+}
+
+/* reads variable length quantity of at most max_bytes bytes */
+static int
+read_var(input_t *in, Py_ssize_t *pointer, int max_bytes,
+         const char *too_big, uint64_t *result)
+{
+    uint64_t value = 0;
+    int shift = 0;
+    for (int i = 0;; i++) {
+        if (*pointer < 0 || *pointer >= in->len) {
+            PyErr_SetString(PyExc_IndexError, "index out of range");
+            return -1;
+        }
+        unsigned char byte = in->buf[(*pointer)++];
+        value |= (uint64_t)(byte & 0x7F) << shift;
+        if (byte < 0x80) {
+            break;
+        }
+        shift += 7;
+        if (i + 1 >= max_bytes) {
+            PyErr_SetString(PyExc_RuntimeError, too_big);
+            return -1;
+        }
+    }
+    *result = value;
+    return 0;
+}
+
+#define FIXED_READER(fname, size, convert)                                   \
+    static PyObject *                                                        \
+    fname(PyObject *self, PyObject *const *args, Py_ssize_t nargs)           \
+    {                                                                        \
+        input_t in;                                                          \
+        Py_ssize_t pointer;                                                  \
+        if (parse_args(#fname, args, nargs, &in, &pointer) < 0) {            \
+            return NULL;                                                     \
+        }                                                                    \
+        if (check_bounds(&in, pointer, size) < 0) {                          \
+            release_input(&in);                                              \
+            return NULL;                                                     \
+        }                                                                    \
+        const unsigned char *p = in.buf + pointer;                           \
+        PyObject *value = convert;                                           \
+        release_input(&in);                                                  \
+        return pair(value, pointer + size);                                  \
+    }
+
+FIXED_READER(read_Boolean, 1, PyBool_FromLong(p[0]))
+FIXED_READER(read_Byte, 1, PyLong_FromLong((int8_t)p[0]))
+FIXED_READER(read_UByte, 1, PyLong_FromLong(p[0]))
+FIXED_READER(read_Angle, 1, PyLong_FromLong(p[0]))
+FIXED_READER(read_Short, 2, PyLong_FromLong((int16_t)read_be(p, 2)))
+FIXED_READER(read_UShort, 2, PyLong_FromLong((long)read_be(p, 2)))
+FIXED_READER(read_Int, 4, PyLong_FromLong((int32_t)read_be(p, 4)))
+FIXED_READER(read_Long, 8, PyLong_FromLongLong((int64_t)read_be(p, 8)))
+FIXED_READER(read_Float, 4, PyFloat_FromDouble(PyFloat_Unpack4(p, 0)))
+FIXED_READER(read_Double, 8, PyFloat_FromDouble(PyFloat_Unpack8(p, 0)))
+
+static PyObject *
+read_VarInt(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    input_t in;
+    Py_ssize_t pointer;
+    uint64_t value;
+    if (parse_args("read_VarInt", args, nargs, &in, &pointer) < 0) {
+        return NULL;
+    }
+    int error = read_var(&in, &pointer, 5, "VarInt is too big", &value);
+    release_input(&in);
+    if (error < 0) {
+        return NULL;
+    }
+    return pair(PyLong_FromLong((int32_t)(uint32_t)value), pointer);
+}
+
+static PyObject *
+read_VarLong(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    input_t in;
+    Py_ssize_t pointer;
+    uint64_t value;
+    if (parse_args("read_VarLong", args, nargs, &in, &pointer) < 0) {
+        return NULL;
+    }
+    int error = read_var(&in, &pointer, 10, "VarLong is too big", &value);
+    release_input(&in);
+    if (error < 0) {
+        return NULL;
+    }
+    return pair(PyLong_FromLongLong((int64_t)value), pointer);
+}
+
+static PyObject *
+read_VarInt_array(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    input_t in;
+    Py_ssize_t pointer, count;
+    uint64_t value;
+    if (nargs != 3) {
+        PyErr_SetString(PyExc_TypeError,
+                        "read_VarInt_array() takes 3 positional arguments");
+        return NULL;
+    }
+    pointer = PyLong_AsSsize_t(args[1]);
+    if (pointer == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    count = PyLong_AsSsize_t(args[2]);
+    if (count == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    if (get_input(args[0], &in) < 0) {
+        return NULL;
+    }
+    /* every VarInt takes at least one byte */
+    if (count > in.len) {
+        release_input(&in);
+        PyErr_SetString(PyExc_IndexError, "index out of range");
+        return NULL;
+    }
+    PyObject *result = PyList_New(count > 0 ? count : 0);
+    if (result == NULL) {
+        release_input(&in);
+        return NULL;
+    }
+    for (Py_ssize_t i = 0; i < count; i++) {
+        PyObject *number;
+        if (read_var(&in, &pointer, 5, "VarInt is too big", &value) < 0 ||
+            (number = PyLong_FromLong((int32_t)(uint32_t)value)) == NULL) {
+            release_input(&in);
+            Py_DECREF(result);
+            return NULL;
+        }
+        PyList_SET_ITEM(result, i, number);
+    }
+    release_input(&in);
+    return pair(result, pointer);
+}
+
+/* callable decoding bytes to str with LRU cache, set by set_string_cache */
+static PyObject *string_cache = NULL;
+static Py_ssize_t string_cache_max_length = 0;
+
+static PyObject *
+set_string_cache(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    if (nargs != 2) {
+        PyErr_SetString(PyExc_TypeError,
+                        "set_string_cache() takes 2 positional arguments");
+        return NULL;
+    }
+    Py_ssize_t max_length = PyLong_AsSsize_t(args[1]);
+    if (max_length == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    Py_XDECREF(string_cache);
+    string_cache = NULL;
+    if (args[0] != Py_None) {
+        Py_INCREF(args[0]);
+        string_cache = args[0];
+    }
+    string_cache_max_length = max_length;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+read_string(const char *name, PyObject *const *args, Py_ssize_t nargs)
+{
+    input_t in;
+    Py_ssize_t pointer;
+    uint64_t length;
+    if (parse_args(name, args, nargs, &in, &pointer) < 0) {
+        return NULL;
+    }
+    if (read_var(&in, &pointer, 5, "VarInt is too big", &length) < 0) {
+        release_input(&in);
+        return NULL;
+    }
+    /* like slicing in Python, too long length is cut at the end of data */
+    Py_ssize_t size = (int32_t)(uint32_t)length;
+    if (size < 0) {
+        size = 0;
+    }
+    if (size > in.len - pointer) {
+        size = in.len - pointer;
+    }
+    PyObject *value;
+    if (string_cache != NULL && size <= string_cache_max_length) {
+        PyObject *raw = PyBytes_FromStringAndSize(
+            (const char *)in.buf + pointer, size);
+        value = raw ? PyObject_CallOneArg(string_cache, raw) : NULL;
+        Py_XDECREF(raw);
+    }
+    else {
+        value = PyUnicode_DecodeUTF8((const char *)in.buf + pointer, size,
+                                     NULL);
+    }
+    release_input(&in);
+    return pair(value, pointer + (int32_t)(uint32_t)length);
+}
+
+static PyObject *
+read_String(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    return read_string("read_String", args, nargs);
+}
+
+static PyObject *
+read_Chat(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    return read_string("read_Chat", args, nargs);
+}
+
+static long
+signed_bits(uint64_t value, int bits)
+{
+    uint64_t sign = (uint64_t)1 << (bits - 1);
+    value &= ((uint64_t)1 << bits) - 1;
+    return (long)((int64_t)(value ^ sign) - (int64_t)sign);
+}
+
+static PyObject *
+read_Position(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    input_t in;
+    Py_ssize_t pointer;
+    if (parse_args("read_Position", args, nargs, &in, &pointer) < 0) {
+        return NULL;
+    }
+    if (check_bounds(&in, pointer, 8) < 0) {
+        release_input(&in);
+        return NULL;
+    }
+    uint64_t data = read_be(in.buf + pointer, 8);
+    release_input(&in);
+    return Py_BuildValue("(llln)", signed_bits(data >> 38, 26),
+                         signed_bits(data >> 26, 12), signed_bits(data, 26),
+                         pointer + 8);
+}
+
+static PyObject *
+encode_var(uint64_t value)
+{
+    char buf[10];
+    int size = 0;
+    while (value > 0x7F) {
+        buf[size++] = (char)((value & 0x7F) | 0x80);
+        value >>= 7;
+    }
+    buf[size++] = (char)value;
+    return PyBytes_FromStringAndSize(buf, size);
+}
+
+static PyObject *
+VarInt(PyObject *self, PyObject *value)
+{
+    unsigned long long number = PyLong_AsUnsignedLongLongMask(value);
+    if (number == (unsigned long long)-1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    return encode_var((uint32_t)number);
+}
+
+static PyObject *
+VarLong(PyObject *self, PyObject *value)
+{
+    unsigned long long number = PyLong_AsUnsignedLongLongMask(value);
+    if (number == (unsigned long long)-1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    return encode_var((uint64_t)number);
+}
+
+static PyObject *
+encode_string(PyObject *string)
+{
+    Py_ssize_t size;
+    if (!PyUnicode_Check(string)) {
+        PyErr_SetString(PyExc_TypeError, "string argument expected");
+        return NULL;
+    }
+    const char *utf8 = PyUnicode_AsUTF8AndSize(string, &size);
+    if (utf8 == NULL) {
+        return NULL;
+    }
+    char prefix[5];
+    int prefix_size = 0;
+    uint32_t length = (uint32_t)size;
+    while (length > 0x7F) {
+        prefix[prefix_size++] = (char)((length & 0x7F) | 0x80);
+        length >>= 7;
+    }
+    prefix[prefix_size++] = (char)length;
+    PyObject *result = PyBytes_FromStringAndSize(NULL, prefix_size + size);
+    if (result == NULL) {
+        return NULL;
+    }
+    char *out = PyBytes_AS_STRING(result);
+    memcpy(out, prefix, prefix_size);
+    memcpy(out + prefix_size, utf8, size);
+    return result;
+}
+
+static PyObject *
+String(PyObject *self, PyObject *string)
+{
+    return encode_string(string);
+}
+
+static PyObject *
+Chat(PyObject *self, PyObject *string)
+{
+    return encode_string(string);
+}
+
+static PyObject *
+Position(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    unsigned long long coords[3];
+    if (nargs != 3) {
+        PyErr_SetString(PyExc_TypeError,
+                        "Position() takes 3 positional arguments");
+        return NULL;
+    }
+    for (int i = 0; i < 3; i++) {
+        coords[i] = PyLong_AsUnsignedLongLongMask(args[i]);
+        if (coords[i] == (unsigned long long)-1 && PyErr_Occurred()) {
+            return NULL;
+        }
+    }
+    uint64_t data = ((uint64_t)(coords[0] & 0x3FFFFFF) << 38) |
+                    ((uint64_t)(coords[1] & 0xFFF) << 26) |
+                    (uint64_t)(coords[2] & 0x3FFFFFF);
+    char buf[8];
+    for (int i = 7; i >= 0; i--) {
+        buf[i] = (char)(data & 0xFF);
+        data >>= 8;
+    }
+    return PyBytes_FromStringAndSize(buf, 8);
+}
+
+#define FASTCALL(name) \
+    {#name, (PyCFunction)(void (*)(void))name, METH_FASTCALL, NULL}
+#define ONE_ARG(name) {#name, (PyCFunction)name, METH_O, NULL}
+
+static PyMethodDef speedups_methods[] = {
+    FASTCALL(read_Boolean),
+    FASTCALL(read_Byte),
+    FASTCALL(read_UByte),
+    FASTCALL(read_Angle),
+    FASTCALL(read_Short),
+    FASTCALL(read_UShort),
+    FASTCALL(read_Int),
+    FASTCALL(read_Long),
+    FASTCALL(read_Float),
+    FASTCALL(read_Double),
+    FASTCALL(read_VarInt),
+    FASTCALL(read_VarLong),
+    FASTCALL(read_VarInt_array),
+    FASTCALL(read_String),
+    FASTCALL(read_Chat),
+    FASTCALL(read_Position),
+    FASTCALL(Position),
+    FASTCALL(set_string_cache),
+    ONE_ARG(VarInt),
+    ONE_ARG(VarLong),
+    ONE_ARG(String),
+    ONE_ARG(Chat),
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef speedups_module = {
+    PyModuleDef_HEAD_INIT,
+    "protocol._speedups",
+    "C versions of hot protocol_types functions",
+    -1,
+    speedups_methods
+};
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+{
+    return PyModule_Create(&speedups_module);
+}
@@ -0,0 +1,206 @@
+"""
+asyncio based Minecraft Protocol Client
+"""
+import asyncio
+import inspect
+from protocol.lazy_packet import LazyPacket
+from protocol.protocol_47 import PACKET_PARSERS, ProtocolClient
+
+
+def read_raw_packet(packet: bytes, pointer: int) -> tuple[dict, int]:
+    """parser for packets without parser. returns undecoded packet data"""
+    return ({"data": bytes(packet[pointer:])}, len(packet))
+
+
+class _Drain:
+    """awaitable that flushes queued packets and waits until they are sent"""
+    __slots__ = ("client", )
+
+    def __init__(self, client: "AsyncProtocolClient") -> None:
+        self.client = client
+
+    def __await__(self):
+        self.client.flush()
+        return self.client.writer.drain().__await__()
+
+
+class AsyncProtocolClient(ProtocolClient):
+    """
+    Minecraft Protocol Client running in asyncio event loop.
+
+    Framing, decompression and decoding run in one task per connection and
+    reuse decoders of ProtocolClient. Handlers may be coroutine functions,
+    they are awaited in packet order. Packets can also be consumed with
+    `async for packet in client`
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.reader: asyncio.StreamReader = None
+        self.writer: asyncio.StreamWriter = None
+        self.task: asyncio.Task = None
+        self.pending_handlers = []
+        self.packet_queue: asyncio.Queue = None
+        # packets waiting for `async for` consumer. when queue is full,
+        # receiving waits, so slow consumer slows down the connection (and
+        # keep alives aren't answered until it catches up)
+        self.packet_queue_size = 1024
+        self.packet_queue_closed = False
+        self.flush_handle: asyncio.Handle = None
+
+    async def create_connection(self, address: tuple[str, int]):
+        """create connection"""
+        if self.connected:
+            raise RuntimeError(
+                "Client is still connected. Please disconnect.")
+        self.reader, self.writer = await asyncio.open_connection(*address)
+        self.connected = True
+
+    def is_connected(self) -> bool:
+        """checks whether connection is still alive or not"""
+        if not self.writer:
+            raise RuntimeError("Connection not created")
+        return self.connected
+
+    def close_connection(self):
+        """closes connection"""
+        if self.writer:
+            self.writer.close()
+        self.connected = False
+
+    async def exit(self):
+        """stops receiving packets and closes connection"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.close_connection()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def send_packet(self,
+                    packet_id: int,
+                    packet_data: bytes,
+                    compress: bool = True) -> _Drain:
+        """
+        queues packet. queued packets are written together at the end of
+        event loop iteration or after flush_interval. returns awaitable which
+        waits until packet is sent: `await client.send_packet(...)`. decoders
+        may call it without awaiting
+        """
+        if not self.is_connected():
+            raise RuntimeError("Not connected")
+        self.encode_packet_into(self.send_buffer, packet_id, packet_data,
+                                compress)
+        self._schedule_flush()
+        return _Drain(self)
+
+    def send_many(self, packets: list[tuple]) -> _Drain:
+        """
+        queues several packets. packets are tuples of (packet_id, packet_data)
+        or (packet_id, packet_data, compress)
+        """
+        if not self.is_connected():
+            raise RuntimeError("Not connected")
+        for packet in packets:
+            self.encode_packet_into(self.send_buffer, *packet)
+        self._schedule_flush()
+        return _Drain(self)
+
+    def _schedule_flush(self):
+        if len(self.send_buffer) >= self.flush_threshold:
+            self.flush()
+        elif self.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            if self.flush_interval is None:
+                self.flush_handle = loop.call_soon(self.flush)
+            else:
+                self.flush_handle = loop.call_later(self.flush_interval,
+                                                    self.flush)
+
+    def flush(self) -> _Drain:
+        """writes queued packets to the connection"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.send_buffer:
+            self.writer.write(self.send_buffer)
+            self.send_buffer = bytearray()
+        return _Drain(self)
+
+    def raw_socket(self):
+        """returns underlying socket"""
+        return self.writer.get_extra_info("socket")
+
+    def call_handler(self, handler, *args, **kwargs):
+        result = handler(*args, **kwargs)
+        if inspect.isawaitable(result):
+            self.pending_handlers.append(result)
+        return result
+
+    async def process_packet_async(self, packet_raw: bytes):
+        """decodes packet and awaits async handlers it triggered"""
+        state, packet_id, packet, pointer = self.process_packet(packet_raw)
+        if self.pending_handlers:
+            pending = self.pending_handlers
+            self.pending_handlers = []
+            for awaitable in pending:
+                await awaitable
+        if self.packet_queue is not None:
+            parser = PACKET_PARSERS.get((state, packet_id), read_raw_packet)
+            await self.packet_queue.put(
+                LazyPacket(state, packet_id, parser, packet, pointer))
+
+    async def run(self):
+        """receives and processes packets until connection is closed"""
+        try:
+            while True:
+                data = await self.reader.read(65536)
+                if not data:
+                    break
+                self.bytes_received += len(data)
+                self.framer.feed(data)
+                if self.keep_alive_replies:
+                    self.send_keep_alive_replies()
+                for packet_raw in self.framer.frames():
+                    if self.recorder is not None:
+                        self.recorder.record(self.state,
+                                             self.compression_enabled,
+                                             packet_raw)
+                    await self.process_packet_async(packet_raw)
+        finally:
+            self.connected = False
+            self.framer.close()
+            self.packet_queue_closed = True
+            if self.packet_queue is not None:
+                try:
+                    # wakes up waiting consumer
+                    self.packet_queue.put_nowait(None)
+                except asyncio.QueueFull:
+                    pass
+
+    async def login_as(self, nickname: str):
+        """Logins to minecraft server and starts processing packets"""
+        self.send_login_packets(nickname)
+        await self.flush()
+        self.task = asyncio.create_task(self.run())
+
+    async def wait_closed(self):
+        """waits until connection is closed"""
+        if self.task:
+            await self.task
+
+    def __aiter__(self):
+        if self.packet_queue is None:
+            self.packet_queue = asyncio.Queue(self.packet_queue_size)
+        return self
+
+    async def __anext__(self) -> LazyPacket:
+        if self.packet_queue_closed and self.packet_queue.empty():
+            raise StopAsyncIteration
+        packet = await self.packet_queue.get()
+        if packet is None:
+            raise StopAsyncIteration
+        return packet
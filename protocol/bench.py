@@ -0,0 +1,397 @@
+"""
+Measures speed and memory use of decoders.
+
+python -m protocol.bench --output results.json
+python -m protocol.bench --compare results.json
+PROTOCOL_PURE_PYTHON=1 python -m protocol.bench
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable
+from protocol import protocol_47, protocol_types
+from protocol.constants import STATE_PLAY, TAG_SHORT
+from protocol.nbt import NBT, parse_NBT_stream
+from protocol.protocol_types import (Position, Slot, String, VarInt,
+                                     read_Position, read_Slot, read_String,
+                                     read_VarInt)
+from protocol.recorder import ReplayClient, replay
+from protocol.synthetic import (MOB_METADATA, chunk_data, chunk_packet,
+                                spawn_mob_packet)
+
+# benchmark name -> function that returns (function to time, number of
+# operations one call of it does)
+BENCHMARKS: dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    """adds setup function to BENCHMARKS"""
+
+    def register(setup: Callable) -> Callable:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def item_nbt() -> dict:
+    """NBT of enchanted item with custom name and lore"""
+    return {
+        "display": {
+            "Name": "Sword of benchmarking",
+            "Lore": [f"Lore line {i}" for i in range(4)]
+        },
+        "ench": [{
+            "id": (TAG_SHORT, i),
+            "lvl": (TAG_SHORT, 3)
+        } for i in range(5)],
+        "RepairCost": 4,
+        "HideFlags": 1
+    }
+
+
+def packet_mix(count: int = 2000,
+               entities: int = 64,
+               seed: int = 0) -> list[tuple[int, bytes]]:
+    """
+    returns list of (packet_id, packet_data) of Play packets resembling
+    busy server: entity spawns and moves, metadata, time updates, chat,
+    block changes and occasional chunks and keep alives
+    """
+    rng = random.Random(seed)
+    packets = []
+    for entity_id in range(entities):
+        packets.append((0x0f,
+                        spawn_mob_packet(entity_id, rng.randint(50, 120),
+                                         rng.uniform(-64, 64), 64,
+                                         rng.uniform(-64, 64))))
+    kinds = [(protocol_47.ENTITY_RELATIVE_MOVE, 0x15, 30),
+             (protocol_47.ENTITY_LOOK_AND_RELATIVE_MOVE, 0x17, 20),
+             (protocol_47.ENTITY_HEAD_LOOK, 0x19, 15),
+             (protocol_47.ENTITY_VELOCITY, 0x12, 10),
+             (protocol_47.ENTITY_TELEPORT, 0x18, 5), (None, 0x1c, 5),
+             (None, 0x03, 4), (None, 0x23, 6), (None, 0x02, 3),
+             (None, 0x00, 1), (None, 0x21, 1)]
+    weights = [kind[2] for kind in kinds]
+    while len(packets) < count:
+        schema, packet_id, _ = rng.choices(kinds, weights)[0]
+        entity_id = rng.randrange(entities)
+        if schema is not None:
+            values = {name: 0 for name, _, _ in schema.fields}
+            values.update(entity_id=entity_id,
+                          dx=rng.uniform(-1, 1),
+                          dy=rng.uniform(-1, 1),
+                          dz=rng.uniform(-1, 1),
+                          x=rng.uniform(-64, 64),
+                          y=64,
+                          z=rng.uniform(-64, 64),
+                          yaw=rng.randrange(256),
+                          head_yaw=rng.randrange(256))
+            data = schema.write({name: values[name]
+                                 for name, _, _ in schema.fields})
+        elif packet_id == 0x1c:
+            data = protocol_47.ENTITY_METADATA.write(entity_id=entity_id,
+                                                     metadata=MOB_METADATA)
+        elif packet_id == 0x03:
+            data = protocol_47.TIME_UPDATE.write(world_age=len(packets),
+                                                 time_of_day=len(packets))
+        elif packet_id == 0x23:
+            data = Position(rng.randint(-64, 64), rng.randint(0, 255),
+                            rng.randint(-64, 64)) + VarInt(1 << 4)
+        elif packet_id == 0x02:
+            data = String(json.dumps({"text": f"<player> {len(packets)}"
+                                      })) + b"\x00"
+        elif packet_id == 0x00:
+            data = VarInt(len(packets))
+        else:
+            data = chunk_packet(rng.randint(-4, 4), rng.randint(-4, 4), 4)
+        packets.append((packet_id, data))
+    return packets
+
+
+def encode_stream(packets: list[tuple[int, bytes]],
+                  compression_threshold: int = -1) -> bytes:
+    """
+    returns packets framed as sent by server, compressed if
+    compression_threshold isn't negative
+    """
+    client = protocol_47.ProtocolClient()
+    if compression_threshold >= 0:
+        client.compression_enabled = True
+        client.compression_threshold = compression_threshold
+    buffer = bytearray()
+    for packet_id, data in packets:
+        client.encode_packet_into(buffer, packet_id, data)
+    return bytes(buffer)
+
+
+@benchmark("read_VarInt")
+def bench_read_VarInt():
+    data = b"".join(VarInt(value) for value in (1, 300, 70000, 2**31 - 1))
+
+    def run():
+        pointer = 0
+        for _ in range(4):
+            _, pointer = read_VarInt(data, pointer)
+
+    return run, 4
+
+
+@benchmark("VarInt")
+def bench_VarInt():
+    encode = protocol_types.VarInt
+
+    def run():
+        encode(1)
+        encode(300)
+        encode(70000)
+        encode(-1)
+
+    return run, 4
+
+
+@benchmark("read_String")
+def bench_read_String():
+    data = String("minecraft:entity.player.hurt")
+    return lambda: read_String(data, 0), 1
+
+
+@benchmark("read_String_long")
+def bench_read_String_long():
+    # too long for string cache
+    data = String("long chat message " * 20)
+    return lambda: read_String(data, 0), 1
+
+
+@benchmark("read_Position")
+def bench_read_Position():
+    data = Position(-1234, 64, 5678)
+    return lambda: read_Position(data, 0), 1
+
+
+@benchmark("read_Slot")
+def bench_read_Slot():
+    data = Slot({"item_id": 276, "item_count": 1, "item_damage": 0})
+    return lambda: read_Slot(data, 0), 1
+
+
+@benchmark("read_Slot_nbt")
+def bench_read_Slot_nbt():
+    data = Slot({
+        "item_id": 276,
+        "item_count": 1,
+        "item_damage": 0,
+        "item_nbt": item_nbt()
+    })
+    return lambda: read_Slot(data, 0), 1
+
+
+@benchmark("parse_NBT_stream")
+def bench_parse_NBT_stream():
+    data = NBT({
+        "Level": {
+            "xPos": 1,
+            "zPos": 2,
+            "Entities": [item_nbt() for _ in range(8)],
+            "HeightMap": list(range(256))
+        }
+    })
+    return lambda: parse_NBT_stream(data, 0), 1
+
+
+def _bench_read_Chunk(sections: int, reader: Callable):
+    data = chunk_data(sections)
+    mask = (1 << sections) - 1
+    return lambda: reader(data, 0, mask, True, True), 1
+
+
+for _sections in (1, 8, 16):
+    benchmark(f"read_Chunk_{_sections}")(
+        lambda sections=_sections: _bench_read_Chunk(
+            sections, protocol_47.read_Chunk))
+    if protocol_47.np is not None:
+        benchmark(f"read_Chunk_numpy_{_sections}")(
+            lambda sections=_sections: _bench_read_Chunk(
+                sections, protocol_47.read_Chunk_numpy))
+
+
+def _bench_dispatch(compression_threshold: int):
+    packets = packet_mix()
+    stream = encode_stream(packets, compression_threshold)
+
+    def run():
+        client = ReplayClient()
+        client.state = STATE_PLAY
+        if compression_threshold >= 0:
+            client.compression_enabled = True
+            client.compression_threshold = compression_threshold
+        client.framer.feed(stream)
+        client.framer.close()
+        client.process_data_thread_alive = True
+        client._process_data()  # pylint: disable=protected-access
+
+    return run, len(packets)
+
+
+@benchmark("dispatch")
+def bench_dispatch():
+    return _bench_dispatch(-1)
+
+
+@benchmark("dispatch_compressed")
+def bench_dispatch_compressed():
+    return _bench_dispatch(256)
+
+
+def bench_replay(path: str):
+    """replays recorded session, see protocol.recorder"""
+    client = replay(path)
+    return lambda: replay(path), client.packets_received
+
+
+def measure(run: Callable,
+            operations: int,
+            min_time: float = 0.2,
+            repeat: int = 5) -> dict:
+    """
+    times run and returns operations per second of the best of repeat
+    rounds, each round lasts about min_time seconds. alloc_bytes is
+    peak memory allocated by one call per operation
+    """
+    run()
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            run()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 10 or calls >= 1 << 24:
+            break
+        calls *= 10
+    calls = max(1, int(calls * min_time / max(elapsed, 1e-9)))
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(calls):
+            run()
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    seconds = best / calls / operations
+    return {
+        "ops_per_sec": 1 / seconds,
+        "ns_per_op": seconds * 1e9,
+        "alloc_bytes": (peak - before) / operations,
+        "operations": operations
+    }
+
+
+def run_benchmarks(names: list[str] = None,
+                   session: str = None,
+                   min_time: float = 0.2,
+                   repeat: int = 5) -> dict:
+    """runs benchmarks and returns results in format of --output"""
+    setups = dict(BENCHMARKS)
+    if session is not None:
+        setups["replay"] = lambda: bench_replay(session)
+    if names:
+        setups = {
+            name: setup
+            for name, setup in setups.items()
+            if any(pattern in name for pattern in names)
+        }
+    results = {}
+    for name, setup in setups.items():
+        run, operations = setup()
+        results[name] = measure(run, operations, min_time, repeat)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "speedups": protocol_types.read_VarInt
+            is not protocol_types.PURE_PYTHON["read_VarInt"],
+            "numpy": protocol_47.np is not None,
+            "time": time.time()
+        },
+        "results": results
+    }
+
+
+def compare(results: dict, baseline: dict) -> list[tuple[str, float]]:
+    """returns (name, current speed / baseline speed) of common benchmarks"""
+    ratios = []
+    for name, result in results["results"].items():
+        if name in baseline["results"]:
+            ratios.append((name, result["ops_per_sec"] /
+                           baseline["results"][name]["ops_per_sec"]))
+    return ratios
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m protocol.bench",
+                                     description=__doc__.splitlines()[1])
+    parser.add_argument("names",
+                        nargs="*",
+                        help="run benchmarks whose name contains one of "
+                        "these")
+    parser.add_argument("--output", help="write results to JSON file")
+    parser.add_argument("--compare", help="JSON file with baseline results")
+    parser.add_argument("--threshold",
+                        type=float,
+                        default=None,
+                        help="exit with error if a benchmark is this many "
+                        "percent slower than baseline")
+    parser.add_argument("--session",
+                        help="also replay session recorded with "
+                        "protocol.recorder")
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return
+    results = run_benchmarks(args.names, args.session, args.min_time,
+                             args.repeat)
+    print(f"speedups: {results['meta']['speedups']}, "
+          f"numpy: {results['meta']['numpy']}")
+    for name, result in results["results"].items():
+        print(f"{name:24} {result['ops_per_sec']:14,.0f} ops/s "
+              f"{result['ns_per_op']:12,.0f} ns/op "
+              f"{result['alloc_bytes']:10,.0f} B/op")
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf8") as file:
+            baseline = json.load(file)
+        slower = []
+        print(f"\ncompared to {args.compare}:")
+        for name, ratio in compare(results, baseline):
+            print(f"{name:24} {(ratio - 1) * 100:+7.1f}%")
+            if (args.threshold is not None
+                    and ratio < 1 - args.threshold / 100):
+                slower.append(name)
+        if slower:
+            print("slower than baseline: " + ", ".join(slower))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
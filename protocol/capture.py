@@ -0,0 +1,77 @@
+"""
+Bounded capture of received packets for debugging
+"""
+import time
+from collections import deque
+
+
+class CapturedPacket:
+    """One captured packet. data is decompressed packet id and data"""
+    __slots__ = ("time", "state", "packet_id", "data")
+
+    def __init__(self, received: float, state: int, packet_id: int,
+                 data: bytes) -> None:
+        self.time = received
+        self.state = state
+        self.packet_id = packet_id
+        self.data = data
+
+    def __repr__(self) -> str:
+        return (f"<CapturedPacket {hex(self.packet_id)} state={self.state} "
+                f"{len(self.data)} bytes>")
+
+
+class PacketCapture:
+    """
+    Ring buffer of the last received packets. Oldest packets are dropped
+    when there are more than max_packets packets or more than max_bytes
+    bytes. packet_ids and states limit which packets are captured, None
+    captures all of them
+    """
+
+    def __init__(self,
+                 max_packets: int = 1024,
+                 max_bytes: int = 1 << 20,
+                 packet_ids: set[int] = None,
+                 states: set[int] = None) -> None:
+        self.max_packets = max_packets
+        self.max_bytes = max_bytes
+        self.packet_ids = None if packet_ids is None else frozenset(packet_ids)
+        self.states = None if states is None else frozenset(states)
+        self.packets: deque[CapturedPacket] = deque()
+        self.nbytes = 0
+        # packets dropped to stay within limits
+        self.dropped = 0
+
+    def add(self, state: int, packet_id: int, packet: bytes):
+        """captures packet if it passes filters"""
+        if self.packet_ids is not None and packet_id not in self.packet_ids:
+            return
+        if self.states is not None and state not in self.states:
+            return
+        # copy, so captured packet doesn't keep receive buffer alive
+        data = bytes(packet)
+        if len(data) > self.max_bytes:
+            self.dropped += 1
+            return
+        packets = self.packets
+        packets.append(CapturedPacket(time.time(), state, packet_id, data))
+        self.nbytes += len(data)
+        while len(packets) > self.max_packets or self.nbytes > self.max_bytes:
+            self.nbytes -= len(packets.popleft().data)
+            self.dropped += 1
+
+    def snapshot(self) -> list[CapturedPacket]:
+        """returns captured packets, oldest first"""
+        return list(self.packets)
+
+    def clear(self):
+        """drops all captured packets"""
+        self.packets.clear()
+        self.nbytes = 0
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __len__(self) -> int:
+        return len(self.packets)
@@ -0,0 +1,79 @@
+"""
+Chat messages whose JSON is parsed on first access
+"""
+import json
+
+
+def chat_to_text(component) -> str:
+    """returns plain text of parsed chat component"""
+    parts = []
+    stack = [component]
+    while stack:
+        component = stack.pop()
+        if isinstance(component, str):
+            parts.append(component)
+        elif isinstance(component, list):
+            stack.extend(reversed(component))
+        elif isinstance(component, dict):
+            stack.extend(reversed(component.get("extra", ())))
+            if "translate" in component:
+                # there is no translation table, so arguments follow key
+                for argument in reversed(component.get("with", ())):
+                    stack.append(argument)
+                    stack.append(" ")
+                parts.append(str(component["translate"]))
+            else:
+                parts.append(str(component.get("text", "")))
+        elif component is not None:
+            parts.append(str(component))
+    return "".join(parts)
+
+
+class LazyChat:
+    """
+    Raw chat JSON. It's parsed only when json, text or fields are accessed,
+    e.g. chat.text or chat["extra"]. str(chat) returns raw JSON
+    """
+    __slots__ = ("raw", "_json")
+
+    def __init__(self, raw: str) -> None:
+        self.raw = raw
+        self._json = None
+
+    @property
+    def json(self):
+        """parsed chat component. chat that isn't JSON is taken as text"""
+        if self._json is None:
+            try:
+                self._json = json.loads(self.raw)
+            except ValueError:
+                self._json = {"text": self.raw}
+        return self._json
+
+    @property
+    def text(self) -> str:
+        """plain text of chat without formatting"""
+        return chat_to_text(self.json)
+
+    def __getitem__(self, name: str):
+        return self.json[name]
+
+    def get(self, name: str, default=None):
+        """returns field of parsed chat component"""
+        if isinstance(self.json, dict):
+            return self.json.get(name, default)
+        return default
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LazyChat):
+            return self.raw == other.raw
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.raw)
+
+    def __str__(self) -> str:
+        return self.raw
+
+    def __repr__(self) -> str:
+        return f"<LazyChat {self.raw}>"
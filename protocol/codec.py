@@ -0,0 +1,53 @@
+"""
+Packet compression layer
+"""
+import zlib
+from protocol.protocol_types import VarInt, read_VarInt
+
+# refuse to inflate packets that claim to be bigger than this
+MAX_PACKET_SIZE = 1 << 24
+
+
+def decompress_packet(packet_raw: bytes,
+                      compression_enabled: bool) -> memoryview:
+    """
+    returns uncompressed packet id and data of packet without length
+    prefix. compressed packets are inflated into a buffer of declared
+    uncompressed size, so output is allocated once instead of growing
+    while inflating
+    """
+    if not compression_enabled:
+        return packet_raw
+    data_length, pointer = read_VarInt(packet_raw)
+    if not data_length:
+        return packet_raw[pointer:]
+    if not 0 < data_length <= MAX_PACKET_SIZE:
+        raise RuntimeError("Bad uncompressed packet size: " +
+                           str(data_length))
+    packet = zlib.decompress(packet_raw[pointer:], bufsize=data_length)
+    if len(packet) != data_length:
+        raise RuntimeError(
+            f"Badly compressed packet: declared size is {data_length}, "
+            f"actual size is {len(packet)}")
+    return memoryview(packet)
+
+
+def peek_packet_id(packet_raw: bytes, compression_enabled: bool) -> int:
+    """returns packet id without decompressing whole packet"""
+    if not compression_enabled:
+        return read_VarInt(packet_raw)[0]
+    data_length, pointer = read_VarInt(packet_raw)
+    if data_length:
+        head = zlib.decompressobj().decompress(packet_raw[pointer:], 5)
+        return read_VarInt(head)[0]
+    return read_VarInt(packet_raw, pointer)[0]
+
+
+def compress_packet_into(buffer: bytearray, packet_id: bytes,
+                         packet_data: bytes, level: int):
+    """appends length prefix, data length and compressed packet to buffer"""
+    compressed = zlib.compress(packet_id + packet_data, level)
+    data_length = VarInt(len(packet_id) + len(packet_data))
+    buffer += VarInt(len(data_length) + len(compressed))
+    buffer += data_length
+    buffer += compressed
@@ -17,4 +17,24 @@ MAP_MULTI_BLOCK_CHANGE = 1
 MAP_BLOCK_CHANGE = 2
 MAP_BLOCK_ACTION = 3
 MAP_BLOCK_BREAK_ANIMATION = 4
-MAP_CHUNK_BULK = 5
\ No newline at end of file
+MAP_CHUNK_BULK = 5
+MAP_CHUNK_UNLOAD = 6
+EVICT_LRU = 0
+EVICT_DISTANCE = 1
+TAG_END = 0
+TAG_BYTE = 1
+TAG_SHORT = 2
+TAG_INT = 3
+TAG_LONG = 4
+TAG_FLOAT = 5
+TAG_DOUBLE = 6
+TAG_BYTE_ARRAY = 7
+TAG_STRING = 8
+TAG_LIST = 9
+TAG_COMPOUND = 10
+TAG_INT_ARRAY = 11
+TAG_LONG_ARRAY = 12
+ENTITY_PLAYER = 0
+ENTITY_OBJECT = 1
+ENTITY_MOB = 2
+ENTITY_EXPERIENCE_ORB = 3
@@ -0,0 +1,190 @@
+"""
+Tracking of entities around the client
+"""
+from typing import Iterator
+
+# angles are sent in steps of 1/256 of a full turn
+ANGLE_TO_DEGREES = 360 / 256
+
+
+class Entity:
+    """
+    One entity. Position is in blocks, rotation in degrees, velocity in
+    blocks per tick. kind is one of ENTITY_* constants, entity_type is
+    object or mob type
+    """
+    __slots__ = ("entity_id", "kind", "entity_type", "uuid", "x", "y", "z",
+                 "yaw", "pitch", "head_yaw", "velocity_x", "velocity_y",
+                 "velocity_z", "on_ground", "metadata", "equipment")
+
+    def __init__(self, entity_id: int, kind: int, x: float, y: float,
+                 z: float) -> None:
+        self.entity_id = entity_id
+        self.kind = kind
+        self.entity_type: int = None
+        self.uuid = None
+        self.x = x
+        self.y = y
+        self.z = z
+        self.yaw = 0.0
+        self.pitch = 0.0
+        self.head_yaw = 0.0
+        self.velocity_x = 0.0
+        self.velocity_y = 0.0
+        self.velocity_z = 0.0
+        self.on_ground = False
+        # metadata key -> value, equipment slot -> slot data
+        self.metadata: dict = {}
+        self.equipment: dict = {}
+
+    def distance_sq(self, x: float, y: float, z: float) -> float:
+        """squared distance to point"""
+        dx = self.x - x
+        dy = self.y - y
+        dz = self.z - z
+        return dx * dx + dy * dy + dz * dz
+
+    def __repr__(self) -> str:
+        return (f"<Entity {self.entity_id} kind={self.kind} "
+                f"type={self.entity_type} "
+                f"at ({self.x:.2f}, {self.y:.2f}, {self.z:.2f})>")
+
+
+class EntityTracker:
+    """
+    Entities by entity id. Updates for entities that aren't tracked are
+    ignored, server sends them for entities it didn't spawn yet
+    """
+
+    def __init__(self) -> None:
+        self.entities: dict[int, Entity] = {}
+
+    def spawn(self, entity_id: int, kind: int, x: float, y: float, z: float,
+              yaw: float = 0.0, pitch: float = 0.0) -> Entity:
+        """adds new entity, replaces entity with the same id"""
+        entity = Entity(entity_id, kind, x, y, z)
+        entity.yaw = yaw
+        entity.pitch = pitch
+        self.entities[entity_id] = entity
+        return entity
+
+    def remove(self, entity_ids: list[int]):
+        """removes entities"""
+        entities = self.entities
+        for entity_id in entity_ids:
+            entities.pop(entity_id, None)
+
+    def move(self, entity_id: int, dx: float, dy: float, dz: float,
+             on_ground: bool):
+        """moves entity relative to its position"""
+        entity = self.entities.get(entity_id)
+        if entity is not None:
+            entity.x += dx
+            entity.y += dy
+            entity.z += dz
+            entity.on_ground = on_ground
+
+    def look(self, entity_id: int, yaw: float, pitch: float,
+             on_ground: bool):
+        """sets rotation of entity"""
+        entity = self.entities.get(entity_id)
+        if entity is not None:
+            entity.yaw = yaw
+            entity.pitch = pitch
+            entity.on_ground = on_ground
+
+    def teleport(self, entity_id: int, x: float, y: float, z: float,
+                 yaw: float, pitch: float, on_ground: bool):
+        """sets absolute position and rotation of entity"""
+        entity = self.entities.get(entity_id)
+        if entity is not None:
+            entity.x = x
+            entity.y = y
+            entity.z = z
+            entity.yaw = yaw
+            entity.pitch = pitch
+            entity.on_ground = on_ground
+
+    def head_look(self, entity_id: int, head_yaw: float):
+        """sets head rotation of entity"""
+        entity = self.entities.get(entity_id)
+        if entity is not None:
+            entity.head_yaw = head_yaw
+
+    def set_velocity(self, entity_id: int, velocity_x: float,
+                     velocity_y: float, velocity_z: float):
+        """sets velocity of entity"""
+        entity = self.entities.get(entity_id)
+        if entity is not None:
+            entity.velocity_x = velocity_x
+            entity.velocity_y = velocity_y
+            entity.velocity_z = velocity_z
+
+    def update_metadata(self, entity_id: int, metadata: list[dict]):
+        """merges metadata entries as returned by parse_entity_metadata"""
+        entity = self.entities.get(entity_id)
+        if entity is not None:
+            for entry in metadata:
+                entity.metadata[entry["key"]] = entry["value"]
+
+    def set_equipment(self, entity_id: int, slot: int, item: dict):
+        """sets item in equipment slot of entity"""
+        entity = self.entities.get(entity_id)
+        if entity is not None:
+            entity.equipment[slot] = item
+
+    def entities_within(self,
+                        x: float,
+                        y: float,
+                        z: float,
+                        radius: float,
+                        kind: int = None) -> list[Entity]:
+        """
+        returns entities not farther than radius from point, optionally only
+        of given kind
+        """
+        radius_sq = radius * radius
+        found = []
+        for entity in self.entities.values():
+            if kind is not None and entity.kind != kind:
+                continue
+            dx = entity.x - x
+            dy = entity.y - y
+            dz = entity.z - z
+            if dx * dx + dy * dy + dz * dz <= radius_sq:
+                found.append(entity)
+        return found
+
+    def nearest(self,
+                x: float,
+                y: float,
+                z: float,
+                kind: int = None) -> Entity:
+        """returns entity nearest to point or None"""
+        best = None
+        best_distance = None
+        for entity in self.entities.values():
+            if kind is not None and entity.kind != kind:
+                continue
+            distance = entity.distance_sq(x, y, z)
+            if best is None or distance < best_distance:
+                best = entity
+                best_distance = distance
+        return best
+
+    def clear(self):
+        """forgets all entities"""
+        self.entities.clear()
+
+    def get(self, entity_id: int) -> Entity:
+        """returns entity or None"""
+        return self.entities.get(entity_id)
+
+    def __contains__(self, entity_id: int) -> bool:
+        return entity_id in self.entities
+
+    def __iter__(self) -> Iterator[Entity]:
+        return iter(self.entities.values())
+
+    def __len__(self) -> int:
+        return len(self.entities)
@@ -0,0 +1,155 @@
+"""
+Zero-copy packet framing on top of a growable receive buffer
+"""
+import socket
+import threading
+from typing import Callable
+
+
+class PacketFramer:
+    """
+    Splits a stream of bytes into length-prefixed packet frames.
+
+    Received data is written into a bytearray behind a write cursor and frames
+    are handed out as memoryviews of that bytearray, so no bytes are copied
+    per packet. The buffer is never resized or compacted in place: when it
+    runs out of room a new one is allocated and only the unread tail is moved
+    over, which keeps already returned frames valid and makes framing cost
+    O(bytes received).
+    """
+
+    def __init__(self, initial_size: int = 65536) -> None:
+        self.initial_size = initial_size
+        self.buf = bytearray(initial_size)
+        self.read_pos = 0
+        self.write_pos = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        # frame_hook(frame) sees every frame as soon as it is received, before
+        # it's available to consumer. it's called with the lock held
+        self.frame_hook: Callable = None
+        self.scan_pos = 0
+
+    def _reserve(self, size: int) -> None:
+        """make sure there is room for size bytes after write cursor"""
+        if len(self.buf) - self.write_pos >= size:
+            return
+        unread = self.write_pos - self.read_pos
+        capacity = max(self.initial_size, len(self.buf))
+        while capacity < (unread + size) * 2:
+            capacity *= 2
+        new_buf = bytearray(capacity)
+        new_buf[:unread] = self.buf[self.read_pos:self.write_pos]
+        self.buf = new_buf
+        self.scan_pos = max(self.scan_pos - self.read_pos, 0)
+        self.read_pos = 0
+        self.write_pos = unread
+
+    def feed(self, data: bytes) -> None:
+        """append received bytes and wake up waiting consumer"""
+        if not data:
+            return
+        with self.condition:
+            self._reserve(len(data))
+            self.buf[self.write_pos:self.write_pos + len(data)] = data
+            self.write_pos += len(data)
+            if self.frame_hook:
+                self._scan()
+            self.condition.notify()
+
+    def recv_into(self, sock: socket.socket, size: int = 65536) -> int:
+        """
+        receive up to size bytes from socket straight into the buffer.
+        returns number of bytes received, 0 means that connection is closed
+        """
+        with self.condition:
+            self._reserve(size)
+            buf = self.buf
+            start = self.write_pos
+        # only this thread moves write cursor or swaps buffers, so it's safe
+        # to block in recv without holding the lock
+        received = sock.recv_into(memoryview(buf)[start:start + size])
+        if received:
+            with self.condition:
+                self.write_pos += received
+                if self.frame_hook:
+                    self._scan()
+                self.condition.notify()
+        return received
+
+    def close(self) -> None:
+        """mark stream as finished and wake up waiting consumer"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def _frame_at(self, pointer: int) -> tuple[int, int]:
+        """
+        returns start and end of frame whose length prefix is at pointer or
+        None if frame isn't complete. must hold the lock
+        """
+        buf = self.buf
+        end = self.write_pos
+        length = 0
+        for shift in range(0, 35, 7):
+            if pointer >= end:
+                return None
+            byte = buf[pointer]
+            pointer += 1
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+        else:
+            raise RuntimeError("Packet length VarInt is too big")
+
+        if end - pointer < length:
+            return None
+        return (pointer, pointer + length)
+
+    def _scan(self):
+        """passes newly completed frames to frame_hook. must hold the lock"""
+        pointer = max(self.scan_pos, self.read_pos)
+        while True:
+            bounds = self._frame_at(pointer)
+            if bounds is None:
+                break
+            self.frame_hook(memoryview(self.buf)[bounds[0]:bounds[1]])
+            pointer = bounds[1]
+        self.scan_pos = pointer
+
+    def _split_frame(self):
+        """returns next complete frame or None. must hold the lock"""
+        bounds = self._frame_at(self.read_pos)
+        if bounds is None:
+            return None
+        self.read_pos = bounds[1]
+        return memoryview(self.buf)[bounds[0]:bounds[1]]
+
+    def next_frame(self, timeout: float = None):
+        """
+        returns memoryview of next packet (without length prefix).
+        blocks until complete packet is received. returns None when stream is
+        closed or timeout expired
+        """
+        with self.condition:
+            while True:
+                frame = self._split_frame()
+                if frame is not None:
+                    return frame
+                if self.closed:
+                    return None
+                if not self.condition.wait(timeout):
+                    return None
+
+    def frames(self):
+        """yields all complete frames that are already buffered"""
+        while True:
+            with self.condition:
+                frame = self._split_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def __len__(self) -> int:
+        """number of buffered unread bytes"""
+        return self.write_pos - self.read_pos
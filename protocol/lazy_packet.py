@@ -0,0 +1,50 @@
+"""
+Packets whose fields are decoded on first access
+"""
+from typing import Callable
+
+
+class LazyPacket:
+    """
+    Wraps raw packet data and a parser(data, pointer) -> (dict, pointer).
+    The parser runs only once, on first field access, e.g. packet.entity_id
+    or packet["entity_id"]
+    """
+    __slots__ = ("state", "packet_id", "_parser", "_data", "_pointer",
+                 "_fields")
+
+    def __init__(self, state: int, packet_id: int, parser: Callable,
+                 data: bytes, pointer: int) -> None:
+        self.state = state
+        self.packet_id = packet_id
+        self._parser = parser
+        self._data = data
+        self._pointer = pointer
+        self._fields = None
+
+    @property
+    def decoded(self) -> bool:
+        """whether fields are already decoded"""
+        return self._fields is not None
+
+    def decode(self) -> dict:
+        """decodes packet (once) and returns dict of its fields"""
+        if self._fields is None:
+            self._fields, _ = self._parser(self._data, self._pointer)
+            # raw data isn't needed anymore
+            self._data = None
+        return self._fields
+
+    def __getattr__(self, name: str):
+        try:
+            return self.decode()[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, name: str):
+        return self.decode()[name]
+
+    def __repr__(self) -> str:
+        if self._fields is None:
+            return f"<LazyPacket {hex(self.packet_id)} (not decoded)>"
+        return f"<LazyPacket {hex(self.packet_id)} {self._fields}>"
@@ -0,0 +1,325 @@
+"""
+NBT reader and writer. Tags are plain Python values: compounds are dicts,
+lists are lists, byte arrays are bytes, int and long arrays are array.array
+"""
+import struct
+import sys
+from array import array
+from protocol.constants import (TAG_BYTE, TAG_BYTE_ARRAY, TAG_COMPOUND,
+                                TAG_DOUBLE, TAG_END, TAG_FLOAT, TAG_INT,
+                                TAG_INT_ARRAY, TAG_LIST, TAG_LONG,
+                                TAG_LONG_ARRAY, TAG_SHORT, TAG_STRING)
+
+# struct of every tag with fixed size payload
+_SCALARS = {
+    TAG_BYTE: struct.Struct(">b"),
+    TAG_SHORT: struct.Struct(">h"),
+    TAG_INT: struct.Struct(">i"),
+    TAG_LONG: struct.Struct(">q"),
+    TAG_FLOAT: struct.Struct(">f"),
+    TAG_DOUBLE: struct.Struct(">d"),
+}
+_SCALAR_FORMATS = {tag: layout.format[1:] for tag, layout in _SCALARS.items()}
+_SCALAR_SIZES = {tag: layout.size for tag, layout in _SCALARS.items()}
+_UShort = struct.Struct(">H")
+_Int = struct.Struct(">i")
+_ARRAYS = {TAG_INT_ARRAY: "i", TAG_LONG_ARRAY: "q"}
+_ARRAY_SIZES = {TAG_BYTE_ARRAY: 1, TAG_INT_ARRAY: 4, TAG_LONG_ARRAY: 8}
+_SWAP = sys.byteorder == "little"
+
+
+def _read_root(data: bytes, pointer: int) -> int:
+    """checks root tag and returns pointer to its payload"""
+    if data[pointer] != TAG_COMPOUND:
+        raise RuntimeError(
+            "Could not pass NBT: given NBT doesn't start with Compound tag")
+    return pointer + 3 + _UShort.unpack_from(data, pointer + 1)[0]
+
+
+def parse_NBT_stream(data: bytes,
+                     pointer: int = 0,
+                     typed: bool = False) -> tuple[dict, int]:
+    """
+    Parses NBT starting with named Compound tag. Returns dict of its tags
+    and pointer after NBT. If typed is set, every tag is (tag_type, value)
+    tuple and lists are (TAG_LIST, (element_type, items)), so write_NBT
+    writes them back with the same types. Name of root tag isn't returned
+    """
+    pointer = _read_root(data, pointer)
+    root = {}
+    # (container, type of list elements or None for compound, items left)
+    stack = [(root, None, 0)]
+    while stack:
+        container, element_type, left = stack[-1]
+        if element_type is None:
+            tag_type = data[pointer]
+            pointer += 1
+            if tag_type == TAG_END:
+                stack.pop()
+                continue
+            length = _UShort.unpack_from(data, pointer)[0]
+            pointer += 2
+            name = str(data[pointer:pointer + length], "utf8",
+                       "surrogatepass")
+            pointer += length
+        else:
+            if left <= 0:
+                stack.pop()
+                continue
+            stack[-1] = (container, element_type, left - 1)
+            tag_type = element_type
+            name = None
+
+        nested = None
+        layout = _SCALARS.get(tag_type)
+        if layout is not None:
+            value = layout.unpack_from(data, pointer)[0]
+            pointer += layout.size
+        elif tag_type == TAG_STRING:
+            length = _UShort.unpack_from(data, pointer)[0]
+            pointer += 2
+            value = str(data[pointer:pointer + length], "utf8",
+                        "surrogatepass")
+            pointer += length
+        elif tag_type == TAG_COMPOUND:
+            value = {}
+            nested = (value, None, 0)
+        elif tag_type == TAG_LIST:
+            list_type = data[pointer]
+            count = max(_Int.unpack_from(data, pointer + 1)[0], 0)
+            pointer += 5
+            if list_type in _SCALARS:
+                # lists of numbers are read at once
+                value = list(
+                    struct.unpack_from(
+                        f">{count}{_SCALAR_FORMATS[list_type]}", data,
+                        pointer))
+                pointer += count * _SCALAR_SIZES[list_type]
+                if typed:
+                    value = [(list_type, number) for number in value]
+            else:
+                value = []
+                nested = (value, list_type, count)
+        elif tag_type in _ARRAY_SIZES:
+            count = max(_Int.unpack_from(data, pointer)[0], 0)
+            pointer += 4
+            end = pointer + count * _ARRAY_SIZES[tag_type]
+            if end > len(data):
+                raise RuntimeError("NBT array is bigger than data")
+            if tag_type == TAG_BYTE_ARRAY:
+                value = bytes(data[pointer:end])
+            else:
+                value = array(_ARRAYS[tag_type])
+                value.frombytes(data[pointer:end])
+                if _SWAP:
+                    value.byteswap()
+            pointer = end
+        else:
+            raise RuntimeError(f"Unknown NBT tag {tag_type}")
+
+        if typed:
+            if tag_type == TAG_LIST:
+                value = (TAG_LIST, (list_type, value))
+            else:
+                value = (tag_type, value)
+        if name is None:
+            container.append(value)
+        else:
+            container[name] = value
+        if nested is not None:
+            stack.append(nested)
+    return (root, pointer)
+
+
+def skip_NBT_stream(data: bytes, pointer: int = 0) -> int:
+    """
+    Skips NBT starting with named Compound tag without decoding it. Returns
+    pointer after NBT
+    """
+    pointer = _read_root(data, pointer)
+    # (type of list elements or None for compound, items left)
+    stack = [(None, 0)]
+    while stack:
+        element_type, left = stack[-1]
+        if element_type is None:
+            tag_type = data[pointer]
+            pointer += 1
+            if tag_type == TAG_END:
+                stack.pop()
+                continue
+            pointer += 2 + _UShort.unpack_from(data, pointer)[0]
+        else:
+            if left <= 0:
+                stack.pop()
+                continue
+            stack[-1] = (element_type, left - 1)
+            tag_type = element_type
+
+        size = _SCALAR_SIZES.get(tag_type)
+        if size is not None:
+            pointer += size
+        elif tag_type == TAG_STRING:
+            pointer += 2 + _UShort.unpack_from(data, pointer)[0]
+        elif tag_type == TAG_COMPOUND:
+            stack.append((None, 0))
+        elif tag_type == TAG_LIST:
+            list_type = data[pointer]
+            count = max(_Int.unpack_from(data, pointer + 1)[0], 0)
+            pointer += 5
+            if list_type in _SCALAR_SIZES:
+                pointer += count * _SCALAR_SIZES[list_type]
+            else:
+                stack.append((list_type, count))
+        elif tag_type in _ARRAY_SIZES:
+            count = max(_Int.unpack_from(data, pointer)[0], 0)
+            pointer += 4 + count * _ARRAY_SIZES[tag_type]
+        else:
+            raise RuntimeError(f"Unknown NBT tag {tag_type}")
+    if pointer > len(data):
+        raise RuntimeError("NBT is bigger than data")
+    return pointer
+
+
+def _tag_of(value) -> tuple[int, object]:
+    """returns tag type and value of plain or (tag_type, value) NBT value"""
+    if isinstance(value, tuple):
+        return value
+    if isinstance(value, bool):
+        return (TAG_BYTE, value)
+    if isinstance(value, int):
+        if -0x80000000 <= value <= 0x7FFFFFFF:
+            return (TAG_INT, value)
+        return (TAG_LONG, value)
+    if isinstance(value, float):
+        return (TAG_DOUBLE, value)
+    if isinstance(value, str):
+        return (TAG_STRING, value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return (TAG_BYTE_ARRAY, value)
+    if isinstance(value, array):
+        if value.typecode == "i":
+            return (TAG_INT_ARRAY, value)
+        if value.typecode == "q":
+            return (TAG_LONG_ARRAY, value)
+    if isinstance(value, list):
+        return (TAG_LIST, value)
+    if isinstance(value, dict):
+        return (TAG_COMPOUND, value)
+    raise TypeError(f"Can't write {type(value).__name__} as NBT")
+
+
+_INTEGERS = frozenset((TAG_BYTE, TAG_SHORT, TAG_INT, TAG_LONG))
+_FLOATS = frozenset((TAG_FLOAT, TAG_DOUBLE))
+
+
+def _list_type(items: list) -> int:
+    """returns tag type of list items"""
+    if not items:
+        return TAG_END
+    tag_type = _tag_of(items[0])[0]
+    if tag_type == TAG_INT and not isinstance(items[0], tuple):
+        # plain ints are written as longs if any of them doesn't fit int
+        for item in items:
+            if _tag_of(item)[0] == TAG_LONG:
+                return TAG_LONG
+    return tag_type
+
+
+def _check_list(items: list, list_type: int):
+    """
+    raises TypeError if an item can't be written as list_type. plain ints
+    fit any number list and plain floats fit float and double lists
+    """
+    for item in items:
+        tag_type = _tag_of(item)[0]
+        if tag_type == list_type or not isinstance(item, tuple) and (
+                tag_type in _INTEGERS and list_type in _INTEGERS | _FLOATS
+                or tag_type in _FLOATS and list_type in _FLOATS):
+            continue
+        raise TypeError(
+            f"Items of NBT list must have the same type: can't write "
+            f"{item!r} to list of tag {list_type}")
+
+
+def _write_string(buffer: bytearray, string: str):
+    encoded = string.encode("utf8", "surrogatepass")
+    buffer += _UShort.pack(len(encoded))
+    buffer += encoded
+
+
+def write_NBT(buffer: bytearray, value: dict, name: str = ""):
+    """
+    Appends value as NBT with named Compound root tag to buffer. value is
+    dict in format returned by parse_NBT_stream. ints are written as
+    TAG_INT or TAG_LONG, floats as TAG_DOUBLE and bools as TAG_BYTE; any
+    value can be given as (tag_type, value) tuple to choose its tag type,
+    e.g. (TAG_SHORT, 1), and list as (TAG_LIST, (element_type, items)) to
+    choose type of its items, which is how typed parse_NBT_stream returns
+    them. Items of a list must have the same tag type, plain numbers take
+    type of the first item
+    """
+    buffer.append(TAG_COMPOUND)
+    _write_string(buffer, name)
+    # (iterator over items, type of list elements or None for compound)
+    stack = [(iter(value.items()), None)]
+    while stack:
+        items, element_type = stack[-1]
+        item = next(items, stack)
+        if item is stack:
+            stack.pop()
+            if element_type is None:
+                buffer.append(TAG_END)
+            continue
+        if element_type is None:
+            tag_type, value = _tag_of(item[1])
+            buffer.append(tag_type)
+            _write_string(buffer, item[0])
+        else:
+            # items were checked by _check_list, plain numbers take type of
+            # the list
+            value = _tag_of(item)[1]
+            tag_type = element_type
+
+        layout = _SCALARS.get(tag_type)
+        if layout is not None:
+            buffer += layout.pack(value)
+        elif tag_type == TAG_STRING:
+            _write_string(buffer, value)
+        elif tag_type == TAG_COMPOUND:
+            stack.append((iter(value.items()), None))
+        elif tag_type == TAG_LIST:
+            if isinstance(value, tuple):
+                list_type, value = value
+            else:
+                list_type = _list_type(value)
+            _check_list(value, list_type)
+            buffer.append(list_type)
+            buffer += _Int.pack(len(value))
+            if list_type in _SCALARS and not any(
+                    isinstance(item, tuple) for item in value):
+                # lists of numbers are written at once
+                buffer += struct.pack(
+                    f">{len(value)}{_SCALAR_FORMATS[list_type]}", *value)
+            elif value:
+                stack.append((iter(value), list_type))
+        elif tag_type == TAG_BYTE_ARRAY:
+            buffer += _Int.pack(len(value))
+            if isinstance(value, (bytes, bytearray, memoryview)):
+                buffer += value
+            else:
+                buffer += array("b", value)
+        elif tag_type in _ARRAYS:
+            numbers = array(_ARRAYS[tag_type], value)
+            if _SWAP:
+                numbers.byteswap()
+            buffer += _Int.pack(len(numbers))
+            buffer += numbers
+        else:
+            raise RuntimeError(f"Unknown NBT tag {tag_type}")
+
+
+def NBT(value: dict, name: str = "") -> bytes:
+    """Minecraft's NBT type, see write_NBT"""
+    buffer = bytearray()
+    write_NBT(buffer, value, name)
+    return bytes(buffer)
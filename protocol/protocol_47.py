@@ -1,21 +1,140 @@
-import json
 import socket
 import threading
 import time
+from collections import deque
+from concurrent.futures import Executor
 from typing import Callable
 import zlib
-from protocol.protocol_types import (
-    String, UShort, VarInt, parse_NBT_stream, parse_entity_metadata,
-    read_Angle, read_Boolean, read_Byte, read_Chat, read_Double, read_Float,
-    read_Int, read_Long, read_Position, read_Short, read_Slot, read_String,
-    read_UByte, read_UShort, read_UUID, read_VarInt)
+from protocol.protocol_types import (VarInt, parse_NBT_stream, read_Boolean,
+                                     read_Byte, read_Chat, read_Int,
+                                     read_Position, read_Short, read_Slot,
+                                     read_String, read_UByte, read_UShort,
+                                     read_UUID, read_VarInt,
+                                     read_VarInt_array)
+from protocol.capture import PacketCapture
+from protocol.chat import LazyChat
+from protocol.codec import (compress_packet_into, decompress_packet,
+                            peek_packet_id)
 from protocol.constants import *
+from protocol.entities import ANGLE_TO_DEGREES, EntityTracker
+from protocol.framer import PacketFramer
+from protocol.lazy_packet import LazyPacket
+from protocol.schema import PacketSchema
+from protocol.stats import PacketStats
+from protocol.world import ChunkColumn, World
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 test = []
 
+# Serverbound packets
+HANDSHAKE = PacketSchema([("protocol_version", "VarInt"),
+                          ("server_address", "String"),
+                          ("server_port", "UShort"), ("next_state", "VarInt")])
+LOGIN_START = PacketSchema([("name", "String")])
+CHAT_MESSAGE = PacketSchema([("message", "String")])
+PLAYER_POSITION = PacketSchema([("x", "Double"), ("y", "Double"),
+                                ("z", "Double"), ("on_ground", "Boolean")])
+PLAYER_LOOK = PacketSchema([("yaw", "Float"), ("pitch", "Float"),
+                            ("on_ground", "Boolean")])
+PLAYER_POSITION_AND_LOOK_SERVERBOUND = PacketSchema([
+    ("x", "Double"), ("y", "Double"), ("z", "Double"), ("yaw", "Float"),
+    ("pitch", "Float"), ("on_ground", "Boolean")
+])
+CREATIVE_INVENTORY_ACTION = PacketSchema([("slot", "Short"),
+                                          ("clicked_item", "Slot")])
+
+# Clientbound packets
+JOIN_GAME = PacketSchema([("entity_id", "Int"), ("gamemode", "UByte"),
+                          ("dimension", "Byte"), ("difficulty", "UByte"),
+                          ("max_players", "UByte"), ("level_type", "String"),
+                          ("reduced_debug_info", "Boolean")])
+TIME_UPDATE = PacketSchema([("world_age", "Long"), ("time_of_day", "Long")])
+ENTITY_EQUIPMENT = PacketSchema([("entity_id", "VarInt"), ("slot", "Short"),
+                                 ("item", "Slot")])
+SPAWN_POSITION = PacketSchema([("location", "Position")])
+PLAYER_POSITION_AND_LOOK = PacketSchema([("x", "Double"), ("y", "Double"),
+                                         ("z", "Double"), ("yaw", "Float"),
+                                         ("pitch", "Float"),
+                                         ("flags", "Byte")])
+ANIMATION = PacketSchema([("entity_id", "VarInt"), ("animation", "UByte")])
+# positions are fixed-point numbers with 5 fraction bits
+SPAWN_PLAYER = PacketSchema([("entity_id", "VarInt"),
+                             ("player_uuid", "UUID"), ("x", "Int", 1 / 32),
+                             ("y", "Int", 1 / 32), ("z", "Int", 1 / 32),
+                             ("yaw", "Angle"), ("pitch", "Angle"),
+                             ("current_item", "Short"),
+                             ("metadata", "EntityMetadata")])
+SPAWN_OBJECT = PacketSchema([("entity_id", "VarInt"), ("entity_type", "Byte"),
+                             ("x", "Int", 1 / 32), ("y", "Int", 1 / 32),
+                             ("z", "Int", 1 / 32), ("pitch", "Angle"),
+                             ("yaw", "Angle"), ("data", "Int")])
+# velocities are in 1/8000 of block per tick
+OBJECT_VELOCITY = PacketSchema([("velocity_x", "Short", 1 / 8000),
+                                ("velocity_y", "Short", 1 / 8000),
+                                ("velocity_z", "Short", 1 / 8000)])
+SPAWN_MOB = PacketSchema([("entity_id", "VarInt"), ("entity_type", "UByte"),
+                          ("x", "Int", 1 / 32), ("y", "Int", 1 / 32),
+                          ("z", "Int", 1 / 32), ("yaw", "Angle"),
+                          ("pitch", "Angle"), ("head_pitch", "Angle"),
+                          ("velocity_x", "Short", 1 / 8000),
+                          ("velocity_y", "Short", 1 / 8000),
+                          ("velocity_z", "Short", 1 / 8000),
+                          ("metadata", "EntityMetadata")])
+SPAWN_EXPERIENCE_ORB = PacketSchema([("entity_id", "VarInt"),
+                                     ("x", "Int", 1 / 32),
+                                     ("y", "Int", 1 / 32),
+                                     ("z", "Int", 1 / 32),
+                                     ("count", "Short")])
+ENTITY_VELOCITY = PacketSchema([("entity_id", "VarInt"),
+                                ("velocity_x", "Short", 1 / 8000),
+                                ("velocity_y", "Short", 1 / 8000),
+                                ("velocity_z", "Short", 1 / 8000)])
+ENTITY = PacketSchema([("entity_id", "VarInt")])
+ENTITY_RELATIVE_MOVE = PacketSchema([("entity_id", "VarInt"),
+                                     ("dx", "Byte", 1 / 32),
+                                     ("dy", "Byte", 1 / 32),
+                                     ("dz", "Byte", 1 / 32),
+                                     ("on_ground", "Boolean")])
+ENTITY_LOOK = PacketSchema([("entity_id", "VarInt"), ("yaw", "Angle"),
+                            ("pitch", "Angle"), ("on_ground", "Boolean")])
+ENTITY_LOOK_AND_RELATIVE_MOVE = PacketSchema([("entity_id", "VarInt"),
+                                              ("dx", "Byte", 1 / 32),
+                                              ("dy", "Byte", 1 / 32),
+                                              ("dz", "Byte", 1 / 32),
+                                              ("yaw", "Angle"),
+                                              ("pitch", "Angle"),
+                                              ("on_ground", "Boolean")])
+ENTITY_TELEPORT = PacketSchema([("entity_id", "VarInt"), ("x", "Int", 1 / 32),
+                                ("y", "Int", 1 / 32), ("z", "Int", 1 / 32),
+                                ("yaw", "Angle"), ("pitch", "Angle"),
+                                ("on_ground", "Boolean")])
+ENTITY_HEAD_LOOK = PacketSchema([("entity_id", "VarInt"),
+                                 ("head_yaw", "Angle")])
+ENTITY_METADATA = PacketSchema([("entity_id", "VarInt"),
+                                ("metadata", "EntityMetadata")])
+EFFECT = PacketSchema([("effect_id", "Int"), ("location", "Position"),
+                       ("data", "Int"),
+                       ("disable_relative_volume", "Boolean")])
+# positions are multiplied by 8
+SOUND_EFFECT = PacketSchema([("sound_name", "String"),
+                             ("effect_position_x", "Int", 1 / 8),
+                             ("effect_position_y", "Int", 1 / 8),
+                             ("effect_position_z", "Int", 1 / 8),
+                             ("volume", "Float"), ("pitch", "UByte")])
+CHANGE_GAME_STATE = PacketSchema([("reason", "UByte"), ("value", "Float")])
+SET_SLOT = PacketSchema([("window_id", "Byte"), ("slot", "Short"),
+                         ("slot_data", "Slot")])
+PLAYER_ABILITIES = PacketSchema([("abilites_flag", "Byte"),
+                                 ("flying_speed", "Float"),
+                                 ("field_of_view_modifier", "Float")])
+
 
 def read_Chunk(packet: bytes, packet_pointer: int, bit_mask: int,
-               continuous: bool, sky_light: bool) -> tuple[list, int]:
+               sky_light: bool, continuous: bool) -> tuple[dict, int]:
     not_empty_chunks_count = bit_mask.bit_count()
     chunk_column_blocks: list[dict] = [None] * 4096 * not_empty_chunks_count
     for i in range(4096 * not_empty_chunks_count):
@@ -58,17 +177,816 @@ def read_Chunk(packet: bytes, packet_pointer: int, bit_mask: int,
     }, packet_pointer)
 
 
+def _read_nibbles_numpy(packet: bytes, packet_pointer: int, count: int):
+    """splits count sections of nibbles into uint8 array of (count,16,16,16)"""
+    raw = np.frombuffer(packet,
+                        dtype=np.uint8,
+                        count=2048 * count,
+                        offset=packet_pointer)
+    nibbles = np.empty(4096 * count, dtype=np.uint8)
+    nibbles[0::2] = raw & 0xF
+    nibbles[1::2] = raw >> 4
+    return nibbles.reshape(count, 16, 16, 16)
+
+
+def read_Chunk_numpy(packet: bytes, packet_pointer: int, bit_mask: int,
+                     sky_light: bool, continuous: bool) -> tuple[dict, int]:
+    """
+    vectorized read_Chunk. requires numpy.
+    returns dict with "sections" that maps section y to dict of dense arrays
+    indexed by [y, z, x]: "blocks" (uint16, block_id << 4 | block_meta),
+    "block_light" and "sky_light" (uint8, sky_light is None if not sent),
+    "biome" is uint8 array of 256 biomes or None, and a pointer
+    """
+    if np is None:
+        raise RuntimeError("read_Chunk_numpy requires numpy")
+    sections_y = [y for y in range(16) if bit_mask >> y & 1]
+    count = len(sections_y)
+
+    blocks = np.frombuffer(packet,
+                           dtype="<u2",
+                           count=4096 * count,
+                           offset=packet_pointer).astype(np.uint16).reshape(
+                               count, 16, 16, 16)
+    packet_pointer += 8192 * count
+
+    block_light = _read_nibbles_numpy(packet, packet_pointer, count)
+    packet_pointer += 2048 * count
+
+    chunk_sky_light = None
+    if sky_light:
+        chunk_sky_light = _read_nibbles_numpy(packet, packet_pointer, count)
+        packet_pointer += 2048 * count
+
+    chunk_biome = None
+    if continuous:
+        chunk_biome = np.frombuffer(packet,
+                                    dtype=np.uint8,
+                                    count=256,
+                                    offset=packet_pointer).copy()
+        packet_pointer += 256
+
+    sections = {}
+    for i, section_y in enumerate(sections_y):
+        sections[section_y] = {
+            "blocks":
+            blocks[i],
+            "block_light":
+            block_light[i],
+            "sky_light":
+            chunk_sky_light[i] if chunk_sky_light is not None else None
+        }
+
+    return ({"sections": sections, "biome": chunk_biome}, packet_pointer)
+
+
+def decode_login_disconnect(client, packet: bytes, pointer: int):
+    """Login 0x00 Disconnect"""
+    reason, pointer = read_Chat(packet, pointer)
+    client.state = STATE_DISCONNECT
+    client.call_state_handler({
+        "state": client.state,
+        "msg": LazyChat(reason)
+    })
+
+
+def decode_login_success(client, packet: bytes, pointer: int):
+    """Login 0x02 Login Success"""
+    client.state = STATE_PLAY
+    client.info["uuid"], pointer = read_String(packet, pointer)
+    client.info["username"], pointer = read_String(packet, pointer)
+    client.call_state_handler({"state": client.state})
+
+
+def decode_set_compression(client, packet: bytes, pointer: int):
+    """Login 0x03 Set Compression"""
+    threshold, pointer = read_VarInt(packet, pointer)
+    # negative threshold disables compression
+    client.compression_enabled = threshold >= 0
+    client.compression_threshold = threshold
+
+
+def decode_keep_alive(client, packet: bytes, pointer: int):
+    """Play 0x00 Keep Alive"""
+    keep_alive_id = bytes(packet[pointer:])
+    answered = client.answered_keep_alives
+    if answered and answered[0] == keep_alive_id:
+        # already answered by fast path. markers are in frame order, so
+        # keep alive that fast path skipped can't take marker of next one
+        answered.popleft()
+        return
+    received = time.perf_counter()
+    client.send_packet(0x00, keep_alive_id, compress=False)
+    client.flush()
+    client.record_keep_alive(received)
+
+
+def decode_join_game(client, packet: bytes, pointer: int):
+    """Play 0x01 Join Game"""
+    fields, pointer = JOIN_GAME.read(packet, pointer)
+    client.info.update(fields)
+
+
+def decode_chat_message(client, packet: bytes, pointer: int):
+    """Play 0x02 Chat Message"""
+    if not client.chat_handler:
+        return
+    chat, pointer = read_Chat(packet, pointer)
+    chat_position, pointer = read_Byte(packet, pointer)
+    client.call_chat_handler({
+        "chat": LazyChat(chat),
+        "chat_position": chat_position
+    })
+
+
+def decode_held_item_change(client, packet: bytes, pointer: int):
+    """Play 0x09 Held Item Change"""
+    client.info["held_item"], pointer = read_Byte(packet, pointer)
+
+
+def decode_chunk_data(client, packet: bytes, pointer: int):
+    """Play 0x21 Chunk Data"""
+    if not client.map_handler and client.world is None:
+        return
+    chunk_x, pointer = read_Int(packet, pointer)
+    chunk_z, pointer = read_Int(packet, pointer)
+    ground_up_continuous, pointer = read_Boolean(packet, pointer)
+    primary_bit_mask, pointer = read_UShort(packet, pointer)
+    size, pointer = read_VarInt(packet, pointer)
+    if ground_up_continuous and not primary_bit_mask:
+        # server tells to unload the column
+        if client.world is not None:
+            client.world.unload_column(chunk_x, chunk_z)
+        client.call_map_handler({
+            "type": MAP_CHUNK_UNLOAD,
+            "chunk_x": chunk_x,
+            "chunk_z": chunk_z
+        })
+        return
+    # TODO: we assume that player is in the Overworld hence sky light is sent
+    if client.world is not None:
+        client.world.load_column(chunk_x, chunk_z, packet, pointer,
+                                 primary_bit_mask, True, ground_up_continuous)
+    if client.map_handler:
+        chunk, pointer = client.chunk_reader(packet, pointer,
+                                             primary_bit_mask, True,
+                                             ground_up_continuous)
+        client.call_map_handler({
+            "type": MAP_CHUNK_DATA,
+            "chunk_x": chunk_x,
+            "chunk_z": chunk_z,
+            "ground_up_continuous": ground_up_continuous,
+            "size": size,
+            "chunk": chunk
+        })
+
+
+def decode_multi_block_change(client, packet: bytes, pointer: int):
+    """Play 0x22 Multi Block Change"""
+    if not client.map_handler and client.world is None:
+        return
+    chunk_x, pointer = read_Int(packet, pointer)
+    chunk_z, pointer = read_Int(packet, pointer)
+    record_count, pointer = read_VarInt(packet, pointer)
+    column = None
+    if client.world is not None:
+        column = client.world.get_column(chunk_x, chunk_z)
+    records = []
+    for _ in range(record_count):
+        horizontal_position, pointer = read_UByte(packet, pointer)
+        x = horizontal_position >> 4
+        z = horizontal_position & 0x0f
+        y, pointer = read_UByte(packet, pointer)
+        block_id, pointer = read_VarInt(packet, pointer)
+        if column is not None:
+            client.world.set_column_block(column, x, y, z, block_id)
+        records.append({"position": (x, y, z), "block_id": block_id})
+    client.call_map_handler({
+        "type": MAP_MULTI_BLOCK_CHANGE,
+        "chunk_x": chunk_x,
+        "chunk_z": chunk_z,
+        "records": records
+    })
+
+
+def decode_block_change(client, packet: bytes, pointer: int):
+    """Play 0x23 Block Change"""
+    if not client.map_handler and client.world is None:
+        return
+    x, y, z, pointer = read_Position(packet, pointer)
+    block_id, pointer = read_VarInt(packet, pointer)
+    if client.world is not None:
+        client.world.set_block(x, y, z, block_id)
+    client.call_map_handler({
+        "type": MAP_BLOCK_CHANGE,
+        "location": (x, y, z),
+        "block_id": block_id
+    })
+
+
+def decode_block_action(client, packet: bytes, pointer: int):
+    """Play 0x24 Block Action"""
+    if not client.map_handler:
+        return
+    x, y, z, pointer = read_Position(packet, pointer)
+    byte_1, pointer = read_UByte(packet, pointer)
+    byte_2, pointer = read_UByte(packet, pointer)
+    block_type, pointer = read_VarInt(packet, pointer)
+    client.call_map_handler({
+        "type": MAP_BLOCK_ACTION,
+        "location": (x, y, z),
+        "byte_1": byte_1,
+        "byte_2": byte_2,
+        "block_type": block_type
+    })
+
+
+def decode_block_break_animation(client, packet: bytes, pointer: int):
+    """Play 0x25 Block Break Animation"""
+    if not client.map_handler:
+        return
+    entity_id, pointer = read_VarInt(packet, pointer)
+    x, y, z, pointer = read_Position(packet, pointer)
+    destroy_stage, pointer = read_Byte(packet, pointer)
+    client.call_map_handler({
+        "type": MAP_BLOCK_BREAK_ANIMATION,
+        "entity_id": entity_id,
+        "location": (x, y, z),
+        "destroy_stage": destroy_stage
+    })
+
+
+def decode_map_chunk_bulk(client, packet: bytes, pointer: int):
+    """Play 0x26 Map Chunk Bulk"""
+    if not client.map_handler and client.world is None:
+        return
+    sky_light_send, pointer = read_Boolean(packet, pointer)
+    chunk_column_count, pointer = read_VarInt(packet, pointer)
+    chunk_meta = []
+    for _ in range(chunk_column_count):
+        chunk_x, pointer = read_Int(packet, pointer)
+        chunk_z, pointer = read_Int(packet, pointer)
+        primary_bit_mask, pointer = read_UShort(packet, pointer)
+        chunk_meta.append({
+            "chunk_x": chunk_x,
+            "chunk_z": chunk_z,
+            "primary_bit_mask": primary_bit_mask
+        })
+    chunks = []
+    for meta in chunk_meta:
+        chunk_pointer = pointer
+        if client.world is not None:
+            pointer = client.world.load_column(meta["chunk_x"],
+                                               meta["chunk_z"], packet,
+                                               chunk_pointer,
+                                               meta["primary_bit_mask"],
+                                               sky_light_send, True)
+        if client.map_handler:
+            chunk, pointer = client.chunk_reader(packet, chunk_pointer,
+                                                 meta["primary_bit_mask"],
+                                                 sky_light_send, True)
+            chunks.append({
+                "chunk_x": meta["chunk_x"],
+                "chunk_z": meta["chunk_z"],
+                "sky_light_send": sky_light_send,
+                "chunk": chunk
+            })
+    client.call_map_handler({"type": MAP_CHUNK_BULK, "chunks": chunks})
+
+
+def decode_player_abilities(client, packet: bytes, pointer: int):
+    """Play 0x39 Player Abilities"""
+    fields, pointer = PLAYER_ABILITIES.read(packet, pointer)
+    client.info.update(fields)
+
+
+def decode_plugin_message(client, packet: bytes, pointer: int):
+    """Play 0x3F Plugin Message"""
+    client.handle_plugin_message(packet[pointer:])
+
+
+def decode_disconnect(client, packet: bytes, pointer: int):
+    """Play 0x40 Disconnect"""
+    reason, pointer = read_Chat(packet, pointer)
+    client.state = STATE_DISCONNECT
+    client.call_state_handler({
+        "state": STATE_DISCONNECT,
+        "msg": LazyChat(reason)
+    })
+
+
+def decode_server_difficulty(client, packet: bytes, pointer: int):
+    """Play 0x41 Server Difficulty"""
+    client.info["difficulty"], pointer = read_UByte(packet, pointer)
+
+
+# Play 0x03 Time Update
+parse_time_update = TIME_UPDATE.read
+# Play 0x04 Entity Equipment
+parse_entity_equipment = ENTITY_EQUIPMENT.read
+# Play 0x05 Spawn Position
+parse_spawn_position = SPAWN_POSITION.read
+# Play 0x08 Player Position And Look
+parse_player_position_and_look = PLAYER_POSITION_AND_LOOK.read
+# Play 0x0B Animation
+parse_animation = ANIMATION.read
+# Play 0x0C Spawn Player
+parse_spawn_player = SPAWN_PLAYER.read
+
+
+def parse_spawn_object(packet: bytes, pointer: int) -> tuple[dict, int]:
+    """Play 0x0E Spawn Object"""
+    fields, pointer = SPAWN_OBJECT.read(packet, pointer)
+    # velocity is sent only if data isn't 0
+    if fields["data"]:
+        velocity, pointer = OBJECT_VELOCITY.read(packet, pointer)
+        fields.update(velocity)
+    return (fields, pointer)
+
+
+# Play 0x0F Spawn Mob
+parse_spawn_mob = SPAWN_MOB.read
+# Play 0x11 Spawn Experience Orb
+parse_spawn_experience_orb = SPAWN_EXPERIENCE_ORB.read
+# Play 0x12 Entity Velocity
+parse_entity_velocity = ENTITY_VELOCITY.read
+
+
+def parse_destroy_entities(packet: bytes, pointer: int) -> tuple[dict, int]:
+    """Play 0x13 Destroy Entities"""
+    count, pointer = read_VarInt(packet, pointer)
+    entity_ids, pointer = read_VarInt_array(packet, pointer, count)
+    return ({"entity_ids": entity_ids}, pointer)
+
+
+# Play 0x14 Entity
+parse_entity = ENTITY.read
+# Play 0x15 Entity Relative Move
+parse_entity_relative_move = ENTITY_RELATIVE_MOVE.read
+# Play 0x16 Entity Look
+parse_entity_look = ENTITY_LOOK.read
+# Play 0x17 Entity Look And Relative Move
+parse_entity_look_and_relative_move = ENTITY_LOOK_AND_RELATIVE_MOVE.read
+# Play 0x18 Entity Teleport
+parse_entity_teleport = ENTITY_TELEPORT.read
+# Play 0x19 Entity Head Look
+parse_entity_head_look = ENTITY_HEAD_LOOK.read
+# Play 0x1C Entity Metadata
+parse_entity_metadata_packet = ENTITY_METADATA.read
+
+
+# Play 0x28 Effect
+parse_effect = EFFECT.read
+# Play 0x29 Sound Effect
+parse_sound_effect = SOUND_EFFECT.read
+# Play 0x2B Change Game State
+parse_change_game_state = CHANGE_GAME_STATE.read
+# Play 0x2F Set Slot
+parse_set_slot = SET_SLOT.read
+
+
+def parse_window_items(packet: bytes, pointer: int) -> tuple[dict, int]:
+    """Play 0x30 Window Items"""
+    window_id, pointer = read_UByte(packet, pointer)
+    count, pointer = read_Short(packet, pointer)
+    items = []
+    for _ in range(count):
+        item_data, pointer = read_Slot(packet, pointer)
+        items.append(item_data)
+    return ({"window_id": window_id, "items": items}, pointer)
+
+
+def parse_update_block_entity(packet: bytes,
+                              pointer: int) -> tuple[dict, int]:
+    """Play 0x35 Update Block Entity"""
+    x, y, z, pointer = read_Position(packet, pointer)
+    action, pointer = read_UByte(packet, pointer)
+    nbt_data, pointer = read_Byte(packet, pointer)
+    if nbt_data != 0:
+        nbt_data, pointer = parse_NBT_stream(packet, pointer - 1)
+    else:
+        nbt_data = {}
+    return ({
+        "location": (x, y, z),
+        "action": action,
+        "nbt_data": nbt_data
+    }, pointer)
+
+
+def parse_statistics(packet: bytes, pointer: int) -> tuple[dict, int]:
+    """Play 0x37 Statistics"""
+    count, pointer = read_VarInt(packet, pointer)
+    statistics = {}
+    for _ in range(count):
+        name, pointer = read_String(packet, pointer)
+        value, pointer = read_VarInt(packet, pointer)
+        statistics[name] = value
+    return ({"statistics": statistics}, pointer)
+
+
+def parse_player_list_item(packet: bytes, pointer: int) -> tuple[dict, int]:
+    """Play 0x38 Player List Item"""
+    action, pointer = read_VarInt(packet, pointer)
+    number_of_player, pointer = read_VarInt(packet, pointer)
+    player_list = []
+    for _ in range(number_of_player):
+        player_UUID, pointer = read_UUID(packet, pointer)
+        if action == ACTION_ADD_PLAYER:
+            player_name, pointer = read_String(packet, pointer)
+            number_of_properties, pointer = read_VarInt(packet, pointer)
+            player_properties = {}
+            for _ in range(number_of_properties):
+                property_name, pointer = read_String(packet, pointer)
+                property_value, pointer = read_String(packet, pointer)
+                property_is_signed, pointer = read_Boolean(packet, pointer)
+                property_signature = ""
+                if property_is_signed:
+                    property_signature, pointer = read_String(packet, pointer)
+                player_properties[property_name] = [
+                    property_value, property_is_signed, property_signature
+                ]
+            player_gamemode, pointer = read_VarInt(packet, pointer)
+            player_ping, pointer = read_VarInt(packet, pointer)
+            player_has_display_name, pointer = read_Boolean(packet, pointer)
+            player_display_name = ""
+            if player_has_display_name:
+                player_display_name, pointer = read_Chat(packet, pointer)
+            player_list.append({
+                "player_uuid": player_UUID,
+                "player_name": player_name,
+                "player_properties": player_properties,
+                "player_gamemode": player_gamemode,
+                "player_ping": player_ping,
+                "player_has_display_name": player_has_display_name,
+                "player_display_name": player_display_name
+            })
+        elif action == ACTION_UPDATE_GAMEMODE:
+            player_gamemode, pointer = read_VarInt(packet, pointer)
+            player_list.append({
+                "player_uuid": player_UUID,
+                "player_gamemode": player_gamemode
+            })
+        elif action == ACTION_UPDATE_LATENCY:
+            player_latency, pointer = read_VarInt(packet, pointer)
+            player_list.append({
+                "player_uuid": player_UUID,
+                "player_latency": player_latency
+            })
+        elif action == ACTION_UPDATE_DISPLAY_NAME:
+            player_has_display_name, pointer = read_Boolean(packet, pointer)
+            player_display_name = ""
+            if player_has_display_name:
+                player_display_name, pointer = read_Chat(packet, pointer)
+            player_list.append({
+                "player_uuid": player_UUID,
+                "player_has_display_name": player_has_display_name,
+                "player_display_name": player_display_name
+            })
+        elif action == ACTION_REMOVE_PLAYER:
+            player_list.append({
+                "player_uuid": player_UUID,
+            })
+    return ({"action": action, "players": player_list}, pointer)
+
+
+def parse_combat_event(packet: bytes, pointer: int) -> tuple[dict, int]:
+    """Play 0x42 Combat Event"""
+    event, pointer = read_VarInt(packet, pointer)
+    duration = 0
+    player_id = 0
+    entity_id = 0
+    message = ""
+    if event == END_COMBAT:
+        duration, pointer = read_VarInt(packet, pointer)
+        entity_id, pointer = read_Int(packet, pointer)
+    if event == ENTITY_DEAD:
+        player_id, pointer = read_VarInt(packet, pointer)
+        entity_id, pointer = read_Int(packet, pointer)
+        message, pointer = read_String(packet, pointer)
+    return ({
+        "event": event,
+        "duration": duration,
+        "player_id": player_id,
+        "entity_id": entity_id,
+        "message": message
+    }, pointer)
+
+
+def track_player_position_and_look(client, fields: dict):
+    """applies Player Position And Look to client position"""
+    flags = fields["flags"]
+    # set bit of flags means that value is relative
+    x, y, z, yaw, pitch = client.position
+    x = fields["x"] + (x if flags & 0x01 else 0)
+    y = fields["y"] + (y if flags & 0x02 else 0)
+    z = fields["z"] + (z if flags & 0x04 else 0)
+    yaw = fields["yaw"] + (yaw if flags & 0x08 else 0)
+    pitch = fields["pitch"] + (pitch if flags & 0x10 else 0)
+    client.position = (x, y, z, yaw, pitch)
+    if client.world is not None:
+        client.world.set_center(x, z)
+
+
+def track_entity_equipment(client, fields: dict):
+    client.entities.set_equipment(fields["entity_id"], fields["slot"],
+                                  fields["item"])
+
+
+def track_spawn_player(client, fields: dict):
+    entity = client.entities.spawn(fields["entity_id"], ENTITY_PLAYER,
+                                   fields["x"], fields["y"], fields["z"],
+                                   fields["yaw"] * ANGLE_TO_DEGREES,
+                                   fields["pitch"] * ANGLE_TO_DEGREES)
+    entity.uuid = fields["player_uuid"]
+    client.entities.update_metadata(fields["entity_id"], fields["metadata"])
+
+
+def track_spawn_object(client, fields: dict):
+    entity = client.entities.spawn(fields["entity_id"], ENTITY_OBJECT,
+                                   fields["x"], fields["y"], fields["z"],
+                                   fields["yaw"] * ANGLE_TO_DEGREES,
+                                   fields["pitch"] * ANGLE_TO_DEGREES)
+    entity.entity_type = fields["entity_type"]
+    if fields["data"]:
+        entity.velocity_x = fields["velocity_x"]
+        entity.velocity_y = fields["velocity_y"]
+        entity.velocity_z = fields["velocity_z"]
+
+
+def track_spawn_mob(client, fields: dict):
+    entity = client.entities.spawn(fields["entity_id"], ENTITY_MOB,
+                                   fields["x"], fields["y"], fields["z"],
+                                   fields["yaw"] * ANGLE_TO_DEGREES,
+                                   fields["pitch"] * ANGLE_TO_DEGREES)
+    entity.entity_type = fields["entity_type"]
+    entity.velocity_x = fields["velocity_x"]
+    entity.velocity_y = fields["velocity_y"]
+    entity.velocity_z = fields["velocity_z"]
+    client.entities.update_metadata(fields["entity_id"], fields["metadata"])
+
+
+def track_spawn_experience_orb(client, fields: dict):
+    client.entities.spawn(fields["entity_id"], ENTITY_EXPERIENCE_ORB,
+                          fields["x"], fields["y"], fields["z"])
+
+
+def track_entity_velocity(client, fields: dict):
+    client.entities.set_velocity(fields["entity_id"], fields["velocity_x"],
+                                 fields["velocity_y"], fields["velocity_z"])
+
+
+def track_destroy_entities(client, fields: dict):
+    client.entities.remove(fields["entity_ids"])
+
+
+def track_entity_relative_move(client, fields: dict):
+    client.entities.move(fields["entity_id"], fields["dx"], fields["dy"],
+                         fields["dz"], fields["on_ground"])
+
+
+def track_entity_look(client, fields: dict):
+    client.entities.look(fields["entity_id"],
+                         fields["yaw"] * ANGLE_TO_DEGREES,
+                         fields["pitch"] * ANGLE_TO_DEGREES,
+                         fields["on_ground"])
+
+
+def track_entity_look_and_relative_move(client, fields: dict):
+    entity_id = fields["entity_id"]
+    client.entities.move(entity_id, fields["dx"], fields["dy"], fields["dz"],
+                         fields["on_ground"])
+    client.entities.look(entity_id, fields["yaw"] * ANGLE_TO_DEGREES,
+                         fields["pitch"] * ANGLE_TO_DEGREES,
+                         fields["on_ground"])
+
+
+def track_entity_teleport(client, fields: dict):
+    client.entities.teleport(fields["entity_id"], fields["x"], fields["y"],
+                             fields["z"], fields["yaw"] * ANGLE_TO_DEGREES,
+                             fields["pitch"] * ANGLE_TO_DEGREES,
+                             fields["on_ground"])
+
+
+def track_entity_head_look(client, fields: dict):
+    client.entities.head_look(fields["entity_id"],
+                              fields["head_yaw"] * ANGLE_TO_DEGREES)
+
+
+def track_entity_metadata(client, fields: dict):
+    client.entities.update_metadata(fields["entity_id"], fields["metadata"])
+
+
+def ignore_packet(_client, _packet: bytes, _pointer: int):
+    """decoder of known packets the client doesn't use"""
+
+
+def parsed_decoder(state: int,
+                   packet_id: int,
+                   parser: Callable,
+                   tracker: Callable = None,
+                   target: str = None) -> Callable:
+    """
+    makes decoder out of parser(packet, pointer) -> (dict, pointer).
+    decoded packet is passed to handler set by set_packet_handler as
+    LazyPacket. if there is no handler and client.skip_unhandled is set,
+    packet isn't decoded at all. tracker(client, fields) is called for
+    every packet to keep client state up to date, unless client attribute
+    named target is None
+    """
+    key = (state, packet_id)
+
+    def decoder(client, packet: bytes, pointer: int):
+        handler = client.packet_handlers.get(key)
+        track = tracker is not None and (target is None or
+                                         getattr(client, target) is not None)
+        if handler:
+            lazy_packet = LazyPacket(state, packet_id, parser, packet,
+                                     pointer)
+            if track:
+                tracker(client, lazy_packet.decode())
+            elif not client.lazy_decoding:
+                lazy_packet.decode()
+            client.call_handler(handler, lazy_packet)
+        elif track:
+            tracker(client, parser(packet, pointer)[0])
+        elif not client.skip_unhandled:
+            parser(packet, pointer)
+
+    return decoder
+
+
+# (state, packet_id) -> parser(packet, pointer) -> (dict, pointer)
+# for packets which don't change client state
+PACKET_PARSERS: dict[tuple[int, int], Callable] = {
+    (STATE_PLAY, 0x03): parse_time_update,
+    (STATE_PLAY, 0x04): parse_entity_equipment,
+    (STATE_PLAY, 0x05): parse_spawn_position,
+    (STATE_PLAY, 0x08): parse_player_position_and_look,
+    (STATE_PLAY, 0x0b): parse_animation,
+    (STATE_PLAY, 0x0c): parse_spawn_player,
+    (STATE_PLAY, 0x0e): parse_spawn_object,
+    (STATE_PLAY, 0x0f): parse_spawn_mob,
+    (STATE_PLAY, 0x11): parse_spawn_experience_orb,
+    (STATE_PLAY, 0x12): parse_entity_velocity,
+    (STATE_PLAY, 0x13): parse_destroy_entities,
+    (STATE_PLAY, 0x14): parse_entity,
+    (STATE_PLAY, 0x15): parse_entity_relative_move,
+    (STATE_PLAY, 0x16): parse_entity_look,
+    (STATE_PLAY, 0x17): parse_entity_look_and_relative_move,
+    (STATE_PLAY, 0x18): parse_entity_teleport,
+    (STATE_PLAY, 0x19): parse_entity_head_look,
+    (STATE_PLAY, 0x1c): parse_entity_metadata_packet,
+    (STATE_PLAY, 0x28): parse_effect,
+    (STATE_PLAY, 0x29): parse_sound_effect,
+    (STATE_PLAY, 0x2b): parse_change_game_state,
+    (STATE_PLAY, 0x2f): parse_set_slot,
+    (STATE_PLAY, 0x30): parse_window_items,
+    (STATE_PLAY, 0x35): parse_update_block_entity,
+    (STATE_PLAY, 0x37): parse_statistics,
+    (STATE_PLAY, 0x38): parse_player_list_item,
+    (STATE_PLAY, 0x42): parse_combat_event,
+}
+
+
+# (state, packet_id) -> decoder(client, packet, pointer)
+PACKET_DECODERS: dict[tuple[int, int], Callable] = {
+    (STATE_LOGIN, 0x00): decode_login_disconnect,
+    (STATE_LOGIN, 0x02): decode_login_success,
+    (STATE_LOGIN, 0x03): decode_set_compression,
+    (STATE_PLAY, 0x00): decode_keep_alive,
+    (STATE_PLAY, 0x01): decode_join_game,
+    (STATE_PLAY, 0x02): decode_chat_message,
+    (STATE_PLAY, 0x09): decode_held_item_change,
+    (STATE_PLAY, 0x0d): ignore_packet,
+    (STATE_PLAY, 0x1a): ignore_packet,
+    (STATE_PLAY, 0x1b): ignore_packet,
+    (STATE_PLAY, 0x20): ignore_packet,
+    (STATE_PLAY, 0x21): decode_chunk_data,
+    (STATE_PLAY, 0x22): decode_multi_block_change,
+    (STATE_PLAY, 0x23): decode_block_change,
+    (STATE_PLAY, 0x24): decode_block_action,
+    (STATE_PLAY, 0x25): decode_block_break_animation,
+    (STATE_PLAY, 0x26): decode_map_chunk_bulk,
+    (STATE_PLAY, 0x27): ignore_packet,
+    (STATE_PLAY, 0x2a): ignore_packet,
+    (STATE_PLAY, 0x2e): ignore_packet,
+    (STATE_PLAY, 0x39): decode_player_abilities,
+    (STATE_PLAY, 0x3f): decode_plugin_message,
+    (STATE_PLAY, 0x40): decode_disconnect,
+    (STATE_PLAY, 0x41): decode_server_difficulty,
+    (STATE_PLAY, 0x44): ignore_packet,
+}
+# (state, packet_id) -> (tracker(client, fields), client attribute it
+# updates or None). trackers change client state from parsed packets and
+# are skipped while that attribute is None
+PACKET_TRACKERS: dict[tuple[int, int], tuple[Callable, str]] = {
+    (STATE_PLAY, 0x04): (track_entity_equipment, "entities"),
+    (STATE_PLAY, 0x08): (track_player_position_and_look, None),
+    (STATE_PLAY, 0x0c): (track_spawn_player, "entities"),
+    (STATE_PLAY, 0x0e): (track_spawn_object, "entities"),
+    (STATE_PLAY, 0x0f): (track_spawn_mob, "entities"),
+    (STATE_PLAY, 0x11): (track_spawn_experience_orb, "entities"),
+    (STATE_PLAY, 0x12): (track_entity_velocity, "entities"),
+    (STATE_PLAY, 0x13): (track_destroy_entities, "entities"),
+    (STATE_PLAY, 0x15): (track_entity_relative_move, "entities"),
+    (STATE_PLAY, 0x16): (track_entity_look, "entities"),
+    (STATE_PLAY, 0x17): (track_entity_look_and_relative_move, "entities"),
+    (STATE_PLAY, 0x18): (track_entity_teleport, "entities"),
+    (STATE_PLAY, 0x19): (track_entity_head_look, "entities"),
+    (STATE_PLAY, 0x1c): (track_entity_metadata, "entities"),
+}
+PACKET_DECODERS.update({
+    key: parsed_decoder(key[0], key[1], parser,
+                        *PACKET_TRACKERS.get(key, (None, None)))
+    for key, parser in PACKET_PARSERS.items()
+})
+
+
+# chunk packets which can be decoded by chunk_executor
+OFFLOADED_PACKETS = (0x21, 0x26)
+# packets which change world and must be applied after pending chunks
+WORLD_PACKETS = (0x21, 0x22, 0x23, 0x26)
+
+
+class _RecordingWorld(World):
+    """World which only records decoded columns and unloads"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.operations = []
+
+    def load_column(self, chunk_x: int, chunk_z: int, packet: bytes,
+                    pointer: int, bit_mask: int, sky_light: bool,
+                    continuous: bool) -> int:
+        column = ChunkColumn(chunk_x, chunk_z)
+        pointer = column.read(packet, pointer, bit_mask, sky_light,
+                              continuous)
+        self.operations.append((chunk_x, chunk_z, column, bit_mask,
+                                continuous))
+        return pointer
+
+    def unload_column(self, chunk_x: int, chunk_z: int):
+        self.operations.append((chunk_x, chunk_z, None, 0, True))
+
+
+class _ChunkSink:
+    """Stand-in for ProtocolClient that collects results of chunk decoders"""
+
+    def __init__(self, track_world: bool, chunk_reader: Callable,
+                 want_events: bool) -> None:
+        self.world = _RecordingWorld() if track_world else None
+        self.chunk_reader = chunk_reader
+        self.map_handler = want_events
+        self.events = []
+
+    def call_map_handler(self, event: dict):
+        self.events.append(event)
+
+
+def decode_chunk_packet(packet_raw: bytes, compression_enabled: bool,
+                        track_world: bool, chunk_reader: Callable,
+                        want_events: bool) -> tuple[list, list]:
+    """
+    decompresses and decodes Chunk Data or Map Chunk Bulk in executor.
+    returns world operations and map events to apply with
+    ProtocolClient.apply_chunk_result
+    """
+    packet = decompress_packet(packet_raw, compression_enabled)
+    packet_id, pointer = read_VarInt(packet)
+    sink = _ChunkSink(track_world, chunk_reader, want_events)
+    PACKET_DECODERS[(STATE_PLAY, packet_id)](sink, packet, pointer)
+    operations = sink.world.operations if track_world else []
+    return (operations, sink.events)
+
+
 class ProtocolClient:
     """Minecraft Protocol Client class"""
 
     def __init__(self) -> None:
         self.socket: socket.socket = None
         self.socket_lock = threading.Lock()
-        self.data_buf = b""
-        self.packets = []
-        self.packets_1 = []
-        self.packets_2 = []
+        self.flush_lock = threading.Lock()
+        self.send_buffer = bytearray()
+        # None sends every packet right away, otherwise queued packets are
+        # sent together every flush_interval seconds
+        self.flush_interval: float = None
+        # queued bytes that trigger flush right away
+        self.flush_threshold = 65536
+        self.flush_data_thread: threading.Thread = None
+        self.flush_data_thread_alive = False
+        self.framer = PacketFramer()
+        # PacketCapture that keeps last received packets, None disables it
+        self.capture: PacketCapture = None
+        # SessionRecorder from protocol.recorder that writes received frames
+        # to a file, None disables it
+        self.recorder = None
+        # PacketStats that measures received packets, None disables it
+        self.stats: PacketStats = None
         self.compression_enabled = False
+        # packets of this size or bigger are compressed
+        self.compression_threshold = -1
+        # zlib level used to compress outgoing packets
+        self.compression_level = zlib.Z_DEFAULT_COMPRESSION
         self.state = STATE_LOGIN
         self.info = {}
         self.receive_data_thread: threading.Thread = None
@@ -76,12 +994,44 @@ class ProtocolClient:
         self.process_data_thread: threading.Thread = None
         self.process_data_thread_alive = False
         self.connected = False
+        self.bytes_received = 0
+        self.packets_received = 0
 
         self.map_handler: Callable = None
         self.chat_handler: Callable = None
         self.state_handler: Callable = None
 
-        self.chunk_data = {}
+        # set to None to stop tracking chunks
+        self.world: World = World()
+        # set to None to stop tracking entities
+        self.entities: EntityTracker = EntityTracker()
+        # x, y, z, yaw, pitch
+        self.position: tuple[float, float, float, float, float] = (0, 0, 0,
+                                                                  0, 0)
+        # read_Chunk or read_Chunk_numpy
+        self.chunk_reader: Callable = read_Chunk
+        # thread or process pool that decodes chunk packets
+        self.chunk_executor: Executor = None
+        # chunk futures and world packets waiting for them, in order
+        self.pending_chunks = deque()
+
+        # answer keep alives as soon as they are received
+        self.keep_alive_fast_path = True
+        # ids of keep alives answered by fast path, in order
+        self.answered_keep_alives: deque[bytes] = deque()
+        self.keep_alive_replies = deque()
+        self.keep_alive_count = 0
+        self.keep_alive_latency = 0.0
+        self.keep_alive_latency_max = 0.0
+        self.keep_alive_latency_total = 0.0
+        self.framer.frame_hook = self._check_keep_alive
+
+        self.decoders = dict(PACKET_DECODERS)
+        self.packet_handlers: dict[tuple[int, int], Callable] = {}
+        # don't decode packets nobody listens to
+        self.skip_unhandled = False
+        # decode packets passed to packet handlers on first field access
+        self.lazy_decoding = False
 
     def create_connection(self, address: tuple[str, int]) -> int:
         """create connection"""
@@ -107,39 +1057,175 @@ class ProtocolClient:
             self.socket.close()
 
     def exit(self):
+        if self.flush_data_thread:
+            self.flush_data_thread_alive = False
+            self.flush_data_thread.join()
+            self.flush()
+        self.process_data_thread_alive = False
+        self.receive_data_thread_alive = False
+        # wakes up process thread waiting for frames and receive thread
+        # blocked in recv
+        self.framer.close()
+        if self.socket:
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                # not connected
+                pass
         if self.process_data_thread:
-            self.process_data_thread_alive = False
             self.process_data_thread.join()
         if self.receive_data_thread:
-            self.receive_data_thread_alive = False
-            self.process_data_thread.join()
+            self.receive_data_thread.join()
         self.close_connection()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def encode_packet_into(self,
+                           buffer: bytearray,
+                           packet_id: int,
+                           packet_data: bytes,
+                           compress: bool = True):
+        """
+        appends length-prefixed packet to buffer. if compress is set, packet
+        is compressed when it reaches compression threshold
+        """
+        packet_id = VarInt(packet_id)
+        data_length = len(packet_id) + len(packet_data)
+        if self.compression_enabled:
+            if compress and data_length >= self.compression_threshold:
+                compress_packet_into(buffer, packet_id, packet_data,
+                                     self.compression_level)
+                return
+            # data length 0 means that packet isn't compressed
+            buffer += VarInt(data_length + 1)
+            buffer += b"\x00"
+        else:
+            buffer += VarInt(data_length)
+        buffer += packet_id
+        buffer += packet_data
+
+    def encode_packet(self,
+                      packet_id: int,
+                      packet_data: bytes,
+                      compress: bool = True) -> bytearray:
+        """returns length-prefixed packet ready to be sent"""
+        buffer = bytearray()
+        self.encode_packet_into(buffer, packet_id, packet_data, compress)
+        return buffer
 
     def send_packet(self,
                     packet_id: int,
                     packet_data: bytes,
                     compress: bool = True):
-        """send packet. blocking"""
+        """
+        send packet. blocking if flush_interval is None, otherwise packet is
+        queued and sent with others by flush thread
+        """
         if not self.is_connected():
             raise RuntimeError("Not connected")
         with self.socket_lock:
-            uncompressed = VarInt(packet_id) + packet_data
-            if self.compression_enabled:
-                if compress:
-                    compressed = zlib.compress(uncompressed)
-                    uncompressed_length = VarInt(len(uncompressed))
-                    packet = uncompressed_length + compressed
-                    self.socket.sendall(
-                        VarInt(len(packet) + len(uncompressed_length)) +
-                        packet)
-                else:
-                    uncompressed_length = VarInt(0)
-                    packet = uncompressed_length + uncompressed
-                    self.socket.sendall(VarInt(len(packet)) + packet)
-                print(VarInt(len(packet)) + packet)
-            else:
-                self.socket.sendall(VarInt(len(uncompressed)) + uncompressed)
-                print(VarInt(len(uncompressed)) + uncompressed)
+            self.encode_packet_into(self.send_buffer, packet_id, packet_data,
+                                    compress)
+            queued = len(self.send_buffer)
+        if self.flush_interval is None or queued >= self.flush_threshold:
+            self.flush()
+
+    def send_many(self, packets: list[tuple]):
+        """
+        send several packets with one write. packets are tuples of
+        (packet_id, packet_data) or (packet_id, packet_data, compress)
+        """
+        if not self.is_connected():
+            raise RuntimeError("Not connected")
+        with self.socket_lock:
+            for packet in packets:
+                self.encode_packet_into(self.send_buffer, *packet)
+            queued = len(self.send_buffer)
+        if self.flush_interval is None or queued >= self.flush_threshold:
+            self.flush()
+
+    def flush(self):
+        """sends all queued packets. blocking"""
+        with self.flush_lock:
+            with self.socket_lock:
+                if not self.send_buffer:
+                    return
+                data = self.send_buffer
+                self.send_buffer = bytearray()
+            self.socket.sendall(data)
+
+    def _flush_data(self):
+        """starts send loop which flushes queued packets every flush_interval"""
+        while self.flush_data_thread_alive:
+            time.sleep(self.flush_interval)
+            if self.send_buffer:
+                self.flush()
+
+    def raw_socket(self) -> socket.socket:
+        """returns underlying socket"""
+        return self.socket
+
+    def set_nodelay(self, enabled: bool = True):
+        """enables or disables TCP_NODELAY (Nagle's algorithm is disabled)"""
+        self.raw_socket().setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,
+                                     int(enabled))
+
+    def set_cork(self, enabled: bool = True):
+        """
+        enables or disables TCP_CORK: while corked, partial frames are held
+        by the kernel until cork is removed. linux only
+        """
+        if not hasattr(socket, "TCP_CORK"):
+            raise RuntimeError("TCP_CORK is not supported on this platform")
+        self.raw_socket().setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK,
+                                     int(enabled))
+
+    def _check_keep_alive(self, frame: memoryview):
+        """framer hook that picks keep alives before they are decoded"""
+        if not self.keep_alive_fast_path or self.state != STATE_PLAY:
+            return
+        pointer = 0
+        if self.compression_enabled:
+            data_length, pointer = read_VarInt(frame)
+            if data_length:
+                return
+        if len(frame) <= pointer or frame[pointer] != 0x00:
+            # empty frames are left for decoder to reject
+            return
+        keep_alive_id = bytes(frame[pointer + 1:])
+        self.answered_keep_alives.append(keep_alive_id)
+        self.keep_alive_replies.append((time.perf_counter(), keep_alive_id))
+
+    def send_keep_alive_replies(self):
+        """answers keep alives picked by fast path"""
+        while self.keep_alive_replies:
+            received, keep_alive_id = self.keep_alive_replies.popleft()
+            self.send_packet(0x00, keep_alive_id, compress=False)
+            self.flush()
+            self.record_keep_alive(received)
+
+    def record_keep_alive(self, received: float):
+        """records time between receiving keep alive and answering it"""
+        latency = time.perf_counter() - received
+        self.keep_alive_count += 1
+        self.keep_alive_latency = latency
+        self.keep_alive_latency_total += latency
+        self.keep_alive_latency_max = max(self.keep_alive_latency_max,
+                                          latency)
+
+    def keep_alive_metrics(self) -> dict:
+        """returns keep alive response latency in seconds"""
+        return {
+            "count":
+            self.keep_alive_count,
+            "last":
+            self.keep_alive_latency,
+            "max":
+            self.keep_alive_latency_max,
+            "avg":
+            self.keep_alive_latency_total /
+            self.keep_alive_count if self.keep_alive_count else 0.0
+        }
 
     def handle_plugin_message(self, data: bytes) -> int:
         """ Handling minecraft plugin messages"""
@@ -149,6 +1235,35 @@ class ProtocolClient:
             self.info["host_brand"], _ = read_String(data, pointer)
         return 0
 
+    def register_decoder(self, state: int, packet_id: int,
+                         decoder: Callable):
+        """
+        sets decoder for packet. decoder is called as
+        decoder(client, packet, pointer) where pointer points right after
+        packet id. replaces previously registered decoder
+        """
+        self.decoders[(state, packet_id)] = decoder
+
+    def unregister_decoder(self, state: int, packet_id: int):
+        """removes decoder for packet"""
+        self.decoders.pop((state, packet_id), None)
+
+    def set_packet_handler(self,
+                           packet_id: int,
+                           handler: Callable,
+                           state: int = STATE_PLAY):
+        """
+        sets handler for packet from PACKET_PARSERS. handler receives
+        LazyPacket with packet fields
+        """
+        if (state, packet_id) not in PACKET_PARSERS:
+            raise ValueError("No parser for packet: " + hex(packet_id))
+        self.packet_handlers[(state, packet_id)] = handler
+
+    def remove_packet_handler(self, packet_id: int, state: int = STATE_PLAY):
+        """removes handler set by set_packet_handler"""
+        self.packet_handlers.pop((state, packet_id), None)
+
     def set_map_handler(self, handler: Callable):
         self.map_handler = handler
 
@@ -158,561 +1273,152 @@ class ProtocolClient:
     def set_state_handler(self, handler: Callable):
         self.state_handler = handler
 
-    #pylint: disable=not-callable
+    def call_handler(self, handler: Callable, *args, **kwargs):
+        """calls user handler. every handler call goes through here"""
+        return handler(*args, **kwargs)
+
     def call_map_handler(self, *args, **kwargs):
         if self.map_handler:
-            self.map_handler(*args, **kwargs)
+            self.call_handler(self.map_handler, *args, **kwargs)
 
     def call_chat_handler(self, *args, **kwargs):
         if self.chat_handler:
-            self.chat_handler(*args, **kwargs)
+            self.call_handler(self.chat_handler, *args, **kwargs)
 
     def call_state_handler(self, *args, **kwargs):
         if self.state_handler:
-            self.state_handler(*args, **kwargs)
+            self.call_handler(self.state_handler, *args, **kwargs)
 
-    #pylint: enable=not-callable
+    def entities_within(self, radius: float, kind: int = None) -> list:
+        """returns tracked entities not farther than radius from client"""
+        if self.entities is None:
+            raise RuntimeError("Entities aren't tracked")
+        x, y, z, _, _ = self.position
+        return self.entities.entities_within(x, y, z, radius, kind)
 
     def _receive_data(self):
         """starts infinite socket receiver loop"""
-        while self.receive_data_thread_alive:
-            data = self.socket.recv(4096)
-            self.packets.append(data)
-            self.data_buf += data
+        try:
+            while self.receive_data_thread_alive:
+                received = self.framer.recv_into(self.socket)
+                if not received:
+                    break
+                self.bytes_received += received
+                if self.keep_alive_replies:
+                    self.send_keep_alive_replies()
+        finally:
+            # wakes up process thread even if socket failed
+            self.connected = False
+            self.framer.close()
 
     def _process_data(self):
         while self.process_data_thread_alive:
-            packet_length = 0
-            if not packet_length:
-                for i in self.data_buf:
-                    if 0x80 & i == 0:
-                        packet_length = read_VarInt(self.data_buf)
-                        break
-                else:
-                    continue
-
-            if len(self.data_buf) - packet_length[1] < packet_length[0]:
-                continue
+            # blocks until whole packet is received, polls while chunks are
+            # decoded in executor
+            packet_raw = self.framer.next_frame(
+                0.01 if self.pending_chunks else None)
+            if packet_raw is None:
+                if self.framer.closed:
+                    self.apply_pending_chunks(wait=True)
+                    break
+            else:
+                if self.recorder is not None:
+                    self.recorder.record(self.state, self.compression_enabled,
+                                         packet_raw)
+                if (self.chunk_executor is None
+                        or not self.offload_packet(packet_raw)):
+                    self.process_packet(packet_raw)
+            if self.pending_chunks:
+                self.apply_pending_chunks()
 
-            # packet is in buffer and ready to be read
-            packet_raw = self.data_buf[:packet_length[0] + packet_length[1]]
-            self.packets_1.append(packet_raw)
-            packet_raw_pointer = packet_length[1]
+    def offload_packet(self, packet_raw: bytes) -> bool:
+        """
+        sends chunk packet to chunk_executor. world packets which arrive
+        while chunks are decoded are queued to keep them in order.
+        returns False if packet must be processed right away
+        """
+        if self.state != STATE_PLAY:
+            return False
+        packet_id = peek_packet_id(packet_raw, self.compression_enabled)
+        if packet_id not in WORLD_PACKETS:
+            return False
+        key = (STATE_PLAY, packet_id)
+        if (packet_id in OFFLOADED_PACKETS
+                and self.decoders.get(key) is PACKET_DECODERS[key]):
+            self.packets_received += 1
+            if self.stats is not None:
+                self.stats.add_offloaded(STATE_PLAY, packet_id,
+                                         len(packet_raw))
+            self.pending_chunks.append(
+                self.chunk_executor.submit(decode_chunk_packet,
+                                           bytes(packet_raw),
+                                           self.compression_enabled,
+                                           self.world is not None,
+                                           self.chunk_reader,
+                                           bool(self.map_handler)))
+            return True
+        if self.pending_chunks:
+            self.pending_chunks.append(packet_raw)
+            return True
+        return False
 
-            if self.compression_enabled:
-                packet_compressed_size, packet_raw_pointer = read_VarInt(
-                    packet_raw, packet_raw_pointer)
-                if packet_compressed_size:
-                    packet = zlib.decompress(packet_raw[packet_raw_pointer:])
-                else:
-                    packet = packet_raw[packet_raw_pointer:]
+    def apply_pending_chunks(self, wait: bool = False):
+        """applies decoded chunks and queued world packets in order"""
+        while self.pending_chunks:
+            pending = self.pending_chunks[0]
+            if not isinstance(pending, (bytes, memoryview)):
+                if not wait and not pending.done():
+                    return
+                self.apply_chunk_result(*pending.result())
             else:
-                packet = packet_raw[packet_raw_pointer:]
-
-            packet_id, packet_pointer = read_VarInt(packet)
-            self.packets_2.append([hex(packet_id), packet])
-
-            if self.state == STATE_LOGIN:
-                if packet_id == 0x00:
-                    reason, packet_pointer = read_Chat(packet, packet_pointer)
-                    self.state = STATE_DISCONNECT
-                    self.call_state_handler({
-                        "state": self.state,
-                        "msg": json.loads(reason)
-                    })
-                elif packet_id == 0x02:
-                    self.state = STATE_PLAY
-                    self.info["uuid"], packet_pointer = read_String(
-                        packet, packet_pointer)
-                    self.info["username"], packet_pointer = read_String(
-                        packet, packet_pointer)
-                    self.call_state_handler({"state": self.state})
-                elif packet_id == 0x03:
-                    self.compression_enabled = True
-
-            elif self.state == STATE_PLAY:
-                if packet_id == 0x00:
-                    # keep_alive_id, packet_pointer = read_VarInt(
-                    #     packet, packet_pointer)
-                    with self.socket_lock:
-                        self.socket.send(packet_raw)
-
-                elif packet_id == 0x01:
-                    self.info["entity_id"], packet_pointer = read_Int(
-                        packet, packet_pointer)
-                    self.info["gamemode"], packet_pointer = read_UByte(
-                        packet, packet_pointer)
-                    self.info["dimension"], packet_pointer = read_Byte(
-                        packet, packet_pointer)
-                    self.info["difficulty"], packet_pointer = read_UByte(
-                        packet, packet_pointer)
-                    self.info["max_players"], packet_pointer = read_UByte(
-                        packet, packet_pointer)
-                    self.info["level_type"], packet_pointer = read_String(
-                        packet, packet_pointer)
-                    self.info[
-                        "reduced_debug_info"], packet_pointer = read_Boolean(
-                            packet, packet_pointer)
-                elif packet_id == 0x02:
-                    # Chat Message
-                    chat, packet_pointer = read_Chat(packet, packet_pointer)
-                    chat_position, packet_pointer = read_Byte(
-                        packet, packet_pointer)
-                    self.call_chat_handler({
-                        "chat": chat,
-                        "chat_position": chat_position
-                    })
-                elif packet_id == 0x3f:
-                    # Plugin Message
-                    self.handle_plugin_message(packet[packet_pointer:])
-                elif packet_id == 0x41:
-                    # Server Difficulty
-                    self.info["difficulty"], packet_pointer = read_UByte(
-                        packet, packet_pointer)
-                elif packet_id == 0x05:
-                    # Spawn Position
-                    x, y, z, packet_pointer = read_Position(
-                        packet, packet_pointer)
-                elif packet_id == 0x39:
-                    # Player abilities
-                    self.info["abilites_flag"], packet_pointer = read_Byte(
-                        packet, packet_pointer)
-                    self.info["flying_speed"], packet_pointer = read_Float(
-                        packet, packet_pointer)
-                    self.info[
-                        "field_of_view_modifier"], packet_pointer = read_Float(
-                            packet, packet_pointer)
-                elif packet_id == 0x09:
-                    # Held item change
-                    self.info["held_item"], packet_pointer = read_Byte(
-                        packet, packet_pointer)
-                elif packet_id == 0x37:
-                    # Statistics
-                    count, packet_pointer = read_VarInt(packet, packet_pointer)
-                    statistics = {}
-                    for i in range(count):
-                        name, packet_pointer = read_String(
-                            packet, packet_pointer)
-                        value, packet_pointer = read_VarInt(
-                            packet, packet_pointer)
-                        statistics[name] = value
-                elif packet_id == 0x38:
-                    # Player List Item
-                    action, packet_pointer = read_VarInt(
-                        packet, packet_pointer)
-                    number_of_player, packet_pointer = read_VarInt(
-                        packet, packet_pointer)
-                    player_list = []
-                    for i in range(number_of_player):
-                        player_UUID, packet_pointer = read_UUID(
-                            packet, packet_pointer)
-                        if action == ACTION_ADD_PLAYER:
-                            player_name, packet_pointer = read_String(
-                                packet, packet_pointer)
-                            number_of_properties, packet_pointer = read_VarInt(
-                                packet, packet_pointer)
-                            player_properties = {}
-                            for _ in range(number_of_properties):
-                                property_name, packet_pointer = read_String(
-                                    packet, packet_pointer)
-                                property_value, packet_pointer = read_String(
-                                    packet, packet_pointer)
-                                property_is_signed, packet_pointer = read_Boolean(
-                                    packet, packet_pointer)
-                                property_signature = ""
-                                if property_is_signed:
-                                    property_signature, packet_pointer = read_String(
-                                        packet, packet_pointer)
-                                player_properties[property_name] = [
-                                    property_value, property_is_signed,
-                                    property_signature
-                                ]
-                            player_gamemode, packet_pointer = read_VarInt(
-                                packet, packet_pointer)
-                            player_ping, packet_pointer = read_VarInt(
-                                packet, packet_pointer)
-                            player_has_display_name, packet_pointer = read_Boolean(
-                                packet, packet_pointer)
-                            player_display_name = ""
-                            if player_has_display_name:
-                                player_display_name, packet_pointer = read_Chat(
-                                    packet, packet_pointer)
-                            player_list.append({
-                                "player_uuid":
-                                player_UUID,
-                                "player_name":
-                                player_name,
-                                "player_properties":
-                                player_properties,
-                                "player_gamemode":
-                                player_gamemode,
-                                "player_ping":
-                                player_ping,
-                                "player_has_display_name":
-                                player_has_display_name,
-                                "player_display_name":
-                                player_display_name
-                            })
-                        elif action == ACTION_UPDATE_GAMEMODE:
-                            player_gamemode, packet_pointer = read_VarInt(
-                                packet, packet_pointer)
-                            player_list.append({
-                                "player_uuid":
-                                player_UUID,
-                                "player_gamemode":
-                                player_gamemode
-                            })
-                        elif action == ACTION_UPDATE_LATENCY:
-                            player_latency, packet_pointer = read_VarInt(
-                                packet, packet_pointer)
-                            player_list.append({
-                                "player_uuid": player_UUID,
-                                "player_latency": player_latency
-                            })
-                        elif action == ACTION_UPDATE_DISPLAY_NAME:
-                            player_has_display_name, packet_pointer = read_Boolean(
-                                packet, packet_pointer)
-                            player_display_name = ""
-                            if player_has_display_name:
-                                player_display_name, packet_pointer = read_Chat(
-                                    packet, packet_pointer)
-                            player_list.append({
-                                "player_uuid":
-                                player_UUID,
-                                "player_has_display_name":
-                                player_has_display_name,
-                                "player_display_name":
-                                player_display_name
-                            })
-                        elif action == ACTION_REMOVE_PLAYER:
-                            player_list.append({
-                                "player_uuid": player_UUID,
-                            })
-                elif packet_id == 0x08:
-                    # Player Position And Look
-                    # TODO: relative and absolute
-                    player_x, packet_pointer = read_Double(
-                        packet, packet_pointer)
-                    player_y, packet_pointer = read_Double(
-                        packet, packet_pointer)
-                    player_z, packet_pointer = read_Double(
-                        packet, packet_pointer)
-                    player_yaw, packet_pointer = read_Float(
-                        packet, packet_pointer)
-                    player_pitch, packet_pointer = read_Float(
-                        packet, packet_pointer)
-                    player_flags, packet_pointer = read_Byte(
-                        packet, packet_pointer)
-                elif packet_id == 0x44:
-                    # World Border
-                    # TODO: implement
-                    pass
-                elif packet_id == 0x03:
-                    # Time Update
-                    # TODO: implement
-                    world_age, packet_pointer = read_Long(
-                        packet, packet_pointer)
-                    time_of_day, packet_pointer = read_Long(
-                        packet, packet_pointer)
-                elif packet_id == 0x30:
-                    # Window Items
-                    window_id, packet_pointer = read_UByte(
-                        packet, packet_pointer)
-                    count, packet_pointer = read_Short(packet, packet_pointer)
-                    items = []
-                    for i in range(count):
-                        item_data, packet_pointer = read_Slot(
-                            packet, packet_pointer)
-                        items.append(item_data)
-                elif packet_id == 0x40:
-                    # Disconnect
-                    reason, packet_pointer = read_Chat(packet, packet_pointer)
-                    self.state = STATE_DISCONNECT
-                    self.call_state_handler({
-                        "state": STATE_DISCONNECT,
-                        "msg": reason
-                    })
-                elif packet_id == 0x2f:
-                    window_id, packet_pointer = read_Byte(
-                        packet, packet_pointer)
-                    slot, packet_pointer = read_Short(packet, packet_pointer)
-                    slot_data, packet_pointer = read_Slot(
-                        packet, packet_pointer)
-                elif packet_id == 0x35:
-                    x, y, z, packet_pointer = read_Position(
-                        packet, packet_pointer)
-                    action, packet_pointer = read_UByte(packet, packet_pointer)
-                    nbt_data, packet_pointer = read_Byte(
-                        packet, packet_pointer)
-                    if nbt_data != 0:
-                        nbt_data = parse_NBT_stream(packet, packet_pointer - 1)
-                elif packet_id == 0x0f:
-                    pass
-                elif packet_id == 0x2f:
-                    window_id, packet_pointer = read_Byte(
-                        packet, packet_pointer)
-                    slot, packet_pointer = read_Short(packet, packet_pointer)
-                    slot_data, packet_pointer = read_Slot(
-                        packet, packet_pointer)
-                elif packet_id == 0x1c:
-                    entity_id, packet_pointer = read_VarInt(
-                        packet, packet_pointer)
-                elif packet_id == 0x20:
-                    pass
-                elif packet_id == 0x19:
-                    pass
-                elif packet_id == 0x0e:
-                    pass
-                elif packet_id == 0x12:
-                    pass
-                elif packet_id == 0x18:
-                    pass
-                elif packet_id == 0x15:
-                    pass
-                elif packet_id == 0x17:
-                    pass
-                elif packet_id == 0x1a:
-                    pass
-                elif packet_id == 0x21:
-                    if self.map_handler:
-                        chunk_x, packet_pointer = read_Int(
-                            packet, packet_pointer)
-                        chunk_z, packet_pointer = read_Int(
-                            packet, packet_pointer)
-                        ground_up_continuous, packet_pointer = read_Boolean(
-                            packet, packet_pointer)
-                        primary_bit_mask, packet_pointer = read_UShort(
-                            packet, packet_pointer)
-                        size, packet_pointer = read_VarInt(
-                            packet, packet_pointer)
-                        # TODO: we assume that player is in the Overworld hence sky light is sent
-                        chunk, packet_pointer = read_Chunk(
-                            packet, packet_pointer, primary_bit_mask, True,
-                            ground_up_continuous)
-                        self.call_map_handler({
-                            "type": MAP_CHUNK_DATA,
-                            "chunk_x": chunk_x,
-                            "chunk_z": chunk_z,
-                            "ground_up_continuous": ground_up_continuous,
-                            "size": size,
-                            "chunk": chunk
-                        })
-
-                elif packet_id == 0x22:
-                    if self.map_handler:
-                        chunk_x, packet_pointer = read_Int(
-                            packet, packet_pointer)
-                        chunk_z, packet_pointer = read_Int(
-                            packet, packet_pointer)
-                        record_count, packet_pointer = read_VarInt(
-                            packet, packet_pointer)
-                        records = []
-                        for i in range(record_count):
-                            horizontal_position, packet_pointer = read_UByte(
-                                packet, packet_pointer)
-                            x = horizontal_position & 0xf0
-                            z = horizontal_position & 0x0f
-                            y, packet_pointer = read_UByte(
-                                packet, packet_pointer)
-                            block_id, packet_pointer = read_VarInt(
-                                packet, packet_pointer)
-                            records.append({
-                                "position": (x, y, z),
-                                "block_id": block_id
-                            })
-                        self.call_map_handler({
-                            "type": MAP_MULTI_BLOCK_CHANGE,
-                            "chunk_x": chunk_x,
-                            "chunk_z": chunk_z,
-                            "records": records
-                        })
-                elif packet_id == 0x23:
-                    if self.map_handler:
-                        x, y, z, packet_pointer = read_Position(
-                            packet, packet_pointer)
-                        block_id, packet_pointer = read_VarInt(
-                            packet, packet_pointer)
-                        self.call_map_handler({
-                            "type": MAP_BLOCK_CHANGE,
-                            "location": (x, y, z),
-                            "block_id": block_id
-                        })
-                elif packet_id == 0x24:
-                    if self.map_handler:
-                        x, y, z, packet_pointer = read_Position(
-                            packet, packet_pointer)
-                        byte_1, packet_pointer = read_UByte(
-                            packet, packet_pointer)
-                        byte_2, packet_pointer = read_UByte(
-                            packet, packet_pointer)
-                        block_type, packet_pointer = read_VarInt(
-                            packet, packet_pointer)
-                        self.call_map_handler({
-                            "type": MAP_BLOCK_ACTION,
-                            "location": (x, y, z),
-                            "byte_1": byte_1,
-                            "byte_2": byte_2,
-                            "block_type": block_type
-                        })
-                elif packet_id == 0x25:
-                    if self.map_handler:
-                        entity_id, packet_pointer = read_VarInt(
-                            packet, packet_pointer)
-                        x, y, z, packet_pointer = read_Position(
-                            packet, packet_pointer)
-                        destroy_stage, packet_pointer = read_Byte(
-                            packet, packet_pointer)
-                        self.call_map_handler({
-                            "type": MAP_BLOCK_BREAK_ANIMATION,
-                            "entity_id": entity_id,
-                            "location": (x, y, z),
-                            "destroy_stage": destroy_stage
-                        })
-                elif packet_id == 0x26:
-                    # bulk
-                    if self.map_handler:
-                        sky_light_send, packet_pointer = read_Boolean(
-                            packet, packet_pointer)
-                        chunk_column_count, packet_pointer = read_VarInt(
-                            packet, packet_pointer)
-                        chunk_meta = []
-                        for i in range(chunk_column_count):
-                            chunk_x, packet_pointer = read_Int(
-                                packet, packet_pointer)
-                            chunk_z, packet_pointer = read_Int(
-                                packet, packet_pointer)
-                            primary_bit_mask, packet_pointer = read_UShort(
-                                packet, packet_pointer)
-                            chunk_meta.append({
-                                "chunk_x":
-                                chunk_x,
-                                "chunk_z":
-                                chunk_z,
-                                "primary_bit_mask":
-                                primary_bit_mask
-                            })
-                        chunks = []
-                        for meta in chunk_meta:
-                            chunk, packet_pointer = read_Chunk(
-                                packet, packet_pointer,
-                                meta["primary_bit_mask"], sky_light_send, True)
-                            chunks.append({
-                                "chunk_x": meta["chunk_x"],
-                                "chunk_z": meta["chunk_z"],
-                                "sky_light_send": sky_light_send,
-                                "chunk": chunk
-                            })
-                        self.call_map_handler({
-                            "type": MAP_CHUNK_BULK,
-                            "chunks": chunks
-                        })
-
-                elif packet_id == 0x16:
-                    pass
-                elif packet_id == 0x29:
-                    sound_name, packet_pointer = read_String(
-                        packet, packet_pointer)
-                    effect_position_x, packet_pointer = read_Int(
-                        packet, packet_pointer)
-                    effect_position_x *= 8
-                    effect_position_y, packet_pointer = read_Int(
-                        packet, packet_pointer)
-                    effect_position_y *= 8
-                    effect_position_z, packet_pointer = read_Int(
-                        packet, packet_pointer)
-                    effect_position_z *= 8
-                    volume, packet_pointer = read_Float(packet, packet_pointer)
-                    pitch, packet_pointer = read_UByte(packet, packet_pointer)
-                elif packet_id == 0x28:
-                    pass
-                    effect_id, packet_pointer = read_Int(
-                        packet, packet_pointer)
-                    x, y, z, packet_pointer = read_Position(
-                        packet, packet_pointer)
-                    data, packet_pointer = read_Int(packet, packet_pointer)
-                    disable_relative_volume, packet_pointer = read_Boolean(
-                        packet, packet_pointer)
-                elif packet_id == 0x13:
-                    count, packet_pointer = read_VarInt(packet, packet_pointer)
-                    entity_ids = []
-                    for i in range(count):
-                        tmp, packet_pointer = read_VarInt(
-                            packet, packet_pointer)
-                        entity_ids.append(tmp)
-                elif packet_id == 0x0c:
-                    entity_id, packet_pointer = read_VarInt(
-                        packet, packet_pointer)
-                    player_uuid, packet_pointer = read_UUID(
-                        packet, packet_pointer)
-                    x, packet_pointer = read_Int(packet, packet_pointer)
-                    x = (x & 0x1f) * (1 / 32) + ((x & ~(0x1f)) >> 5)
-                    y, packet_pointer = read_Int(packet, packet_pointer)
-                    y = (y & 0x1f) * (1 / 32) + ((y & ~(0x1f)) >> 5)
-                    z, packet_pointer = read_Int(packet, packet_pointer)
-                    z = (z & 0x1f) * (1 / 32) + ((z & ~(0x1f)) >> 5)
-                    yaw, packet_pointer = read_Angle(packet, packet_pointer)
-                    pitch, packet_pointer = read_Angle(packet, packet_pointer)
-                    current_item, packet_pointer = read_Short(
-                        packet, packet_pointer)
-                    metadata, packet_pointer = parse_entity_metadata(
-                        packet, packet_pointer)
-                elif packet_id == 0x04:
-                    entity_id, packet_pointer = read_VarInt(
-                        packet, packet_pointer)
-                    slot, packet_pointer = read_Short(packet, packet_pointer)
-                    item, packet_pointer = read_Slot(packet, packet_pointer)
-                elif packet_id == 0x0b:
-                    entity_id, packet_pointer = read_VarInt(
-                        packet, packet_pointer)
-                    animation, packet_pointer = read_UByte(
-                        packet, packet_pointer)
-                elif packet_id == 0x42:
-                    event, packet_pointer = read_VarInt(packet, packet_pointer)
-                    duration = 0
-                    player_id = 0
-                    entity_id = 0
-                    message = ""
-                    if event == END_COMBAT:
-                        duration, packet_pointer = read_VarInt(
-                            packet, packet_pointer)
-                        entity_id, packet_pointer = read_Int(
-                            packet, packet_pointer)
-                    if event == ENTITY_DEAD:
-                        player_id, packet_pointer = read_VarInt(
-                            packet, packet_pointer)
-                        entity_id, packet_pointer = read_Int(
-                            packet, packet_pointer)
-                        message, packet_pointer = read_String(
-                            packet, packet_pointer)
-                elif packet_id == 0x2e:
-                    pass
-                elif packet_id == 0x27:
-                    pass
-                elif packet_id == 0x2a:
-                    pass
-                elif packet_id == 0x2b:
-                    reason, packet_pointer = read_UByte(packet, packet_pointer)
-                    value, packet_pointer = read_Float(packet, packet_pointer)
-                elif packet_id == 0x0d:
-                    pass
-                elif packet_id == 0x1b:
-                    pass
-                elif packet_id == 0x11:
-                    pass
+                self.process_packet(pending)
+            self.pending_chunks.popleft()
+
+    def apply_chunk_result(self, operations: list, events: list):
+        """applies result of decode_chunk_packet"""
+        if self.world is not None:
+            for chunk_x, chunk_z, column, bit_mask, continuous in operations:
+                if column is None:
+                    self.world.unload_column(chunk_x, chunk_z)
                 else:
-                    raise RuntimeError("Ran into not implemented packet: " +
-                                       hex(packet_id))
+                    self.world.put_column(column, bit_mask, continuous)
+        for event in events:
+            self.call_map_handler(event)
+
+    def process_packet(self, packet_raw: bytes) -> tuple[int, int, bytes, int]:
+        """
+        decompresses and decodes one packet (without length prefix).
+        returns state in which packet was received, packet id, decompressed
+        packet and pointer to packet data
+        """
+        self.packets_received += 1
+        stats = self.stats
+        if stats is not None:
+            started = time.perf_counter_ns()
+        packet = decompress_packet(packet_raw, self.compression_enabled)
+        if stats is not None:
+            decompressed = time.perf_counter_ns()
+
+        packet_id, packet_pointer = read_VarInt(packet)
 
-            # clear data buffer and go on
-            self.data_buf = self.data_buf[packet_length[0] + packet_length[1]:]
+        state = self.state
+        if self.capture is not None:
+            self.capture.add(state, packet_id, packet)
+        decoder = self.decoders.get((state, packet_id))
+        if decoder:
+            decoder(self, packet, packet_pointer)
+        elif state == STATE_PLAY:
+            raise RuntimeError("Ran into not implemented packet: " +
+                               hex(packet_id))
+        if stats is not None:
+            stats.add(state, packet_id, len(packet_raw), len(packet),
+                      decompressed - started,
+                      time.perf_counter_ns() - decompressed)
+        return (state, packet_id, packet, packet_pointer)
 
     def login_as(self, nickname: str):
         """Logins to minecraft server"""
-        handshake_packet = VarInt(47) + String("localhost") + UShort(
-            "25565") + VarInt(2)
-        self.send_packet(0x00, handshake_packet)
-        login_start_packet = String(nickname)
-        self.send_packet(0x00, login_start_packet)
+        self.send_login_packets(nickname)
 
         self.receive_data_thread_alive = True
         self.receive_data_thread = threading.Thread(target=self._receive_data,
@@ -724,6 +1430,22 @@ class ProtocolClient:
                                                     daemon=True)
         self.process_data_thread.start()
 
+        if self.flush_interval is not None:
+            self.flush_data_thread_alive = True
+            self.flush_data_thread = threading.Thread(target=self._flush_data,
+                                                      daemon=True)
+            self.flush_data_thread.start()
+
+    def send_login_packets(self, nickname: str):
+        """sends Handshake and Login Start"""
+        handshake_packet = HANDSHAKE.write(protocol_version=47,
+                                           server_address="localhost",
+                                           server_port=25565,
+                                           next_state=2)
+        login_start_packet = LOGIN_START.write(name=nickname)
+        self.send_many([(0x00, handshake_packet), (0x00, login_start_packet)])
+        self.flush()
+
     def join_threads(self):
         """Joins threads in order to keep connection when main thread finishes"""
         self.receive_data_thread.join()
@@ -1,130 +1,14 @@
 """
 Internal stuff for convenient use
 """
+import functools
+import os
 import struct
 import uuid
-from protocol.protocol_tools import (logical_rshift32, logical_rshift64,
-                                     signed_to_int, signed32bit_to_int,
-                                     signed64bit_to_int)
-
-TAG_END = 0
-TAG_BYTE = 1
-TAG_SHORT = 2
-TAG_INT = 3
-TAG_LONG = 4
-TAG_FLOAT = 5
-TAG_DOUBLE = 6
-TAG_BYTE_ARRAY = 7
-TAG_STRING = 8
-TAG_LIST = 9
-TAG_COMPOUND = 10
-TAG_INT_ARRAY = 11
-TAG_LONG_ARRAY = 12
-
-
-def parse_NBT_stream(data: bytes, pointer: int = 0) -> tuple[dict, int]:
-    """Parses NBT bytes stream. Returns parsed NBT in dict and length of NBT in bytes"""
-
-    def parse_tag(data0: bytes,
-                  pointer0: int,
-                  force_tag_type: int = 0,
-                  have_name: bool = True) -> tuple[dict, int]:
-        if not force_tag_type:
-            tag_type = data0[pointer0]
-            if tag_type == TAG_END or not have_name:
-                pointer0 += 1
-                name = ""
-            else:
-                name_length = int.from_bytes(data0[pointer0 + 1:pointer0 + 3],
-                                             "big")
-                name = data0[pointer0 + 3:pointer0 + 3 + name_length]
-                pointer0 += name_length + 3
-        else:
-            tag_type = force_tag_type
-            if tag_type == TAG_END or not have_name:
-                name = ""
-            else:
-                name_length = int.from_bytes(data0[pointer0:pointer0 + 2],
-                                             "big")
-                name = data0[pointer0 + 2:pointer0 + 2 + name_length]
-                pointer0 += name_length + 2
-        if tag_type == TAG_END:
-            children = []
-        elif tag_type == TAG_BYTE:
-            children = [(data0[pointer0:pointer0 + 1] ^ 0x80) - 0x80]
-            pointer0 += 1
-        elif tag_type == TAG_SHORT:
-            children = [
-                int.from_bytes(data0[pointer0:pointer0 + 2],
-                               "big",
-                               signed=True)
-            ]
-            pointer0 += 2
-        elif tag_type == TAG_INT:
-            children = [
-                int.from_bytes(data0[pointer0:pointer0 + 4],
-                               "big",
-                               signed=True)
-            ]
-            pointer0 += 4
-        elif tag_type == TAG_LONG:
-            children = [
-                int.from_bytes(data0[pointer0:pointer0 + 8],
-                               "big",
-                               signed=True)
-            ]
-            pointer0 += 8
-        elif tag_type == TAG_FLOAT:
-            children = [struct.unpack(">f", data0[pointer0:pointer0 + 4])]
-            pointer0 += 4
-        elif tag_type == TAG_DOUBLE:
-            children = [struct.unpack(">d", data0[pointer0:pointer0 + 8])]
-            pointer0 += 8
-        elif tag_type == TAG_BYTE_ARRAY:
-            array_size = int.from_bytes(data0[pointer0:pointer0 + 4], "big")
-            pointer0 += 4
-            children = [(byte[0] ^ 0x80) - 0x80
-                        for byte in data0[pointer0:pointer0 + array_size]]
-            pointer0 += array_size
-        elif tag_type == TAG_STRING:
-            string_length = int.from_bytes(data0[pointer0:pointer0 + 2], "big")
-            pointer0 += 2
-            children = [
-                data0[pointer0:pointer0 + string_length].decode("utf8")
-            ]
-            pointer0 += string_length
-        elif tag_type == TAG_LIST:
-            list_tag_id = (data0[pointer0] ^ 0x80) - 0x80
-            list_size = int.from_bytes(data0[pointer0 + 1:pointer0 + 5],
-                                       "big",
-                                       signed=True)
-            pointer0 += 5
-            children = []
-            for _ in range(list_size):
-                parsed, pointer0 = parse_tag(data0,
-                                             pointer0,
-                                             force_tag_type=list_tag_id,
-                                             have_name=False)
-                children.append(parsed)
-        elif tag_type == TAG_COMPOUND:
-            children = []
-            while True:
-                parsed, pointer0 = parse_tag(data0, pointer0)
-                if parsed["type"] == TAG_END:
-                    break
-                children.append(parsed)
-
-        return ({
-            "type": tag_type,
-            "name": name,
-            "children": children
-        }, pointer0)
-
-    if data[pointer] != TAG_COMPOUND:
-        raise RuntimeError(
-            "Could not pass NBT: given NBT doesn't start with Compound tag")
-
-    return parse_tag(data, pointer)
+from typing import Callable
+from protocol.constants import TAG_END
+from protocol.nbt import parse_NBT_stream, write_NBT
+from protocol.protocol_tools import logical_rshift64, signed_to_int
 
 
 def parse_entity_metadata(data: bytes, pointer: int) -> tuple[dict, int]:
@@ -273,32 +157,34 @@ def Double(value: float) -> bytes:
     return struct.pack(">d", value)
 
 
+def _encode_var(value: int) -> bytes:
+    """encodes unsigned int as variable length quantity"""
+    buf = bytearray()
+    while value > 0x7F:
+        buf.append(value & 0x7F | 0x80)
+        value >>= 7
+    buf.append(value)
+    return bytes(buf)
+
+
+# encoded VarInts of small non-negative values, most VarInts in packets are
+# lengths, ids and counts that fit into one or two bytes
+VARINT_TABLE_SIZE = 4096
+_VARINT_TABLE = tuple(_encode_var(i) for i in range(VARINT_TABLE_SIZE))
+
+
 def VarInt(value: int) -> bytes:
     """Minecraft's VarInt type"""
-    buf = b''
-    while True:
-        towrite = value & 0x7f
-        value = logical_rshift32(value, 7)
-        if value:
-            buf += bytes((towrite | 0x80, ))
-        else:
-            buf += bytes((towrite, ))
-            break
-    return buf
+    if 0 <= value < VARINT_TABLE_SIZE:
+        return _VARINT_TABLE[value]
+    return _encode_var(value & 0xFFFFFFFF)
 
 
 def VarLong(value: int) -> bytes:
     """Minecraft's VarLong type"""
-    buf = b''
-    while True:
-        towrite = value & 0x7F
-        value = logical_rshift64(value, 7)
-        if value:
-            buf += bytes((towrite | 0x80, ))
-        else:
-            buf += bytes((towrite, ))
-            break
-    return buf
+    if 0 <= value < VARINT_TABLE_SIZE:
+        return _VARINT_TABLE[value]
+    return _encode_var(value & 0xFFFFFFFFFFFFFFFF)
 
 
 def String(string: str) -> bytes:
@@ -321,7 +207,7 @@ def Identifier(string: str) -> bytes:
 
 def UUID(my_uuid: uuid.UUID) -> bytes:
     """Minecraft's UUID type"""
-    raise NotImplementedError()
+    return my_uuid.bytes
 
 
 def Position(x: int, y: int, z: int) -> bytes:
@@ -330,6 +216,52 @@ def Position(x: int, y: int, z: int) -> bytes:
                | (z & 0x3FFFFFF)).to_bytes(8, "big")
 
 
+def Slot(slot: dict) -> bytes:
+    """Minecraft's Slot type, slot is dict in format returned by read_Slot"""
+    if slot["item_id"] == -1:
+        return Short(-1)
+    buffer = bytearray(Short(slot["item_id"]))
+    buffer += Byte(slot["item_count"])
+    buffer += Short(slot["item_damage"])
+    if slot.get("item_nbt"):
+        write_NBT(buffer, slot["item_nbt"])
+    else:
+        buffer.append(TAG_END)
+    return bytes(buffer)
+
+
+def EntityMetadata(metadata: list[dict]) -> bytes:
+    """
+    Minecraft's Entity Metadata type, metadata is list in format returned by
+    parse_entity_metadata
+    """
+    buffer = bytearray()
+    for entry in metadata:
+        e_type = entry["type"]
+        value = entry["value"]
+        buffer.append((e_type << 5 | entry["key"] & 0x1f) & 0xff)
+        if e_type == 0:
+            buffer += Byte(value)
+        elif e_type == 1:
+            buffer += Short(value)
+        elif e_type == 2:
+            buffer += Int(value)
+        elif e_type == 3:
+            buffer += Float(value)
+        elif e_type == 4:
+            buffer += String(value)
+        elif e_type == 5:
+            buffer += Slot(value)
+        elif e_type == 6:
+            buffer += Int(value[0]) + Int(value[1]) + Int(value[2])
+        elif e_type == 7:
+            buffer += Float(value[0]) + Float(value[1]) + Float(value[2])
+        else:
+            raise RuntimeError(f"Unknown entity metadata type {e_type}")
+    buffer.append(0x7f)
+    return bytes(buffer)
+
+
 def read_Boolean(value: bytes, pointer: int = 0) -> tuple[bool, int]:
     """
     returns bool and pointer.
@@ -400,28 +332,80 @@ def read_VarInt(value: bytes, pointer: int = 0) -> tuple[int, int]:
     """
     returns integer and pointer.
     """
-    buf = 0
-    n = 0
-    for n, i in enumerate(value[pointer:]):
-        buf |= ((i & 0x7F) << (7 * n))
-        if not i & 0x80:
+    byte = value[pointer]
+    if byte < 0x80:
+        return (byte, pointer + 1)
+    result = byte & 0x7F
+    shift = 7
+    while True:
+        pointer += 1
+        byte = value[pointer]
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
             break
-
-    return (signed32bit_to_int(buf), pointer + n + 1)
+        shift += 7
+        if shift > 28:
+            raise RuntimeError("VarInt is too big")
+    # bits of 5th byte past 32 bits are dropped like Java does
+    result &= 0xFFFFFFFF
+    if result & 0x80000000:
+        result -= 0x100000000
+    return (result, pointer + 1)
 
 
 def read_VarLong(value: bytes, pointer: int = 0) -> tuple[int, int]:
     """
     returns integer and pointer.
     """
-    buf = 0
-    n = 0
-    for n, i in enumerate(value[pointer:]):
-        buf |= ((i & 0x7F) << (7 * n))
-        if not i & 0x80:
+    byte = value[pointer]
+    if byte < 0x80:
+        return (byte, pointer + 1)
+    result = byte & 0x7F
+    shift = 7
+    while True:
+        pointer += 1
+        byte = value[pointer]
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
             break
-
-    return (signed64bit_to_int(buf), pointer + n + 1)
+        shift += 7
+        if shift > 63:
+            raise RuntimeError("VarLong is too big")
+    result &= 0xFFFFFFFFFFFFFFFF
+    if result & 0x8000000000000000:
+        result -= 0x10000000000000000
+    return (result, pointer + 1)
+
+
+def read_VarInt_array(value: bytes, pointer: int,
+                      count: int) -> tuple[list[int], int]:
+    """
+    returns list of count VarInts and pointer.
+    """
+    result = []
+    append = result.append
+    for _ in range(count):
+        byte = value[pointer]
+        pointer += 1
+        if byte < 0x80:
+            append(byte)
+            continue
+        number = byte & 0x7F
+        shift = 7
+        while True:
+            byte = value[pointer]
+            pointer += 1
+            number |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+            if shift > 28:
+                raise RuntimeError("VarInt is too big")
+        number &= 0xFFFFFFFF
+        if number & 0x80000000:
+            number -= 0x100000000
+        append(number)
+    return (result, pointer)
 
 
 def read_UUID(value: bytes, pointer: int = 0) -> tuple[uuid.UUID, int]:
@@ -433,13 +417,42 @@ def read_UUID(value: bytes, pointer: int = 0) -> tuple[uuid.UUID, int]:
     return (uuid.UUID(int=tmp), pointer + 16)
 
 
+# decodes UTF-8 with LRU cache, set by set_string_cache
+_string_cache: Callable = None
+_string_cache_max_length = 0
+
+
+def set_string_cache(max_size: int = 4096, max_length: int = 256):
+    """
+    makes read_String and read_Chat keep up to max_size recently decoded
+    strings of at most max_length bytes, so repeated strings are decoded
+    once and share one object. max_size 0 disables the cache. returns
+    cached function, its cache_info() tells hit rate
+    """
+    # pylint: disable=global-statement
+    global _string_cache, _string_cache_max_length
+    _string_cache = None
+    if max_size:
+        _string_cache = functools.lru_cache(max_size)(_decode_utf8)
+    _string_cache_max_length = max_length
+    if _speedups is not None:
+        _speedups.set_string_cache(_string_cache, max_length)
+    return _string_cache
+
+
+def _decode_utf8(raw: bytes) -> str:
+    return str(raw, "utf8")
+
+
 def read_String(value: bytes, pointer: int = 0) -> tuple[str, int]:
     """
     returns string and pointer.
     """
     length, pointer = read_VarInt(value, pointer)
-    return (value[pointer:pointer + length].decode("utf8",
-                                                   "big"), pointer + length)
+    if _string_cache is not None and length <= _string_cache_max_length:
+        return (_string_cache(bytes(value[pointer:pointer + length])),
+                pointer + length)
+    return (str(value[pointer:pointer + length], "utf8"), pointer + length)
 
 
 def read_Chat(value: bytes, pointer: int = 0) -> tuple[str, int]:
@@ -447,8 +460,10 @@ def read_Chat(value: bytes, pointer: int = 0) -> tuple[str, int]:
     returns JSON string of chat and pointer.
     """
     length, pointer = read_VarInt(value, pointer)
-    return (value[pointer:pointer + length].decode("utf8",
-                                                   "big"), pointer + length)
+    if _string_cache is not None and length <= _string_cache_max_length:
+        return (_string_cache(bytes(value[pointer:pointer + length])),
+                pointer + length)
+    return (str(value[pointer:pointer + length], "utf8"), pointer + length)
 
 
 def read_Position(value: bytes, pointer: int = 0) -> tuple[int, int, int, int]:
@@ -525,3 +540,22 @@ def read_Particle(value: bytes, pointer: int = 0) -> tuple[dict, int]:
         data["entity_eye_height"], pointer = read_Float(value, pointer)
         data["ticks"], pointer = read_VarInt(value, pointer)
     return (data, pointer)
+
+
+# functions that have C versions in protocol/_speedups.c
+SPEEDUPS = ("read_Boolean", "read_Byte", "read_UByte", "read_Angle",
+            "read_Short", "read_UShort", "read_Int", "read_Long", "read_Float",
+            "read_Double", "read_VarInt", "read_VarLong", "read_VarInt_array",
+            "read_String", "read_Chat", "read_Position", "VarInt", "VarLong",
+            "String", "Chat", "Position")
+# pure Python versions of SPEEDUPS, they are used if C module isn't built
+PURE_PYTHON = {name: globals()[name] for name in SPEEDUPS}
+
+try:
+    if os.environ.get("PROTOCOL_PURE_PYTHON"):
+        raise ImportError("Pure Python backend is forced")
+    from protocol import _speedups
+except ImportError:
+    _speedups = None
+else:
+    globals().update({name: getattr(_speedups, name) for name in SPEEDUPS})
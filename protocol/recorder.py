@@ -0,0 +1,165 @@
+"""
+Records received packet frames to a file and replays them offline.
+
+python -m protocol.recorder session.bin
+"""
+import argparse
+import mmap
+import struct
+import time
+from typing import Callable
+from protocol.protocol_47 import ProtocolClient
+
+MAGIC = b"MCPR\x01"
+# time, state, compression enabled, frame length
+RECORD_HEADER = struct.Struct(">dbBI")
+
+
+class SessionRecorder:
+    """
+    Appends frames with time, state and compression flag to a file. Frames
+    are stored as received, without length prefix and still compressed.
+    close() must be called to flush buffered records
+    """
+
+    def __init__(self, path: str, buffer_size: int = 1 << 20) -> None:
+        self.path = path
+        self.file = open(path, "wb", buffering=buffer_size)
+        self.file.write(MAGIC)
+        self.frames = 0
+
+    def record(self, state: int, compression_enabled: bool, frame: bytes):
+        """appends one frame"""
+        self.file.write(
+            RECORD_HEADER.pack(time.time(), state, compression_enabled,
+                               len(frame)))
+        self.file.write(frame)
+        self.frames += 1
+
+    def close(self):
+        """flushes and closes file"""
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_session(data: bytes):
+    """yields (time, state, compression enabled, frame) of recorded session"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise RuntimeError("Not a recorded session")
+    view = memoryview(data)
+    pointer = len(MAGIC)
+    end = len(data)
+    header_size = RECORD_HEADER.size
+    unpack_from = RECORD_HEADER.unpack_from
+    while pointer + header_size <= end:
+        received, state, compressed, length = unpack_from(data, pointer)
+        pointer += header_size
+        if pointer + length > end:
+            # last record was cut short
+            break
+        yield (received, state, bool(compressed),
+               view[pointer:pointer + length])
+        pointer += length
+
+
+class ReplayClient(ProtocolClient):
+    """
+    ProtocolClient without connection. Packets that decoders send, such as
+    keep alive replies, are counted and dropped
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.packets_sent = 0
+
+    def is_connected(self) -> bool:
+        return True
+
+    def send_packet(self,
+                    packet_id: int,
+                    packet_data: bytes,
+                    compress: bool = True):
+        self.packets_sent += 1
+
+    def send_many(self, packets: list[tuple]):
+        self.packets_sent += len(packets)
+
+    def flush(self):
+        pass
+
+
+def replay(path: str,
+           client: ProtocolClient = None,
+           speed: float = None,
+           packet_handler: Callable = None) -> ProtocolClient:
+    """
+    feeds recorded frames to client.process_packet as fast as possible or,
+    if speed is set, at speed times recorded pace. state and compression
+    of client are set from the recording before every frame.
+    packet_handler(state, packet_id, packet, pointer) is called after every
+    packet. returns client
+    """
+    if client is None:
+        client = ReplayClient()
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        start = None
+        started = time.perf_counter()
+        for received, state, compressed, frame in read_session(data):
+            if speed:
+                if start is None:
+                    start = received
+                delay = (received - start) / speed - (time.perf_counter() -
+                                                      started)
+                if delay > 0:
+                    time.sleep(delay)
+            client.state = state
+            client.compression_enabled = compressed
+            result = client.process_packet(frame)
+            if packet_handler:
+                packet_handler(*result)
+            del frame, result
+    finally:
+        try:
+            data.close()
+        except BufferError:
+            # decoded packets still refer to the file, it's unmapped when
+            # they're gone
+            pass
+    return client
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m protocol.recorder",
+                                     description="Replays recorded session")
+    parser.add_argument("path")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--speed",
+                        type=float,
+                        help="replay at recorded pace times speed")
+    parser.add_argument("--no-world",
+                        action="store_true",
+                        help="don't track chunks and entities")
+    args = parser.parse_args(argv)
+
+    for _ in range(args.repeat):
+        client = ReplayClient()
+        if args.no_world:
+            client.world = None
+            client.entities = None
+        started = time.perf_counter()
+        replay(args.path, client, args.speed)
+        elapsed = time.perf_counter() - started
+        print(f"{client.packets_received} packets in {elapsed:.3f}s, "
+              f"{client.packets_received / elapsed:.0f} packets/s")
+
+
+if __name__ == "__main__":
+    main()
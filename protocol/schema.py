@@ -0,0 +1,141 @@
+"""
+Declarative packet layouts compiled into struct based readers and writers
+"""
+import struct
+from protocol import nbt, protocol_types
+
+# fixed width types and their struct format
+FIXED_TYPES = {
+    "Boolean": "?",
+    "Byte": "b",
+    "UByte": "B",
+    "Short": "h",
+    "UShort": "H",
+    "Int": "i",
+    "Long": "q",
+    "Float": "f",
+    "Double": "d",
+    "Angle": "B",
+}
+
+# variable width types and their readers. reader(packet, pointer) returns
+# (value, pointer), except Position which returns (x, y, z, pointer)
+VARIABLE_READERS = {
+    "VarInt": protocol_types.read_VarInt,
+    "VarLong": protocol_types.read_VarLong,
+    "String": protocol_types.read_String,
+    "Chat": protocol_types.read_Chat,
+    "UUID": protocol_types.read_UUID,
+    "Position": protocol_types.read_Position,
+    "Slot": protocol_types.read_Slot,
+    "EntityMetadata": protocol_types.parse_entity_metadata,
+    "NBT": protocol_types.parse_NBT_stream,
+}
+
+# variable width types and their writers. writer(value) returns bytes
+VARIABLE_WRITERS = {
+    "VarInt": protocol_types.VarInt,
+    "VarLong": protocol_types.VarLong,
+    "String": protocol_types.String,
+    "Chat": protocol_types.Chat,
+    "UUID": protocol_types.UUID,
+    "Position": lambda value: protocol_types.Position(*value),
+    "Slot": protocol_types.Slot,
+    "EntityMetadata": protocol_types.EntityMetadata,
+    "NBT": nbt.NBT,
+}
+
+
+class PacketSchema:
+    """
+    Packet layout given as list of (name, type) or (name, type, scale)
+    fields, type is one of FIXED_TYPES or VARIABLE_READERS. Fixed width
+    fields that follow each other are read and written with single
+    struct.Struct call. Numbers with scale are multiplied by scale after
+    reading and divided by it before writing, e.g. fixed-point positions.
+
+    read(packet, pointer) returns (dict, pointer) and can be used as
+    packet parser. write(values) returns bytes of packet data
+    """
+
+    def __init__(self, fields: list[tuple]) -> None:
+        self.fields = [(field[0], field[1], field[2] if len(field) > 2 else 1)
+                       for field in fields]
+        for name, type_name, _ in self.fields:
+            if (type_name not in FIXED_TYPES
+                    and type_name not in VARIABLE_READERS):
+                raise ValueError(f"Unknown type {type_name} of field {name}")
+        self.read = self._compile_reader()
+        self._write = self._compile_writer()
+
+    def _runs(self) -> list[tuple[bool, list]]:
+        """groups fields into runs of fixed and variable width fields"""
+        runs = []
+        for field in self.fields:
+            fixed = field[1] in FIXED_TYPES
+            if runs and fixed and runs[-1][0]:
+                runs[-1][1].append(field)
+            else:
+                runs.append((fixed, [field]))
+        return runs
+
+    def _compile_reader(self):
+        namespace = {}
+        lines = ["def read(packet, pointer=0):"]
+        for i, (fixed, fields) in enumerate(self._runs()):
+            if fixed:
+                layout = struct.Struct(">" + "".join(FIXED_TYPES[field[1]]
+                                                     for field in fields))
+                namespace[f"s_{i}"] = layout
+                names = ", ".join(f"f_{field[0]}" for field in fields)
+                lines.append(f"    {names}, = s_{i}.unpack_from(packet, "
+                             "pointer)")
+                lines.append(f"    pointer += {layout.size}")
+            else:
+                name, type_name, _ = fields[0]
+                namespace[f"r_{i}"] = VARIABLE_READERS[type_name]
+                if type_name == "Position":
+                    lines.append("    x, y, z, pointer = "
+                                 f"r_{i}(packet, pointer)")
+                    lines.append(f"    f_{name} = (x, y, z)")
+                else:
+                    lines.append(f"    f_{name}, pointer = "
+                                 f"r_{i}(packet, pointer)")
+        for name, _, scale in self.fields:
+            if scale != 1:
+                lines.append(f"    f_{name} *= {scale!r}")
+        values = ", ".join(f"{name!r}: f_{name}" for name, _, _ in self.fields)
+        lines.append(f"    return ({{{values}}}, pointer)")
+        exec("\n".join(lines), namespace)  # pylint: disable=exec-used
+        return namespace["read"]
+
+    def _compile_writer(self):
+        namespace = {}
+        lines = ["def write(values):", "    buffer = bytearray()"]
+        for i, (fixed, fields) in enumerate(self._runs()):
+            if fixed:
+                layout = struct.Struct(">" + "".join(FIXED_TYPES[field[1]]
+                                                     for field in fields))
+                namespace[f"s_{i}"] = layout
+                args = []
+                for name, type_name, scale in fields:
+                    value = f"values[{name!r}]"
+                    if scale != 1:
+                        value = f"round({value} / {scale!r})"
+                    elif FIXED_TYPES[type_name] not in "?fd":
+                        value = f"int({value})"
+                    args.append(value)
+                lines.append(f"    buffer += s_{i}.pack({', '.join(args)})")
+            else:
+                name, type_name, _ = fields[0]
+                namespace[f"w_{i}"] = VARIABLE_WRITERS[type_name]
+                lines.append(f"    buffer += w_{i}(values[{name!r}])")
+        lines.append("    return bytes(buffer)")
+        exec("\n".join(lines), namespace)  # pylint: disable=exec-used
+        return namespace["write"]
+
+    def write(self, values: dict = None, **kwargs) -> bytes:
+        """returns packet data made of values given as dict or kwargs"""
+        if values is None:
+            values = kwargs
+        return self._write(values)
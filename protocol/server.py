@@ -0,0 +1,526 @@
+"""
+Scripted Minecraft 1.8 server for load and latency testing.
+
+python -m protocol.server --port 25565 --chunks 20 --entities 10 --chat 2
+python -m protocol.server --port 0 --bots 10 --duration 10 --json out.json
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from protocol.codec import compress_packet_into, decompress_packet
+from protocol.constants import STATE_LOGIN, STATE_PLAY
+from protocol.framer import PacketFramer
+from protocol.protocol_47 import (HANDSHAKE, JOIN_GAME, LOGIN_START,
+                                  PLAYER_POSITION_AND_LOOK, SPAWN_POSITION)
+from protocol.protocol_types import (Boolean, Byte, Int, String, UShort,
+                                     VarInt, read_VarInt)
+from protocol.stats import Histogram
+from protocol.swarm import Swarm, print_report
+from protocol.synthetic import chunk_data, chunk_packet, spawn_mob_packet
+
+
+class ServerConnection:
+    """One client of LocalServer"""
+
+    def __init__(self, server: "LocalServer", reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.framer = PacketFramer()
+        self.state = STATE_LOGIN
+        self.compression_threshold = -1
+        self.name: str = None
+        self.connect_time = time.perf_counter()
+        self.login_time: float = None
+        self.disconnect_time: float = None
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.packets_received = 0
+        self.chat_received = 0
+        self.send_buffer = bytearray()
+        # keep alive id -> time it was sent, in nanoseconds
+        self.keep_alives: dict[int, int] = {}
+        self.keep_alive_id = 0
+        self.keep_alive_latency = Histogram()
+        self.entities = []
+        self.next_entity_id = 2
+        self.next_column = 0
+
+    def queue(self, packet_id: int, packet_data: bytes):
+        """appends length-prefixed and maybe compressed packet to buffer"""
+        buffer = self.send_buffer
+        start = len(buffer)
+        packet_id = VarInt(packet_id)
+        data_length = len(packet_id) + len(packet_data)
+        if self.compression_threshold < 0:
+            buffer += VarInt(data_length)
+        elif data_length >= self.compression_threshold:
+            compress_packet_into(buffer, packet_id, packet_data,
+                                 self.server.compression_level)
+            self.packets_sent += 1
+            self.bytes_sent += len(buffer) - start
+            return
+        else:
+            buffer += VarInt(data_length + 1)
+            buffer += b"\x00"
+        buffer += packet_id
+        buffer += packet_data
+        self.packets_sent += 1
+        self.bytes_sent += len(buffer) - start
+
+    async def flush(self):
+        """writes queued packets and waits until client takes them"""
+        if self.send_buffer:
+            self.writer.write(self.send_buffer)
+            self.send_buffer = bytearray()
+            await self.writer.drain()
+
+    async def next_packet(self) -> tuple[int, bytes, int]:
+        """
+        returns packet id, decompressed packet and pointer to its data of
+        next received packet, None when connection is closed
+        """
+        while True:
+            for frame in self.framer.frames():
+                packet = decompress_packet(frame,
+                                           self.compression_threshold >= 0)
+                self.packets_received += 1
+                packet_id, pointer = read_VarInt(packet)
+                return (packet_id, packet, pointer)
+            data = await self.reader.read(65536)
+            if not data:
+                return None
+            self.framer.feed(data)
+
+    async def login(self) -> bool:
+        """handles Handshake and Login Start. returns False on bad login"""
+        packet = await self.next_packet()
+        if packet is None or packet[0] != 0x00:
+            return False
+        handshake = HANDSHAKE.read(packet[1], packet[2])[0]
+        if handshake["next_state"] != 2:
+            # server list ping isn't supported
+            return False
+        packet = await self.next_packet()
+        if packet is None or packet[0] != 0x00:
+            return False
+        self.name = LOGIN_START.read(packet[1], packet[2])[0]["name"]
+
+        if self.server.compression_threshold >= 0:
+            self.queue(0x03, VarInt(self.server.compression_threshold))
+            self.compression_threshold = self.server.compression_threshold
+        offline_uuid = uuid.uuid3(uuid.NAMESPACE_OID,
+                                  "OfflinePlayer:" + self.name)
+        self.queue(0x02, String(str(offline_uuid)) + String(self.name))
+        self.state = STATE_PLAY
+        self.queue(
+            0x01,
+            JOIN_GAME.write(entity_id=1,
+                            gamemode=0,
+                            dimension=0,
+                            difficulty=1,
+                            max_players=100,
+                            level_type="default",
+                            reduced_debug_info=False))
+        self.queue(0x05, SPAWN_POSITION.write(location=(0, 64, 0)))
+        self.queue(
+            0x08,
+            PLAYER_POSITION_AND_LOOK.write(x=0.5,
+                                           y=64,
+                                           z=0.5,
+                                           yaw=0,
+                                           pitch=0,
+                                           flags=0))
+        await self.flush()
+        self.login_time = time.perf_counter()
+        return True
+
+    async def receive(self):
+        """handles packets from client until it disconnects"""
+        while True:
+            packet = await self.next_packet()
+            if packet is None:
+                return
+            packet_id, data, pointer = packet
+            if packet_id == 0x00:
+                received = time.perf_counter_ns()
+                keep_alive_id = read_VarInt(data, pointer)[0]
+                sent = self.keep_alives.pop(keep_alive_id, None)
+                if sent is not None:
+                    self.keep_alive_latency.add(received - sent)
+            elif packet_id == 0x01:
+                self.chat_received += 1
+
+    def _next_columns(self, count: int) -> list[tuple[int, int]]:
+        """returns positions of next count columns around spawn"""
+        radius = self.server.view_distance
+        side = radius * 2 + 1
+        columns = []
+        for _ in range(count):
+            index = self.next_column % (side * side)
+            columns.append((index % side - radius, index // side - radius))
+            self.next_column += 1
+        return columns
+
+    def queue_chunks(self, count: int):
+        """queues count columns as Chunk Data or Map Chunk Bulk packets"""
+        server = self.server
+        mask = UShort((1 << server.chunk_sections) - 1)
+        data = server.chunk_data
+        columns = self._next_columns(count)
+        if server.bulk_columns <= 0:
+            for chunk_x, chunk_z in columns:
+                self.queue(
+                    0x21,
+                    chunk_packet(chunk_x, chunk_z, server.chunk_sections,
+                                 data))
+            return
+        for i in range(0, count, server.bulk_columns):
+            bulk = columns[i:i + server.bulk_columns]
+            packet = bytearray(Boolean(True) + VarInt(len(bulk)))
+            for chunk_x, chunk_z in bulk:
+                packet += Int(chunk_x) + Int(chunk_z) + mask
+            for _ in bulk:
+                packet += data
+            self.queue(0x26, packet)
+
+    def queue_entities(self, count: int):
+        """queues Spawn Mob packets, oldest mobs are destroyed over limit"""
+        for _ in range(count):
+            entity_id = self.next_entity_id
+            self.next_entity_id += 1
+            self.entities.append(entity_id)
+            self.queue(
+                0x0f,
+                spawn_mob_packet(entity_id, 54, entity_id % 32 - 16, 64,
+                                 entity_id // 32 % 32 - 16))
+        extra = len(self.entities) - self.server.max_entities
+        if extra > 0:
+            destroyed = self.entities[:extra]
+            del self.entities[:extra]
+            self.queue(
+                0x13,
+                VarInt(len(destroyed)) +
+                b"".join(VarInt(entity_id) for entity_id in destroyed))
+
+    def queue_chat(self, count: int):
+        """queues chat messages"""
+        for _ in range(count):
+            message = json.dumps({
+                "text": f"<server> message {self.packets_sent}",
+                "color": "yellow"
+            })
+            self.queue(0x02, String(message) + Byte(0))
+
+    def queue_keep_alive(self):
+        """queues Keep Alive and remembers when it was sent"""
+        self.keep_alive_id += 1
+        self.queue(0x00, VarInt(self.keep_alive_id))
+        self.keep_alives[self.keep_alive_id] = time.perf_counter_ns()
+
+    async def stream(self):
+        """sends keep alives and synthetic packets at configured rates"""
+        server = self.server
+        rates = [(server.chunks_per_second, self.queue_chunks),
+                 (server.entities_per_second, self.queue_entities),
+                 (server.chat_per_second, self.queue_chat)]
+        budgets = [0.0] * len(rates)
+        interval = 1 / server.tick_rate
+        next_keep_alive = time.perf_counter()
+        next_tick = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            if (server.keep_alive_interval is not None
+                    and now >= next_keep_alive):
+                next_keep_alive = now + server.keep_alive_interval
+                self.queue_keep_alive()
+                # keep alive goes out before data of this tick
+                await self.flush()
+            for i, (rate, queue) in enumerate(rates):
+                budgets[i] += rate * interval
+                count = int(budgets[i])
+                if count:
+                    budgets[i] -= count
+                    queue(count)
+            await self.flush()
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # can't keep up, don't try to catch up
+                next_tick = time.perf_counter()
+
+    def as_dict(self, now: float) -> dict:
+        """returns stats of connection. latencies are in seconds"""
+        latency = self.keep_alive_latency
+        duration = (self.disconnect_time or now) - self.connect_time
+        return {
+            "name": self.name,
+            "packets_sent": self.packets_sent,
+            "bytes_sent": self.bytes_sent,
+            "bytes_per_second": self.bytes_sent / duration if duration else 0,
+            "packets_received": self.packets_received,
+            "chat_received": self.chat_received,
+            "login_latency": None if self.login_time is None else
+            self.login_time - self.connect_time,
+            "keep_alives": latency.count,
+            "keep_alives_unanswered": len(self.keep_alives),
+            "keep_alive_latency_avg":
+            latency.total / latency.count / 1e9 if latency.count else None,
+            "keep_alive_latency_max": latency.max / 1e9,
+            "connected": self.disconnect_time is None
+        }
+
+
+class LocalServer:
+    """
+    Offline mode Minecraft 1.8 server that accepts any login and streams
+    synthetic packets to every client at configured rates: chunk columns
+    with chunk_sections sections (as Map Chunk Bulk of bulk_columns columns
+    if bulk_columns is set), Spawn Mob packets and chat messages. It sends
+    Keep Alive every keep_alive_interval seconds and measures how long
+    clients take to answer. port 0 picks a free port, see self.port
+    """
+
+    def __init__(self,
+                 host: str = "localhost",
+                 port: int = 25565,
+                 compression_threshold: int = 256,
+                 compression_level: int = 1,
+                 keep_alive_interval: float = 1.0,
+                 chunks_per_second: float = 0,
+                 chunk_sections: int = 8,
+                 bulk_columns: int = 0,
+                 view_distance: int = 4,
+                 entities_per_second: float = 0,
+                 max_entities: int = 100,
+                 chat_per_second: float = 0,
+                 tick_rate: float = 20) -> None:
+        self.host = host
+        self.port = port
+        # negative threshold disables compression
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+        self.keep_alive_interval = keep_alive_interval
+        self.chunks_per_second = chunks_per_second
+        self.chunk_sections = chunk_sections
+        self.bulk_columns = bulk_columns
+        self.view_distance = view_distance
+        self.entities_per_second = entities_per_second
+        self.max_entities = max_entities
+        self.chat_per_second = chat_per_second
+        self.tick_rate = tick_rate
+        # every column is sent with the same blocks
+        self.chunk_data = chunk_data(chunk_sections)
+        self.connections: list[ServerConnection] = []
+        # tasks of connections that are still handled
+        self.tasks: set[asyncio.Task] = set()
+        self.server: asyncio.AbstractServer = None
+        self.start_time: float = None
+
+    async def start(self):
+        """starts listening"""
+        self.server = await asyncio.start_server(self.handle_connection,
+                                                 self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.start_time = time.perf_counter()
+
+    async def stop(self):
+        """closes listening socket and all connections"""
+        if self.server:
+            self.server.close()
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.server:
+            await self.server.wait_closed()
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        connection = ServerConnection(self, reader, writer)
+        self.connections.append(connection)
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        subtasks = []
+        try:
+            try:
+                if not await connection.login():
+                    return
+                subtasks.append(asyncio.create_task(connection.stream()))
+                subtasks.append(asyncio.create_task(connection.receive()))
+                await asyncio.wait(subtasks,
+                                   return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for subtask in subtasks:
+                    subtask.cancel()
+                await asyncio.gather(*subtasks, return_exceptions=True)
+        except (ConnectionError, RuntimeError, asyncio.CancelledError):
+            # stop() cancels connections. returning normally keeps streams'
+            # done callback from logging the cancellation as an error
+            pass
+        finally:
+            connection.disconnect_time = time.perf_counter()
+            writer.close()
+            self.tasks.discard(task)
+
+    def report(self) -> dict:
+        """returns per-connection and aggregate statistics"""
+        now = time.perf_counter()
+        connections = [
+            connection.as_dict(now) for connection in self.connections
+        ]
+        latency = Histogram()
+        for connection in self.connections:
+            latency.merge(connection.keep_alive_latency)
+        elapsed = now - self.start_time if self.start_time else 0
+        bytes_sent = sum(
+            connection["bytes_sent"] for connection in connections)
+        packets_sent = sum(
+            connection["packets_sent"] for connection in connections)
+        aggregate = {
+            "connections": len(connections),
+            "connected": sum(
+                connection["connected"] for connection in connections),
+            "elapsed": elapsed,
+            "packets_sent": packets_sent,
+            "bytes_sent": bytes_sent,
+            "packets_per_second": packets_sent / elapsed if elapsed else 0,
+            "bytes_per_second": bytes_sent / elapsed if elapsed else 0,
+            "keep_alives": latency.count,
+            "keep_alive_latency_avg":
+            latency.total / latency.count / 1e9 if latency.count else None,
+            "keep_alive_latency_p50": latency.percentile(50) / 1e9,
+            "keep_alive_latency_p99": latency.percentile(99) / 1e9,
+            "keep_alive_latency_max": latency.max / 1e9
+        }
+        return {"aggregate": aggregate, "connections": connections}
+
+
+def print_server_report(report: dict):
+    """prints aggregate statistics in one line"""
+    aggregate = report["aggregate"]
+    print(f"{aggregate['elapsed']:8.1f}s "
+          f"clients {aggregate['connected']}/{aggregate['connections']} "
+          f"{aggregate['packets_per_second']:.0f} packets/s "
+          f"{aggregate['bytes_per_second'] / 1024:.0f} KiB/s "
+          f"keep alive p50 {aggregate['keep_alive_latency_p50'] * 1e3:.2f}ms "
+          f"p99 {aggregate['keep_alive_latency_p99'] * 1e3:.2f}ms")
+
+
+async def run(server: LocalServer,
+              duration: float = None,
+              report_interval: float = None,
+              bots: int = 0,
+              ramp: float = 10,
+              track_world: bool = False) -> dict:
+    """
+    runs server for duration seconds, forever if None. if bots is set,
+    that many bots of protocol.swarm connect to it from the same event loop.
+    returns server report and swarm report if bots were run. server is
+    started unless it's already listening
+    """
+    if server.server is None:
+        await server.start()
+    swarm = None
+    swarm_task = None
+    if bots:
+        swarm = Swarm(server.host, server.port, bots, ramp,
+                      track_world=track_world)
+        swarm_task = asyncio.create_task(swarm.run(duration))
+    started = time.perf_counter()
+    try:
+        while duration is None or time.perf_counter() - started < duration:
+            await asyncio.sleep(report_interval or 1)
+            if report_interval:
+                print_server_report(server.report())
+    finally:
+        if swarm_task is not None:
+            await swarm.stop()
+            await swarm_task
+        report = {"server": server.report()}
+        await server.stop()
+    if swarm is not None:
+        report["swarm"] = swarm.report()
+    return report
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m protocol.server",
+                                     description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=25565)
+    parser.add_argument("--compression-threshold",
+                        type=int,
+                        default=256,
+                        help="negative value disables compression")
+    parser.add_argument("--keep-alive-interval", type=float, default=1.0)
+    parser.add_argument("--chunks",
+                        type=float,
+                        default=0,
+                        help="chunk columns per second per client")
+    parser.add_argument("--sections",
+                        type=int,
+                        default=8,
+                        help="sections of every column")
+    parser.add_argument("--bulk",
+                        type=int,
+                        default=0,
+                        help="send columns as Map Chunk Bulk of this many")
+    parser.add_argument("--entities",
+                        type=float,
+                        default=0,
+                        help="mob spawns per second per client")
+    parser.add_argument("--max-entities", type=int, default=100)
+    parser.add_argument("--chat",
+                        type=float,
+                        default=0,
+                        help="chat messages per second per client")
+    parser.add_argument("--duration", type=float)
+    parser.add_argument("--report-interval", type=float, default=5)
+    parser.add_argument("--bots",
+                        type=int,
+                        default=0,
+                        help="connect this many bots of protocol.swarm")
+    parser.add_argument("--ramp", type=float, default=10)
+    parser.add_argument("--track-world",
+                        action="store_true",
+                        help="bots track chunks and entities")
+    parser.add_argument("--json", help="write final report to file")
+    args = parser.parse_args(argv)
+
+    server = LocalServer(args.host,
+                         args.port,
+                         args.compression_threshold,
+                         keep_alive_interval=args.keep_alive_interval,
+                         chunks_per_second=args.chunks,
+                         chunk_sections=args.sections,
+                         bulk_columns=args.bulk,
+                         entities_per_second=args.entities,
+                         max_entities=args.max_entities,
+                         chat_per_second=args.chat)
+
+    async def serve() -> dict:
+        await server.start()
+        print(f"listening on {server.host}:{server.port}")
+        return await run(server, args.duration, args.report_interval,
+                         args.bots, args.ramp, args.track_world)
+
+    try:
+        report = asyncio.run(serve())
+    except KeyboardInterrupt:
+        return
+    print_server_report(report["server"])
+    if "swarm" in report:
+        print_report(report["swarm"])
+    if args.json:
+        with open(args.json, "w", encoding="utf8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Builds and checks C versions of protocol_types functions.
+
+python -m protocol.speedups build
+python -m protocol.speedups check
+"""
+import argparse
+import importlib
+import os
+import random
+import struct
+import sys
+import tempfile
+from protocol import protocol_types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# VarInts and VarLongs whose last byte has bits past their size
+OVERLONG = (b"\x80\x80\x80\x80\x10", b"\xff\xff\xff\xff\x7f",
+            b"\x80\x80\x80\x80\x80\x80\x80\x80\x80\x7e",
+            b"\xff\xff\xff\xff\xff\xff\xff\xff\xff\x7f")
+
+
+def build(quiet: bool = False):
+    """compiles protocol/_speedups.c next to protocol_types.py"""
+    # pylint: disable=import-outside-toplevel
+    from setuptools import Distribution, Extension
+    extension = Extension("protocol._speedups", ["protocol/_speedups.c"],
+                          extra_compile_args=["-O2"])
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as build_temp:
+        args = ["build_ext", "--inplace", "--build-temp", build_temp]
+        dist = Distribution({
+            "name": "protocol",
+            "ext_modules": [extension],
+            "script_args": ["-q"] + args if quiet else args
+        })
+        os.chdir(ROOT)
+        try:
+            dist.parse_command_line()
+            dist.run_commands()
+        finally:
+            os.chdir(cwd)
+
+
+def _call(function, *args):
+    """returns result of function or type of raised exception"""
+    try:
+        return function(*args)
+    except Exception as ex:  # pylint: disable=broad-except
+        return type(ex)
+
+
+def _samples(rng: random.Random, count: int):
+    """yields (function name, args) to compare backends with"""
+    VarInt = protocol_types.PURE_PYTHON["VarInt"]
+    VarLong = protocol_types.PURE_PYTHON["VarLong"]
+    String = protocol_types.PURE_PYTHON["String"]
+    fixed = {
+        "read_Boolean": 1,
+        "read_Byte": 1,
+        "read_UByte": 1,
+        "read_Angle": 1,
+        "read_Short": 2,
+        "read_UShort": 2,
+        "read_Int": 4,
+        "read_Long": 8,
+        "read_Float": 4,
+        "read_Double": 8,
+        "read_Position": 8
+    }
+    edges = [0, 1, 127, 128, 255, 4095, 4096, 16383, 16384, 2**31 - 1,
+             -1, -2**31, 2**63 - 1, -2**63]
+    for i in range(count):
+        data = rng.randbytes(rng.randint(8, 32))
+        pointer = rng.randint(0, len(data) - 8)
+        for buf in (data, bytearray(data), memoryview(data)):
+            for name, size in fixed.items():
+                yield name, (buf, pointer)
+                yield name, (buf[:pointer + size - 1], pointer)
+        int32 = edges[i] if i < len(edges) else rng.randint(-2**31, 2**31 - 1)
+        int64 = edges[i] if i < len(edges) else rng.randint(-2**63, 2**63 - 1)
+        small = rng.randint(0, 1 << rng.randint(0, 20))
+        yield "VarInt", (int32, )
+        yield "VarInt", (small, )
+        yield "VarLong", (int64, )
+        yield "Position", (rng.randint(-2**25, 2**25 - 1),
+                           rng.randint(-2**11, 2**11 - 1),
+                           rng.randint(-2**25, 2**25 - 1))
+        encoded = b"\x00" + VarInt(int32) + VarInt(small)
+        if i < len(OVERLONG):
+            # malformed input with bits past 32 and 64 bits
+            yield "read_VarInt", (OVERLONG[i], 0)
+            yield "read_VarLong", (OVERLONG[i], 0)
+            yield "read_VarInt_array", (OVERLONG[i] * 2, 0, 2)
+        yield "read_VarInt", (encoded, 1)
+        yield "read_VarInt", (memoryview(encoded), 1)
+        yield "read_VarLong", (b"\x00" + VarLong(int64), 1)
+        yield "read_VarInt_array", (encoded, 1, 2)
+        text = "".join(chr(rng.choice((rng.randint(32, 126),
+                                       rng.randint(0x400, 0x4ff),
+                                       rng.randint(0x10000, 0x1ffff))))
+                       for _ in range(rng.randint(0, 20)))
+        yield "String", (text, )
+        yield "Chat", (text, )
+        yield "read_String", (String(text) + b"\x01", 0)
+        yield "read_Chat", (bytearray(String(text)), 0)
+        yield "read_String", (struct.pack(">B", 100) + b"short", 0)
+
+
+def check(count: int = 1000, seed: int = 0) -> list[str]:
+    """
+    compares C and pure Python versions on random and edge case inputs.
+    returns list of mismatches. for input that is cut short C versions
+    raise IndexError while pure Python ones raise other errors or return
+    garbage, so it only counts when C version returns something
+    """
+    speedups = importlib.import_module("protocol._speedups")
+    rng = random.Random(seed)
+    mismatches = []
+    for name, args in _samples(rng, count):
+        expected = _call(protocol_types.PURE_PYTHON[name], *args)
+        result = _call(getattr(speedups, name), *args)
+        if result is IndexError:
+            continue
+        # repr tells apart nan, -0.0 and bool from int
+        if repr(result) != repr(expected):
+            mismatches.append(f"{name}{args!r}: {result!r} != {expected!r}")
+    return mismatches
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m protocol.speedups",
+                                     description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=("build", "check"))
+    parser.add_argument("--samples", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build()
+    mismatches = check(args.samples)
+    for mismatch in mismatches[:20]:
+        print(mismatch)
+    print(f"{len(mismatches)} mismatches")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Per packet type counters and timing histograms of received packets
+"""
+import json
+import time
+from typing import Callable
+
+# bucket i counts durations shorter than 2 ** i nanoseconds, last bucket
+# counts everything longer
+HISTOGRAM_BUCKETS = 32
+
+
+class Histogram:
+    """durations in nanoseconds in power of two buckets"""
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, duration: int):
+        """adds duration in nanoseconds"""
+        self.buckets[min(duration.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def merge(self, other: "Histogram"):
+        """adds durations of other histogram"""
+        for i, count in enumerate(other.buckets):
+            self.buckets[i] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent: float) -> int:
+        """returns upper bound in nanoseconds of given percentile"""
+        if not self.count:
+            return 0
+        left = self.count * percent / 100
+        for i, count in enumerate(self.buckets):
+            left -= count
+            if left <= 0:
+                return min(1 << i, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        """
+        returns totals, percentiles and non-empty buckets keyed by their
+        upper bound in nanoseconds
+        """
+        return {
+            "count": self.count,
+            "total_ns": self.total,
+            "mean_ns": self.total // self.count if self.count else 0,
+            "p50_ns": self.percentile(50),
+            "p99_ns": self.percentile(99),
+            "max_ns": self.max,
+            "buckets": {
+                1 << i: count
+                for i, count in enumerate(self.buckets) if count
+            }
+        }
+
+
+class PacketTypeStats:
+    """counters of one (state, packet_id)"""
+    __slots__ = ("count", "compressed_bytes", "uncompressed_bytes",
+                 "offloaded", "decompress_time", "decode_time")
+
+    def __init__(self) -> None:
+        self.count = 0
+        # bytes as received, without length prefix
+        self.compressed_bytes = 0
+        self.uncompressed_bytes = 0
+        # packets decoded by chunk_executor, their time isn't measured
+        self.offloaded = 0
+        self.decompress_time = Histogram()
+        # decoder, trackers and handlers
+        self.decode_time = Histogram()
+
+
+class PacketStats:
+    """
+    Counts packets, their compressed and uncompressed bytes, decompression
+    and decoding time for every (state, packet_id). Set it as
+    client.stats to enable it.
+
+    If dump_interval is set, snapshot is written to dump_path as JSON and
+    passed to dump_handler every dump_interval seconds. It's checked when
+    packets are received, so nothing is dumped while connection is idle
+    """
+
+    def __init__(self,
+                 dump_interval: float = None,
+                 dump_path: str = None,
+                 dump_handler: Callable = None) -> None:
+        self.types: dict[tuple[int, int], PacketTypeStats] = {}
+        self.started = time.time()
+        self.dump_interval = dump_interval
+        self.dump_path = dump_path
+        self.dump_handler = dump_handler
+        self.next_dump = (None if dump_interval is None else
+                          time.monotonic() + dump_interval)
+
+    def _get(self, state: int, packet_id: int) -> PacketTypeStats:
+        key = (state, packet_id)
+        stats = self.types.get(key)
+        if stats is None:
+            stats = self.types[key] = PacketTypeStats()
+        return stats
+
+    def add(self, state: int, packet_id: int, compressed_size: int,
+            uncompressed_size: int, decompress_time: int, decode_time: int):
+        """adds processed packet. times are in nanoseconds"""
+        stats = self._get(state, packet_id)
+        stats.count += 1
+        stats.compressed_bytes += compressed_size
+        stats.uncompressed_bytes += uncompressed_size
+        stats.decompress_time.add(decompress_time)
+        stats.decode_time.add(decode_time)
+        if self.next_dump is not None and time.monotonic() >= self.next_dump:
+            self.next_dump = time.monotonic() + self.dump_interval
+            self.dump()
+
+    def add_offloaded(self, state: int, packet_id: int, compressed_size: int):
+        """adds packet sent to chunk_executor"""
+        stats = self._get(state, packet_id)
+        stats.count += 1
+        stats.offloaded += 1
+        stats.compressed_bytes += compressed_size
+
+    def snapshot(self) -> dict:
+        """
+        returns JSON serializable dict with "time", "elapsed" seconds since
+        start or reset and "packets": list of dicts of every packet type,
+        most time consuming first
+        """
+        packets = []
+        for (state, packet_id), stats in list(self.types.items()):
+            packets.append({
+                "state": state,
+                "packet_id": packet_id,
+                "count": stats.count,
+                "compressed_bytes": stats.compressed_bytes,
+                "uncompressed_bytes": stats.uncompressed_bytes,
+                "offloaded": stats.offloaded,
+                "decompress_time": stats.decompress_time.to_dict(),
+                "decode_time": stats.decode_time.to_dict()
+            })
+        packets.sort(key=lambda packet: packet["decompress_time"]["total_ns"]
+                     + packet["decode_time"]["total_ns"],
+                     reverse=True)
+        now = time.time()
+        return {
+            "time": now,
+            "elapsed": now - self.started,
+            "packets": packets
+        }
+
+    def dump(self):
+        """writes snapshot to dump_path and passes it to dump_handler"""
+        snapshot = self.snapshot()
+        if self.dump_path is not None:
+            with open(self.dump_path, "w", encoding="utf8") as file:
+                json.dump(snapshot, file)
+        if self.dump_handler is not None:
+            self.dump_handler(snapshot)
+
+    def reset(self):
+        """clears all counters"""
+        self.types = {}
+        self.started = time.time()
+
+    def report(self, top: int = 20) -> str:
+        """returns table of most time consuming packet types"""
+        snapshot = self.snapshot()
+        lines = [
+            f"{'state':>5} {'id':>4} {'count':>9} {'bytes':>12} "
+            f"{'inflated':>12} {'inflate ms':>10} {'decode ms':>10} "
+            f"{'p99 us':>8}"
+        ]
+        for packet in snapshot["packets"][:top]:
+            decompress = packet["decompress_time"]
+            decode = packet["decode_time"]
+            lines.append(
+                f"{packet['state']:>5} {packet['packet_id']:#04x} "
+                f"{packet['count']:>9} {packet['compressed_bytes']:>12} "
+                f"{packet['uncompressed_bytes']:>12} "
+                f"{decompress['total_ns'] / 1e6:>10.1f} "
+                f"{decode['total_ns'] / 1e6:>10.1f} "
+                f"{decode['p99_ns'] / 1e3:>8.1f}")
+        return "\n".join(lines)
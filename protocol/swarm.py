@@ -0,0 +1,234 @@
+"""
+Runs many bots in one event loop and collects their statistics.
+
+python -m protocol.swarm --host localhost --port 25565 --bots 100 --ramp 10
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Callable
+from protocol.async_client import AsyncProtocolClient
+from protocol.chat import LazyChat
+from protocol.constants import STATE_DISCONNECT, STATE_PLAY
+from protocol.protocol_47 import PACKET_DECODERS
+
+
+class BotStats:
+    """Statistics of one bot"""
+    __slots__ = ("name", "connect_time", "login_time", "disconnect_time",
+                 "disconnect_reason", "client")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.connect_time: float = None
+        self.login_time: float = None
+        self.disconnect_time: float = None
+        self.disconnect_reason = None
+        self.client: AsyncProtocolClient = None
+
+    @property
+    def login_latency(self) -> float:
+        """seconds between connecting and Login Success"""
+        if self.connect_time is None or self.login_time is None:
+            return None
+        return self.login_time - self.connect_time
+
+    def as_dict(self, now: float) -> dict:
+        """returns stats as dict. rates are per second of connection"""
+        packets = self.client.packets_received if self.client else 0
+        received = self.client.bytes_received if self.client else 0
+        duration = 0
+        if self.connect_time is not None:
+            duration = (self.disconnect_time or now) - self.connect_time
+        return {
+            "name": self.name,
+            "packets": packets,
+            "bytes": received,
+            "packets_per_second": packets / duration if duration else 0,
+            "bytes_per_second": received / duration if duration else 0,
+            "login_latency": self.login_latency,
+            "connected": self.client is not None and self.client.connected,
+            "disconnect_reason": self.disconnect_reason
+        }
+
+
+class Swarm:
+    """
+    Logs in bots bots at ramp bots per second. All bots share one event loop
+    and one decoder table
+    """
+
+    def __init__(self,
+                 host: str,
+                 port: int,
+                 bots: int,
+                 ramp: float = 10,
+                 name_prefix: str = "bot",
+                 track_world: bool = False,
+                 client_factory: Callable = AsyncProtocolClient) -> None:
+        self.address = (host, port)
+        self.bots = bots
+        self.ramp = ramp
+        self.name_prefix = name_prefix
+        self.track_world = track_world
+        self.client_factory = client_factory
+        self.decoders = dict(PACKET_DECODERS)
+        self.stats: list[BotStats] = []
+        self.tasks: list[asyncio.Task] = []
+        self.start_time: float = None
+
+    async def run_bot(self, stats: BotStats):
+        """connects one bot and processes its packets until disconnect"""
+        client = self.client_factory()
+        client.decoders = self.decoders
+        if not self.track_world:
+            client.world = None
+            client.entities = None
+        stats.client = client
+
+        def state_handler(state: dict):
+            if state["state"] == STATE_PLAY:
+                stats.login_time = time.perf_counter()
+            elif state["state"] == STATE_DISCONNECT:
+                reason = state.get("msg")
+                if isinstance(reason, LazyChat):
+                    reason = reason.text
+                stats.disconnect_reason = reason
+
+        client.set_state_handler(state_handler)
+        stats.connect_time = time.perf_counter()
+        try:
+            await client.create_connection(self.address)
+            await client.login_as(stats.name)
+            await client.wait_closed()
+        except asyncio.CancelledError:
+            await client.exit()
+            raise
+        except Exception as ex:  # pylint: disable=broad-except
+            stats.disconnect_reason = f"{type(ex).__name__}: {ex}"
+        finally:
+            stats.disconnect_time = time.perf_counter()
+            client.close_connection()
+        if stats.disconnect_reason is None:
+            stats.disconnect_reason = "connection closed"
+
+    async def start(self):
+        """starts bots with staggered ramp-up"""
+        self.start_time = time.perf_counter()
+        for i in range(self.bots):
+            stats = BotStats(f"{self.name_prefix}{i}")
+            self.stats.append(stats)
+            self.tasks.append(asyncio.create_task(self.run_bot(stats)))
+            if self.ramp and i != self.bots - 1:
+                await asyncio.sleep(1 / self.ramp)
+
+    async def stop(self):
+        """disconnects all bots"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def run(self, duration: float = None, report_interval: float = None,
+                  report_handler: Callable = None):
+        """
+        runs swarm for duration seconds or until all bots disconnect.
+        report_handler(report) is called every report_interval seconds
+        """
+        await self.start()
+        deadline = None
+        if duration is not None:
+            deadline = self.start_time + duration
+        while not all(task.done() for task in self.tasks):
+            timeout = report_interval
+            if deadline is not None:
+                left = deadline - time.perf_counter()
+                if left <= 0:
+                    break
+                timeout = left if timeout is None else min(timeout, left)
+            await asyncio.wait(self.tasks,
+                               timeout=timeout,
+                               return_when=asyncio.ALL_COMPLETED)
+            if report_handler and report_interval:
+                report_handler(self.report())
+        await self.stop()
+
+    def report(self) -> dict:
+        """returns per-bot and aggregate statistics"""
+        now = time.perf_counter()
+        bots = [stats.as_dict(now) for stats in self.stats]
+        latencies = sorted(bot["login_latency"] for bot in bots
+                           if bot["login_latency"] is not None)
+        reasons = {}
+        for bot in bots:
+            if bot["disconnect_reason"] is not None:
+                reason = str(bot["disconnect_reason"])
+                reasons[reason] = reasons.get(reason, 0) + 1
+        elapsed = now - self.start_time if self.start_time else 0
+        packets = sum(bot["packets"] for bot in bots)
+        received = sum(bot["bytes"] for bot in bots)
+        aggregate = {
+            "bots": len(bots),
+            "connected": sum(bot["connected"] for bot in bots),
+            "logged_in": len(latencies),
+            "elapsed": elapsed,
+            "packets": packets,
+            "bytes": received,
+            "packets_per_second": packets / elapsed if elapsed else 0,
+            "bytes_per_second": received / elapsed if elapsed else 0,
+            "login_latency_avg":
+            sum(latencies) / len(latencies) if latencies else None,
+            "login_latency_max": latencies[-1] if latencies else None,
+            "disconnect_reasons": reasons
+        }
+        return {"aggregate": aggregate, "bots": bots}
+
+
+def print_report(report: dict):
+    """prints aggregate statistics in one line"""
+    aggregate = report["aggregate"]
+    print(f"{aggregate['elapsed']:8.1f}s "
+          f"bots {aggregate['connected']}/{aggregate['bots']} "
+          f"logged in {aggregate['logged_in']} "
+          f"{aggregate['packets_per_second']:.0f} packets/s "
+          f"{aggregate['bytes_per_second'] / 1024:.0f} KiB/s")
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m protocol.swarm",
+                                     description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=25565)
+    parser.add_argument("--bots", type=int, default=1)
+    parser.add_argument("--ramp",
+                        type=float,
+                        default=10,
+                        help="bots started per second")
+    parser.add_argument("--duration",
+                        type=float,
+                        help="seconds to run, until all bots disconnect "
+                        "by default")
+    parser.add_argument("--report-interval", type=float, default=5)
+    parser.add_argument("--name-prefix", default="bot")
+    parser.add_argument("--track-world",
+                        action="store_true",
+                        help="track chunks and entities")
+    parser.add_argument("--json", help="write final report to file")
+    args = parser.parse_args(argv)
+
+    swarm = Swarm(args.host, args.port, args.bots, args.ramp,
+                  args.name_prefix, args.track_world)
+    try:
+        asyncio.run(
+            swarm.run(args.duration, args.report_interval, print_report))
+    except KeyboardInterrupt:
+        pass
+    report = swarm.report()
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Synthetic packet data for benchmarks and the local test server
+"""
+import random
+from protocol.protocol_47 import SPAWN_MOB
+from protocol.protocol_types import Boolean, Int, UShort, VarInt
+
+# entity metadata with flags, health and custom name
+MOB_METADATA = [{
+    "type": 0,
+    "key": 0,
+    "value": 0
+}, {
+    "type": 3,
+    "key": 6,
+    "value": 20.0
+}, {
+    "type": 4,
+    "key": 2,
+    "value": "Mob"
+}]
+
+
+def chunk_data(sections: int, seed: int = 0) -> bytes:
+    """blocks, block light, sky light and biomes of chunk column"""
+    rng = random.Random(seed)
+    return (rng.randbytes(8192 * sections) + rng.randbytes(2048 * sections) +
+            rng.randbytes(2048 * sections) + rng.randbytes(256))
+
+
+def chunk_packet(chunk_x: int,
+                 chunk_z: int,
+                 sections: int,
+                 data: bytes = None) -> bytes:
+    """
+    data of Play 0x21 Chunk Data packet. data is chunk_data of column,
+    random data is generated if it's None
+    """
+    if data is None:
+        data = chunk_data(sections, chunk_x * 31 + chunk_z)
+    return (Int(chunk_x) + Int(chunk_z) + Boolean(True) +
+            UShort((1 << sections) - 1) + VarInt(len(data)) + data)
+
+
+def spawn_mob_packet(entity_id: int, entity_type: int, x: float, y: float,
+                     z: float) -> bytes:
+    """data of Play 0x0f Spawn Mob packet with MOB_METADATA"""
+    values = {name: 0 for name, _, _ in SPAWN_MOB.fields}
+    values.update(entity_id=entity_id,
+                  entity_type=entity_type,
+                  x=x,
+                  y=y,
+                  z=z,
+                  metadata=MOB_METADATA)
+    return SPAWN_MOB.write(values)
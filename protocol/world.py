@@ -0,0 +1,288 @@
+"""
+Compact storage of loaded chunk columns
+"""
+import math
+import sys
+from array import array
+from collections import OrderedDict
+from protocol.constants import EVICT_DISTANCE, EVICT_LRU
+
+SECTION_VOLUME = 4096
+SECTION_BLOCKS_SIZE = 8192
+SECTION_LIGHT_SIZE = 2048
+BIOME_SIZE = 256
+
+_BIG_ENDIAN_HOST = sys.byteorder == "big"
+
+
+class ChunkSection:
+    """
+    16x16x16 blocks. Blocks are stored as block_id << 4 | block_meta,
+    light is stored as packed nibbles just like on the wire.
+    Index of block is y << 8 | z << 4 | x
+    """
+    __slots__ = ("blocks", "block_light", "sky_light")
+
+    def __init__(self,
+                 blocks: array = None,
+                 block_light: bytearray = None,
+                 sky_light: bytearray = None) -> None:
+        if blocks is None:
+            blocks = array("H", bytes(SECTION_BLOCKS_SIZE))
+        if block_light is None:
+            block_light = bytearray(SECTION_LIGHT_SIZE)
+        self.blocks = blocks
+        self.block_light = block_light
+        self.sky_light = sky_light
+
+    def get_block(self, x: int, y: int, z: int) -> int:
+        """returns block_id << 4 | block_meta of block in section"""
+        return self.blocks[y << 8 | z << 4 | x]
+
+    def set_block(self, x: int, y: int, z: int, block: int):
+        """sets block_id << 4 | block_meta of block in section"""
+        self.blocks[y << 8 | z << 4 | x] = block
+
+    def get_light(self, x: int, y: int, z: int) -> tuple[int, int]:
+        """returns block light and sky light of block in section"""
+        index = y << 8 | z << 4 | x
+        shift = (index & 1) << 2
+        block_light = self.block_light[index >> 1] >> shift & 0xF
+        sky_light = 0
+        if self.sky_light is not None:
+            sky_light = self.sky_light[index >> 1] >> shift & 0xF
+        return (block_light, sky_light)
+
+    def nbytes(self) -> int:
+        """size of section data in bytes"""
+        size = SECTION_BLOCKS_SIZE + SECTION_LIGHT_SIZE
+        if self.sky_light is not None:
+            size += SECTION_LIGHT_SIZE
+        return size
+
+
+class ChunkColumn:
+    """16 chunk sections stacked on each other plus biomes"""
+    __slots__ = ("chunk_x", "chunk_z", "sections", "biome")
+
+    def __init__(self, chunk_x: int, chunk_z: int) -> None:
+        self.chunk_x = chunk_x
+        self.chunk_z = chunk_z
+        # None means that section is empty (air)
+        self.sections: list[ChunkSection] = [None] * 16
+        self.biome = bytearray(BIOME_SIZE)
+
+    def read(self, packet: bytes, pointer: int, bit_mask: int,
+             sky_light: bool, continuous: bool) -> int:
+        """
+        fills column with chunk data from the wire. if continuous, sections
+        not in bit_mask become empty. returns pointer
+        """
+        sections_y = [y for y in range(16) if bit_mask >> y & 1]
+        count = len(sections_y)
+        if continuous:
+            self.sections = [None] * 16
+
+        blocks_pointer = pointer
+        block_light_pointer = blocks_pointer + SECTION_BLOCKS_SIZE * count
+        sky_light_pointer = block_light_pointer + SECTION_LIGHT_SIZE * count
+        pointer = sky_light_pointer
+        if sky_light:
+            pointer += SECTION_LIGHT_SIZE * count
+
+        for i, section_y in enumerate(sections_y):
+            blocks = array("H")
+            start = blocks_pointer + i * SECTION_BLOCKS_SIZE
+            blocks.frombytes(packet[start:start + SECTION_BLOCKS_SIZE])
+            if _BIG_ENDIAN_HOST:
+                blocks.byteswap()
+            start = block_light_pointer + i * SECTION_LIGHT_SIZE
+            block_light = bytearray(packet[start:start + SECTION_LIGHT_SIZE])
+            section_sky_light = None
+            if sky_light:
+                start = sky_light_pointer + i * SECTION_LIGHT_SIZE
+                section_sky_light = bytearray(
+                    packet[start:start + SECTION_LIGHT_SIZE])
+            self.sections[section_y] = ChunkSection(blocks, block_light,
+                                                    section_sky_light)
+
+        if continuous:
+            self.biome[:] = packet[pointer:pointer + BIOME_SIZE]
+            pointer += BIOME_SIZE
+        return pointer
+
+    def get_block(self, x: int, y: int, z: int) -> int:
+        """returns block_id << 4 | block_meta. x and z are relative"""
+        section = self.sections[y >> 4]
+        if section is None:
+            return 0
+        return section.blocks[(y & 0xF) << 8 | z << 4 | x]
+
+    def set_block(self, x: int, y: int, z: int, block: int):
+        """sets block_id << 4 | block_meta. x and z are relative"""
+        section = self.sections[y >> 4]
+        if section is None:
+            if not block:
+                return
+            section = ChunkSection()
+            self.sections[y >> 4] = section
+        section.blocks[(y & 0xF) << 8 | z << 4 | x] = block
+
+    def nbytes(self) -> int:
+        """size of column data in bytes"""
+        return BIOME_SIZE + sum(section.nbytes()
+                                for section in self.sections if section)
+
+
+class World:
+    """
+    Chunk columns keyed by (chunk_x, chunk_z).
+
+    max_columns and max_bytes cap the amount of stored columns. When a cap
+    is exceeded, least recently used columns (EVICT_LRU) or columns farthest
+    from the player (EVICT_DISTANCE) are evicted
+    """
+
+    def __init__(self,
+                 max_columns: int = None,
+                 max_bytes: int = None,
+                 eviction: int = EVICT_LRU) -> None:
+        self.columns: OrderedDict[tuple[int, int],
+                                  ChunkColumn] = OrderedDict()
+        self.max_columns = max_columns
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.bytes_used = 0
+        # chunk coordinates of the player, used by EVICT_DISTANCE
+        self.center: tuple[int, int] = None
+
+    def set_center(self, x: float, z: float):
+        """sets player position in absolute coordinates"""
+        self.center = (math.floor(x) >> 4, math.floor(z) >> 4)
+
+    def _touch(self, key: tuple[int, int]) -> ChunkColumn:
+        """returns column and marks it as recently used"""
+        column = self.columns.get(key)
+        if column is not None:
+            self.columns.move_to_end(key)
+        return column
+
+    def _over_budget(self) -> bool:
+        if self.max_columns is not None and len(
+                self.columns) > self.max_columns:
+            return True
+        return self.max_bytes is not None and self.bytes_used > self.max_bytes
+
+    def _evict(self, keep: tuple[int, int]):
+        """evicts columns until world fits into budget"""
+        while len(self.columns) > 1 and self._over_budget():
+            if self.eviction == EVICT_DISTANCE and self.center is not None:
+                center_x, center_z = self.center
+                victim = max(
+                    (key for key in self.columns if key != keep),
+                    key=lambda key: (key[0] - center_x)**2 +
+                    (key[1] - center_z)**2)
+            else:
+                victim = next(key for key in self.columns if key != keep)
+            self.unload_column(*victim)
+
+    def load_column(self, chunk_x: int, chunk_z: int, packet: bytes,
+                    pointer: int, bit_mask: int, sky_light: bool,
+                    continuous: bool) -> int:
+        """applies chunk data from the wire. returns pointer"""
+        key = (chunk_x, chunk_z)
+        column = self._touch(key)
+        if column is None:
+            column = ChunkColumn(chunk_x, chunk_z)
+            self.columns[key] = column
+        else:
+            self.bytes_used -= column.nbytes()
+        pointer = column.read(packet, pointer, bit_mask, sky_light,
+                              continuous)
+        self.bytes_used += column.nbytes()
+        self._evict(key)
+        return pointer
+
+    def put_column(self, column: ChunkColumn, bit_mask: int,
+                   continuous: bool):
+        """
+        applies column decoded elsewhere (see ChunkColumn.read). if not
+        continuous, only sections in bit_mask are replaced
+        """
+        key = (column.chunk_x, column.chunk_z)
+        old_column = self._touch(key)
+        if old_column is not None:
+            self.bytes_used -= old_column.nbytes()
+            if not continuous:
+                for section_y in range(16):
+                    if bit_mask >> section_y & 1:
+                        old_column.sections[section_y] = column.sections[
+                            section_y]
+                column = old_column
+        self.columns[key] = column
+        self.bytes_used += column.nbytes()
+        self._evict(key)
+
+    def unload_column(self, chunk_x: int, chunk_z: int):
+        """forgets column"""
+        column = self.columns.pop((chunk_x, chunk_z), None)
+        if column is not None:
+            self.bytes_used -= column.nbytes()
+
+    def get_column(self, chunk_x: int, chunk_z: int) -> ChunkColumn:
+        """returns column or None if it isn't loaded"""
+        return self._touch((chunk_x, chunk_z))
+
+    def get_section(self, chunk_x: int, section_y: int,
+                    chunk_z: int) -> ChunkSection:
+        """returns section or None if it is empty or isn't loaded"""
+        column = self._touch((chunk_x, chunk_z))
+        if column is None:
+            return None
+        return column.sections[section_y]
+
+    def get_block(self, x: int, y: int, z: int) -> int:
+        """
+        returns block_id << 4 | block_meta at absolute coordinates or None
+        if chunk isn't loaded
+        """
+        column = self._touch((x >> 4, z >> 4))
+        if column is None or not 0 <= y < 256:
+            return None
+        return column.get_block(x & 0xF, y, z & 0xF)
+
+    def set_block(self, x: int, y: int, z: int, block: int):
+        """sets block_id << 4 | block_meta at absolute coordinates"""
+        column = self._touch((x >> 4, z >> 4))
+        if column is None or not 0 <= y < 256:
+            return
+        self.set_column_block(column, x & 0xF, y, z & 0xF, block)
+
+    def set_column_block(self, column: ChunkColumn, x: int, y: int, z: int,
+                         block: int):
+        """sets block in column keeping track of used bytes"""
+        had_section = column.sections[y >> 4] is not None
+        column.set_block(x, y, z, block)
+        if not had_section and column.sections[y >> 4] is not None:
+            self.bytes_used += column.sections[y >> 4].nbytes()
+
+    def get_light(self, x: int, y: int, z: int) -> tuple[int, int]:
+        """
+        returns block light and sky light at absolute coordinates or None
+        if chunk isn't loaded
+        """
+        column = self._touch((x >> 4, z >> 4))
+        if column is None or not 0 <= y < 256:
+            return None
+        section = column.sections[y >> 4]
+        if section is None:
+            # empty sections are fully lit by the sky
+            return (0, 15)
+        return section.get_light(x & 0xF, y & 0xF, z & 0xF)
+
+    def nbytes(self) -> int:
+        """size of all loaded columns in bytes"""
+        return self.bytes_used
+
+    def __len__(self) -> int:
+        return len(self.columns)
@@ -0,0 +1,78 @@
+import socket
+import threading
+from protocol.constants import STATE_LOGIN, STATE_PLAY
+from protocol.protocol_47 import ProtocolClient
+from protocol.protocol_types import String, VarInt
+from protocol.recorder import ReplayClient
+
+
+class SendingClient(ReplayClient):
+    """keeps sent packets"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sent = []
+
+    def send_packet(self,
+                    packet_id: int,
+                    packet_data: bytes,
+                    compress: bool = True):
+        self.sent.append((packet_id, bytes(packet_data)))
+
+
+def frame(packet_id: int, data: bytes) -> bytes:
+    packet = VarInt(packet_id) + data
+    return VarInt(len(packet)) + packet
+
+
+def process_frames(client: ProtocolClient, count: int):
+    for _ in range(count):
+        client.process_packet(client.framer.next_frame(0))
+
+
+def test_exit_returns_while_connected():
+    listener = socket.create_server(("localhost", 0))
+    client = ProtocolClient()
+    try:
+        client.create_connection(listener.getsockname())
+        connection = listener.accept()[0]
+        client.login_as("tester")
+        exit_thread = threading.Thread(target=client.exit, daemon=True)
+        exit_thread.start()
+        exit_thread.join(3)
+        assert not exit_thread.is_alive(), "exit() is blocked"
+        assert not client.receive_data_thread.is_alive()
+        assert not client.process_data_thread.is_alive()
+        connection.close()
+    finally:
+        listener.close()
+
+
+def test_keep_alive_before_play_is_answered_once():
+    client = SendingClient()
+    client.state = STATE_LOGIN
+    # first keep alive arrives together with Login Success, so fast path
+    # doesn't see it in Play state
+    client.framer.feed(
+        frame(0x02, String("uuid") + String("tester")) +
+        frame(0x00, VarInt(1)))
+    process_frames(client, 1)
+    assert client.state == STATE_PLAY
+    # second one is answered by fast path before the first one is decoded
+    client.framer.feed(frame(0x00, VarInt(2)))
+    client.send_keep_alive_replies()
+    process_frames(client, 2)
+    assert client.sent == [(0x00, VarInt(2)), (0x00, VarInt(1))]
+    assert not client.answered_keep_alives
+    assert client.keep_alive_count == 2
+
+
+def test_empty_frames_in_play():
+    client = SendingClient()
+    client.state = STATE_PLAY
+    client.framer.feed(b"\x00")
+    client.compression_enabled = True
+    client.framer.feed(b"\x01\x00")
+    assert client.framer.next_frame(0) == b""
+    assert client.framer.next_frame(0) == b"\x00"
+    assert not client.sent
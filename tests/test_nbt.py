@@ -0,0 +1,118 @@
+import math
+import struct
+from array import array
+import pytest
+from protocol.constants import (TAG_BYTE, TAG_BYTE_ARRAY, TAG_COMPOUND,
+                                TAG_DOUBLE, TAG_END, TAG_FLOAT, TAG_INT,
+                                TAG_INT_ARRAY, TAG_LIST, TAG_LONG,
+                                TAG_LONG_ARRAY, TAG_SHORT, TAG_STRING)
+from protocol.nbt import NBT, parse_NBT_stream, skip_NBT_stream
+
+# every tag type, with nested lists and compounds
+EVERY_TAG = {
+    "byte": (TAG_BYTE, -5),
+    "short": (TAG_SHORT, 300),
+    "int": (TAG_INT, -70000),
+    "long": (TAG_LONG, 2**40),
+    "float": (TAG_FLOAT, 0.5),
+    "double": (TAG_DOUBLE, math.pi),
+    "string": (TAG_STRING, "héllo \U0001f600"),
+    "byte_array": (TAG_BYTE_ARRAY, bytes(range(256))),
+    "int_array": (TAG_INT_ARRAY, array("i", [1, -2, 2**31 - 1])),
+    "long_array": (TAG_LONG_ARRAY, array("q", [-(2**63), 0, 2**63 - 1])),
+    "compound": (TAG_COMPOUND, {
+        "inner": (TAG_COMPOUND, {
+            "x": (TAG_SHORT, 1)
+        }),
+        "empty": (TAG_COMPOUND, {})
+    }),
+    "shorts": (TAG_LIST, (TAG_SHORT, [(TAG_SHORT, 1), (TAG_SHORT, -1)])),
+    "floats": (TAG_LIST, (TAG_FLOAT, [(TAG_FLOAT, 1.5)])),
+    "strings": (TAG_LIST, (TAG_STRING, [(TAG_STRING, "a"),
+                                        (TAG_STRING, "")])),
+    "compounds": (TAG_LIST, (TAG_COMPOUND, [
+        (TAG_COMPOUND, {
+            "id": (TAG_SHORT, 16)
+        }),
+        (TAG_COMPOUND, {}),
+    ])),
+    "lists": (TAG_LIST, (TAG_LIST, [
+        (TAG_LIST, (TAG_BYTE, [(TAG_BYTE, 1)])),
+        (TAG_LIST, (TAG_END, [])),
+    ])),
+    "arrays": (TAG_LIST, (TAG_INT_ARRAY, [(TAG_INT_ARRAY, array("i", [7]))
+                                          ])),
+    "empty_compounds": (TAG_LIST, (TAG_COMPOUND, [])),
+}
+
+
+def test_typed_round_trip():
+    data = NBT(EVERY_TAG)
+    parsed, pointer = parse_NBT_stream(data, typed=True)
+    assert pointer == len(data)
+    assert parsed == EVERY_TAG
+    assert NBT(parsed) == data
+    assert skip_NBT_stream(data) == len(data)
+
+
+def test_plain_round_trip():
+    value = {
+        "int": 1,
+        "long": 2**40,
+        "double": 0.25,
+        "string": "text",
+        "bytes": b"\x00\x01",
+        "ints": array("i", [1, 2]),
+        "longs": array("q", [3]),
+        "list": [1, 2, 3],
+        "compounds": [{
+            "a": "b"
+        }, {
+            "c": [[1.5], []]
+        }],
+        "nested": {
+            "deeper": {
+                "deepest": {}
+            }
+        }
+    }
+    parsed, _ = parse_NBT_stream(NBT(value, "root"))
+    assert parsed == value
+
+
+def test_written_bytes():
+    data = NBT({"s": (TAG_SHORT, 7)}, "r")
+    assert data == (b"\x0a\x00\x01r" + b"\x02\x00\x01s" + struct.pack(">h", 7)
+                    + b"\x00")
+
+
+def test_typed_parse_keeps_tag_types():
+    # item NBT as sent by server: shorts, bytes, floats and byte lists
+    data = NBT({
+        "ench": (TAG_LIST, (TAG_COMPOUND, [{
+            "id": (TAG_SHORT, 16),
+            "lvl": (TAG_SHORT, 5)
+        }])),
+        "Unbreakable": (TAG_BYTE, 1),
+        "Health": (TAG_FLOAT, 20.0),
+        "flags": (TAG_LIST, (TAG_BYTE, [1, 0])),
+    })
+    assert NBT(parse_NBT_stream(data, typed=True)[0]) == data
+    # plain values widen types, so bytes differ
+    assert NBT(parse_NBT_stream(data)[0]) != data
+
+
+@pytest.mark.parametrize("items", [[1, 2.5], [1, "a"], [{}, []],
+                                   [(TAG_SHORT, 1), (TAG_INT, 2)]])
+def test_mixed_list(items):
+    with pytest.raises(TypeError, match="same type"):
+        NBT({"list": items})
+
+
+def test_numbers_fit_list_type():
+    data = NBT({"list": [2.5, 1], "shorts": (TAG_LIST, (TAG_SHORT, [1, 2]))})
+    parsed, _ = parse_NBT_stream(data, typed=True)
+    assert parsed["list"] == (TAG_LIST, (TAG_DOUBLE, [(TAG_DOUBLE, 2.5),
+                                                      (TAG_DOUBLE, 1.0)]))
+    assert parsed["shorts"] == (TAG_LIST, (TAG_SHORT, [(TAG_SHORT, 1),
+                                                       (TAG_SHORT, 2)]))
@@ -0,0 +1,95 @@
+import importlib
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+import pytest
+from protocol import protocol_types
+
+
+@pytest.fixture(params=["python", "c"])
+def backend(request):
+    """functions of SPEEDUPS as pure Python or C versions"""
+    if request.param == "python":
+        return SimpleNamespace(**protocol_types.PURE_PYTHON)
+    try:
+        speedups = importlib.import_module("protocol._speedups")
+    except ImportError:
+        pytest.skip("protocol._speedups isn't built")
+    return SimpleNamespace(
+        **{name: getattr(speedups, name)
+           for name in protocol_types.SPEEDUPS})
+
+
+VARINTS = [(0, b"\x00"), (1, b"\x01"), (127, b"\x7f"), (128, b"\x80\x01"),
+           (255, b"\xff\x01"), (4095, b"\xff\x1f"), (4096, b"\x80\x20"),
+           (16384, b"\x80\x80\x01"), (2**31 - 1, b"\xff\xff\xff\xff\x07"),
+           (-1, b"\xff\xff\xff\xff\x0f"), (-2**31, b"\x80\x80\x80\x80\x08")]
+
+
+@pytest.mark.parametrize("value, encoded", VARINTS)
+@pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+def test_VarInt_round_trip(backend, value, encoded, buffer_type):
+    assert backend.VarInt(value) == encoded
+    data = buffer_type(b"\xaa" + encoded + b"\xbb")
+    assert backend.read_VarInt(data, 1) == (value, len(encoded) + 1)
+    assert backend.read_VarLong(data, 1)[1] == len(encoded) + 1
+    values = [value, 0, value]
+    data = buffer_type(b"".join(backend.VarInt(i) for i in values))
+    assert backend.read_VarInt_array(data, 0, 3) == (values, len(data))
+
+
+@pytest.mark.parametrize("value", [0, 128, 2**31, -1, 2**63 - 1, -2**63])
+def test_VarLong_round_trip(backend, value):
+    encoded = backend.VarLong(value)
+    assert backend.read_VarLong(encoded, 0) == (value, len(encoded))
+
+
+@pytest.mark.parametrize(
+    "encoded, value",
+    [
+        # bits of 5th byte past 32 bits are dropped
+        (b"\x80\x80\x80\x80\x10", 0),
+        (b"\xff\xff\xff\xff\x7f", -1),
+        (b"\x80\x80\x80\x80\x78", -2**31),
+    ])
+@pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+def test_overlong_VarInt(backend, encoded, value, buffer_type):
+    data = buffer_type(encoded)
+    assert backend.read_VarInt(data, 0) == (value, 5)
+    assert backend.read_VarInt_array(data, 0, 1) == ([value], 5)
+
+
+def test_overlong_VarLong(backend):
+    encoded = b"\xff\xff\xff\xff\xff\xff\xff\xff\xff\x7f"
+    assert backend.read_VarLong(encoded, 0) == (-1, 10)
+
+
+@pytest.mark.parametrize("encoded", [b"\x80\x80\x80\x80\x80\x01"])
+def test_too_long_VarInt(backend, encoded):
+    with pytest.raises(RuntimeError):
+        backend.read_VarInt(encoded, 0)
+    with pytest.raises(RuntimeError):
+        backend.read_VarInt_array(encoded, 0, 1)
+
+
+def test_cut_VarInt(backend):
+    with pytest.raises(IndexError):
+        backend.read_VarInt(b"\x80\x80", 0)
+
+
+@pytest.mark.parametrize("pure_python", ["", "1"])
+def test_backend_selection(pure_python):
+    env = dict(os.environ, PROTOCOL_PURE_PYTHON=pure_python)
+    code = ("from protocol import protocol_types as p; "
+            "print(p.read_VarInt is p.PURE_PYTHON['read_VarInt'])")
+    output = subprocess.run([sys.executable, "-c", code],
+                            env=env,
+                            cwd=os.path.dirname(os.path.dirname(__file__)),
+                            capture_output=True,
+                            text=True,
+                            check=True).stdout.strip()
+    if pure_python:
+        assert output == "True"
+    elif protocol_types._speedups is not None:
+        assert output == "False"
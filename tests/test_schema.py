@@ -0,0 +1,47 @@
+import uuid
+from protocol.protocol_47 import ENTITY_METADATA, SPAWN_PLAYER
+from protocol.protocol_types import EntityMetadata, parse_entity_metadata
+
+# one entry of every entity metadata type
+EVERY_METADATA = [
+    {"type": 0, "key": 0, "value": -1},
+    {"type": 1, "key": 1, "value": 300},
+    {"type": 2, "key": 2, "value": -70000},
+    {"type": 3, "key": 6, "value": 20.0},
+    {"type": 4, "key": 2, "value": "name"},
+    {"type": 5, "key": 10, "value": {
+        "item_id": 1,
+        "item_count": 64,
+        "item_damage": 0,
+        "item_nbt": {}
+    }},
+    {"type": 6, "key": 11, "value": (1, -2, 3)},
+    {"type": 7, "key": 31, "value": (0.5, -1.0, 90.0)},
+]
+
+
+def test_entity_metadata_round_trip():
+    data = EntityMetadata(EVERY_METADATA)
+    assert data[-1] == 0x7f
+    assert parse_entity_metadata(data, 0) == (EVERY_METADATA, len(data))
+
+
+def test_write_packets_with_metadata():
+    values = {
+        "entity_id": 7,
+        "player_uuid": uuid.UUID(int=1),
+        "x": 1.5,
+        "y": 64.0,
+        "z": -2.25,
+        "yaw": 10,
+        "pitch": 20,
+        "current_item": 0,
+        "metadata": EVERY_METADATA
+    }
+    data = SPAWN_PLAYER.write(values)
+    assert SPAWN_PLAYER.read(data, 0) == (values, len(data))
+    data = ENTITY_METADATA.write(entity_id=7, metadata=[])
+    assert ENTITY_METADATA.read(data, 0) == ({
+        "entity_id": 7,
+        "metadata": []
+    }, len(data))
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from protocol.async_client import AsyncProtocolClient
+from protocol.constants import STATE_PLAY
+from protocol.server import LocalServer
+
+
+async def wait_for(condition, timeout: float = 5):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_login_chunks_and_keep_alives():
+
+    async def run():
+        server = LocalServer(port=0,
+                             keep_alive_interval=0.05,
+                             chunks_per_second=100,
+                             chunk_sections=2,
+                             bulk_columns=2,
+                             entities_per_second=100,
+                             max_entities=5,
+                             chat_per_second=50)
+        await server.start()
+        client = AsyncProtocolClient()
+        chat = []
+        client.set_chat_handler(chat.append)
+        try:
+            await client.create_connection(("localhost", server.port))
+            await client.login_as("tester")
+            await wait_for(lambda: client.keep_alive_count >= 3 and len(
+                client.world) >= 4 and chat)
+            assert client.state == STATE_PLAY
+            assert client.compression_enabled
+            assert 0 < len(client.entities) <= 5
+            await wait_for(lambda: server.report()["aggregate"]["keep_alives"]
+                           >= 3)
+        finally:
+            await client.exit()
+            await server.stop()
+        report = server.report()["connections"][0]
+        assert report["name"] == "tester"
+        assert report["login_latency"] is not None
+        assert report["keep_alive_latency_max"] > 0
+
+    asyncio.run(run())
+
+
+def test_stop_with_connected_client(caplog):
+
+    async def run():
+        server = LocalServer(port=0, keep_alive_interval=0.05)
+        await server.start()
+        client = AsyncProtocolClient()
+        try:
+            await client.create_connection(("localhost", server.port))
+            await client.login_as("tester")
+            await wait_for(lambda: client.keep_alive_count >= 1)
+            await server.stop()
+            # lets streams run done callbacks of connection tasks
+            await asyncio.sleep(0.1)
+        finally:
+            await client.exit()
+        assert not server.tasks
+
+    asyncio.run(run())
+    assert not [
+        record for record in caplog.records if record.name == "asyncio"
+    ]
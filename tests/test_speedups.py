@@ -0,0 +1,8 @@
+import pytest
+from protocol import speedups
+
+pytest.importorskip("protocol._speedups")
+
+
+def test_backends_agree():
+    assert speedups.check() == []